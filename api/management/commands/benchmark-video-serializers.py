@@ -0,0 +1,129 @@
+from timeit import default_timer
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.v1 import serializers
+from pipeline import models
+from pipeline import utils as pipeline_utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the model and values video serializers. Test"
+        " videos are created in a transaction that is rolled back at the end of the"
+        " benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sizes",
+            nargs="*",
+            type=int,
+            default=[100, 1000, 10000],
+            help="Number of serialized videos",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Keep the best of n runs"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for size in options["sizes"]:
+                owner = self.create_videos(size)
+                queryset = models.Video.objects.filter(owner=owner).order_by("id")
+                durations = [
+                    self.timeit(serialize, queryset, options["repeat"])
+                    for serialize in (serialize_model, serialize_values)
+                ]
+                self.stdout.write(
+                    "{} videos: model serializer {:.0f} videos/s,"
+                    " values serializer {:.0f} videos/s (x{:.1f})".format(
+                        size,
+                        size / durations[0],
+                        size / durations[1],
+                        durations[0] / durations[1],
+                    )
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def timeit(serialize, queryset, repeat):
+        durations = []
+        for _ in range(repeat):
+            start = default_timer()
+            serialize(queryset)
+            durations.append(default_timer() - start)
+        return min(durations)
+
+    @staticmethod
+    def create_videos(size):
+        """
+        Create videos, each with a processing state, two subtitles and two
+        formats. Note that we skip signals and model `save` methods by using
+        `bulk_create`.
+        """
+        owner = User.objects.create(
+            username="benchmark-" + pipeline_utils.generate_random_id()
+        )
+        models.Video.objects.bulk_create(
+            [
+                models.Video(
+                    title="Video {}".format(index),
+                    public_id=pipeline_utils.generate_random_id(),
+                    thumbnail_url="http://example.com/thumbnail.jpg",
+                    owner=owner,
+                )
+                for index in range(size)
+            ]
+        )
+        video_ids = list(
+            models.Video.objects.filter(owner=owner).values_list("id", flat=True)
+        )
+        models.ProcessingState.objects.bulk_create(
+            [
+                models.ProcessingState(
+                    video_id=video_id, status=models.ProcessingState.STATUS_SUCCESS
+                )
+                for video_id in video_ids
+            ]
+        )
+        models.Subtitle.objects.bulk_create(
+            [
+                models.Subtitle(
+                    video_id=video_id,
+                    language=language,
+                    url="http://example.com/{}.vtt".format(language),
+                )
+                for video_id in video_ids
+                for language in ("en", "fr")
+            ]
+        )
+        models.VideoFormat.objects.bulk_create(
+            [
+                models.VideoFormat(
+                    video_id=video_id,
+                    name=name,
+                    bitrate=bitrate,
+                    url="http://example.com/{}.mp4".format(name),
+                )
+                for video_id in video_ids
+                for name, bitrate in (("SD", 128), ("HD", 256))
+            ]
+        )
+        return owner
+
+
+def serialize_model(queryset):
+    return serializers.VideoSerializer(
+        queryset.select_related("processing_state").prefetch_related(
+            "subtitles", "formats"
+        ),
+        many=True,
+    ).data
+
+
+def serialize_values(queryset):
+    serializer = serializers.VideoValuesSerializer()
+    return serializer.serialize(serializer.values(queryset))
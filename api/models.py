@@ -1,12 +1,15 @@
 """
-Declaring a signal to create a token each time a user is created
+Declaring signals to create a token each time a user is created, and to
+invalidate cached tokens each time tokens or users are modified
 """
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from rest_framework.authtoken.models import Token
 
+from api.v1 import authentication
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
@@ -17,3 +20,32 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     """
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance=None, created=False, **kwargs):
+    if not created:
+        authentication.invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(
+    sender, instance=None, created=False, update_fields=None, **kwargs
+):
+    """
+    Cached tokens and credentials include the user object, so they must be
+    invalidated on every user change. Logging in only modifies the last login
+    date, which does not matter for authentication: in that case we skip the
+    invalidation. Note that the tokens of deleted users are deleted, too, so
+    that they are invalidated by `invalidate_cached_token`.
+    """
+    if created or (update_fields is not None and set(update_fields) == {"last_login"}):
+        return
+    authentication.invalidate_credentials(instance.get_username())
+    if kwargs["signal"] is post_save:
+        for key in Token.objects.filter(user_id=instance.pk).values_list(
+            "key", flat=True
+        ):
+            authentication.invalidate_token(key)
@@ -0,0 +1,161 @@
+import base64
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from rest_framework.authtoken.models import Token
+
+from api.v1 import authentication
+
+
+# Cache queries are not counted as SQL queries
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._local_cache.clear()
+        self.user = User.objects.create(username="test")
+        self.token = Token.objects.get(user=self.user)
+
+    def tearDown(self):
+        authentication._local_cache.clear()
+
+    def get_playlists(self, key=None):
+        return self.client.get(
+            reverse("api:v1:playlist-list"),
+            HTTP_AUTHORIZATION="Token {}".format(key or self.token.key),
+        )
+
+    def test_authenticate(self):
+        self.assertEqual(200, self.get_playlists().status_code)
+
+    def test_invalid_token(self):
+        self.assertEqual(401, self.get_playlists("invalidkey").status_code)
+
+    def test_cached_token_does_not_hit_the_database(self):
+        self.get_playlists()
+        # Only the playlists are fetched
+        with self.assertNumQueries(1):
+            self.get_playlists()
+
+    def test_shared_cache_is_used_when_local_cache_is_empty(self):
+        self.get_playlists()
+        authentication._local_cache.clear()
+        with self.assertNumQueries(1):
+            self.get_playlists()
+
+    def test_token_keys_are_not_stored_in_clear(self):
+        self.get_playlists()
+        self.assertIsNone(cache.get("AUTH_TOKEN:" + self.token.key))
+
+    def test_deleted_token_is_invalidated(self):
+        self.get_playlists()
+        self.token.delete()
+        self.assertEqual(401, self.get_playlists().status_code)
+
+    def test_deactivated_user_is_invalidated(self):
+        self.get_playlists()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(401, self.get_playlists().status_code)
+
+    def test_deleted_user_is_invalidated(self):
+        self.get_playlists()
+        self.user.delete()
+        self.assertEqual(401, self.get_playlists().status_code)
+
+    def test_login_does_not_invalidate_token(self):
+        self.get_playlists()
+        self.user.save(update_fields=["last_login"])
+        self.assertIsNotNone(authentication.get_token(self.token.key))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CachedBasicAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._local_cache.clear()
+        self.user = User.objects.create(username="test")
+        self.user.set_password("s3cret")
+        self.user.save()
+
+    def tearDown(self):
+        authentication._local_cache.clear()
+
+    def get_playlists(self, username="test", password="s3cret"):
+        credentials = "{}:{}".format(username, password).encode()
+        with patch(
+            "api.v1.authentication.authenticate", side_effect=authenticate
+        ) as mock_authenticate:
+            response = self.client.get(
+                reverse("api:v1:playlist-list"),
+                HTTP_AUTHORIZATION=b"Basic " + base64.b64encode(credentials),
+            )
+        return response, mock_authenticate.call_count
+
+    def test_verified_credentials_are_cached(self):
+        response1, password_checks1 = self.get_playlists()
+        response2, password_checks2 = self.get_playlists()
+
+        self.assertEqual(200, response1.status_code)
+        self.assertEqual(200, response2.status_code)
+        self.assertEqual(1, password_checks1)
+        self.assertEqual(0, password_checks2)
+
+    def test_invalid_password_is_checked_every_time(self):
+        self.get_playlists()
+        response1, password_checks1 = self.get_playlists(password="invalid")
+        response2, password_checks2 = self.get_playlists(password="invalid")
+
+        self.assertEqual(401, response1.status_code)
+        self.assertEqual(401, response2.status_code)
+        self.assertEqual(1, password_checks1)
+        self.assertEqual(1, password_checks2)
+
+    def test_credentials_are_not_stored_in_clear(self):
+        self.get_playlists()
+        self.assertIsNone(cache.get("AUTH_CREDENTIALS:test"))
+        for value in cache._cache.values():
+            self.assertNotIn(b"s3cret", value)
+
+    def test_password_hashes_are_not_stored(self):
+        self.get_playlists()
+        for value in cache._cache.values():
+            self.assertNotIn(self.user.password.encode(), value)
+
+    def test_cached_user_fields_are_deferred(self):
+        self.get_playlists()
+        authentication._local_cache.clear()
+        user = authentication.get_credentials_user("test", "s3cret")
+        self.assertEqual(self.user.pk, user.pk)
+        self.assertTrue(user.is_active)
+        self.assertIn("password", user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.password, user.password)
+
+    def test_password_change_invalidates_credentials(self):
+        self.get_playlists()
+        self.user.set_password("newpassword")
+        self.user.save()
+
+        response1, _ = self.get_playlists()
+        response2, password_checks = self.get_playlists(password="newpassword")
+        self.assertEqual(401, response1.status_code)
+        self.assertEqual(200, response2.status_code)
+        self.assertEqual(1, password_checks)
+
+    def test_deleted_user_is_invalidated(self):
+        self.get_playlists()
+        self.user.delete()
+
+        response, _ = self.get_playlists()
+        self.assertEqual(401, response.status_code)
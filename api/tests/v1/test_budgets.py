@@ -0,0 +1,358 @@
+import json
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+
+from api.v1 import budgets
+from api.v1.urls import router
+from pipeline import models
+from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend
+
+
+class BudgetsTests(TestCase):
+    """
+    Check that API endpoints do not exceed their query, cache and backend
+    budgets. Requests are run against a large dataset, such that N+1 query
+    patterns can be detected.
+    """
+
+    NUM_VIDEOS = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = factories.UserFactory(username="test", is_staff=True)
+        cls.user.set_password("password")
+        cls.user.save()
+        factories.VideoUploadUrlFactory(owner=cls.user, expires_at=2**31 - 1)
+
+        # We use bulk creation to skip signals and backend calls
+        models.Video.objects.bulk_create(
+            [
+                models.Video(
+                    public_id="videoid{}".format(index),
+                    title="Video {}".format(index),
+                    owner=cls.user,
+                )
+                for index in range(cls.NUM_VIDEOS)
+            ]
+        )
+        videos = list(models.Video.objects.filter(owner=cls.user))
+        models.ProcessingState.objects.bulk_create(
+            [models.ProcessingState(video=video) for video in videos]
+        )
+        models.Subtitle.objects.bulk_create(
+            [
+                models.Subtitle(
+                    public_id="{}-{}".format(video.public_id, language),
+                    video=video,
+                    language=language,
+                )
+                for video in videos
+                for language in ("en", "fr")
+            ]
+        )
+        models.VideoFormat.objects.bulk_create(
+            [
+                models.VideoFormat(video=video, name=name, bitrate=bitrate)
+                for video in videos
+                for name, bitrate in (("SD", 128), ("HD", 256))
+            ]
+        )
+        cls.playlist = models.Playlist.objects.create(
+            public_id="playlistid", name="Playlist", owner=cls.user
+        )
+        cls.playlist.videos.add(*videos[: cls.NUM_VIDEOS // 2])
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="test", password="password")
+
+    def assertWithinBudget(self, url_name, method, url, **kwargs):
+        """
+        Run a request and check that it does not exceed the budget of its url
+        and method. Note that latency budgets are not checked, as they depend
+        on the test environment.
+        """
+        budget = budgets.BUDGETS[(url_name, method.upper())]
+        with budgets.Recorder() as recorder:
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+
+        self.assertLess(response.status_code, 400)
+        overruns = [
+            overrun for overrun in recorder.get_overruns(budget) if overrun[0] != "ms"
+        ]
+        self.assertEqual([], overruns, "{} {}".format(method.upper(), url))
+        return response
+
+    def test_all_routes_have_a_budget(self):
+        url_names = set(url.name for url in router.urls)
+
+        self.assertEqual(
+            set(), url_names - set(url_name for url_name, _method in budgets.BUDGETS)
+        )
+
+    def test_list_videos(self):
+        url = reverse("api:v1:video-list")
+        response = self.assertWithinBudget("video-list", "get", url)
+        self.assertWithinBudget("video-list", "get", url)
+        self.assertWithinBudget("video-list", "get", response.json()["next"])
+        self.assertWithinBudget(
+            "video-list", "get", url, data={"playlist_id": "playlistid"}
+        )
+        self.assertWithinBudget(
+            "video-list", "get", url, data={"ids": "videoid1,videoid2,videoid3"}
+        )
+
+    def test_export_videos(self):
+        self.assertWithinBudget("video-export", "get", reverse("api:v1:video-export"))
+
+    def test_get_video(self):
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid1"})
+        self.assertWithinBudget("video-detail", "get", url)
+        self.assertWithinBudget("video-detail", "get", url)
+
+    def test_get_video_progress(self):
+        self.assertWithinBudget(
+            "video-progress",
+            "get",
+            reverse("api:v1:video-progress", kwargs={"id": "videoid1"}),
+        )
+
+    def test_update_video(self):
+        self.assertWithinBudget(
+            "video-detail",
+            "patch",
+            reverse("api:v1:video-detail", kwargs={"id": "videoid1"}),
+            data=json.dumps({"title": "New title"}),
+            content_type="application/json",
+        )
+
+    def test_delete_video(self):
+        with override_plugin_backend(delete_video=Mock()):
+            self.assertWithinBudget(
+                "video-detail",
+                "delete",
+                reverse("api:v1:video-detail", kwargs={"id": "videoid1"}),
+            )
+
+    def test_bulk_delete_videos(self):
+        with override_plugin_backend(delete_video=Mock()):
+            self.assertWithinBudget(
+                "video-bulk-delete",
+                "post",
+                reverse("api:v1:video-bulk-delete"),
+                data={
+                    "ids": [
+                        "videoid{}".format(index) for index in range(self.NUM_VIDEOS)
+                    ]
+                },
+            )
+
+    @override_plugin_backend(
+        upload_subtitle=lambda *args: None,
+        subtitle_url=lambda *args: "http://example.com/sub.vtt",
+    )
+    def test_upload_subtitle(self):
+        subtitle_file = BytesIO(b"1\n00:00:00,822 --> 00:00:01,565\nHello world!")
+        subtitle_file.name = "subtitle.srt"
+        self.assertWithinBudget(
+            "video-subtitles",
+            "post",
+            reverse("api:v1:video-subtitles", kwargs={"id": "videoid1"}),
+            data={"language": "de", "name": "subtitle.srt", "file": subtitle_file},
+        )
+
+    @patch("pipeline.utils.resize_image")
+    @override_plugin_backend(
+        upload_thumbnail=lambda *args: None,
+        delete_thumbnail=lambda *args: None,
+        thumbnail_url=lambda *args: "http://example.com/thumb.jpg",
+    )
+    def test_upload_thumbnail(self, mock_resize_image):
+        thumb_file = BytesIO(b"thumb content")
+        thumb_file.name = "thumb.jpg"
+        self.assertWithinBudget(
+            "video-thumbnail",
+            "post",
+            reverse("api:v1:video-thumbnail", kwargs={"id": "videoid1"}),
+            data={"name": "thumb.jpg", "file": thumb_file},
+        )
+
+    @override_plugin_backend(
+        upload_video=lambda *args: None,
+        start_transcoding=lambda *args: [],
+        create_thumbnail=lambda *args: None,
+        iter_formats=lambda *args: [],
+    )
+    def test_upload_video(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="newvideoid", owner=self.user, expires_at=2**31 - 1
+        )
+        video_file = BytesIO(b"some video content")
+        video_file.name = "video.mp4"
+        self.assertWithinBudget(
+            "video-upload",
+            "post",
+            reverse("api:v1:video-upload", kwargs={"video_id": "newvideoid"}),
+            data={"name": "video.mp4", "file": video_file},
+        )
+
+    def test_get_subtitle(self):
+        self.assertWithinBudget(
+            "subtitle-detail",
+            "get",
+            reverse("api:v1:subtitle-detail", kwargs={"id": "videoid1-fr"}),
+        )
+
+    @override_plugin_backend(delete_subtitle=lambda *args: None)
+    def test_delete_subtitle(self):
+        self.assertWithinBudget(
+            "subtitle-detail",
+            "delete",
+            reverse("api:v1:subtitle-detail", kwargs={"id": "videoid1-fr"}),
+        )
+
+    def test_list_playlists(self):
+        self.assertWithinBudget("playlist-list", "get", reverse("api:v1:playlist-list"))
+
+    def test_get_playlist(self):
+        self.assertWithinBudget(
+            "playlist-detail",
+            "get",
+            reverse("api:v1:playlist-detail", kwargs={"id": "playlistid"}),
+        )
+
+    def test_add_video_to_playlist(self):
+        self.assertWithinBudget(
+            "playlist-add-video",
+            "post",
+            reverse("api:v1:playlist-add-video", kwargs={"id": "playlistid"}),
+            data={"id": "videoid199"},
+        )
+
+    def test_remove_video_from_playlist(self):
+        self.assertWithinBudget(
+            "playlist-remove-video",
+            "post",
+            reverse("api:v1:playlist-remove-video", kwargs={"id": "playlistid"}),
+            data={"id": "videoid1"},
+        )
+
+    def test_add_videos_to_playlist(self):
+        self.assertWithinBudget(
+            "playlist-add-videos",
+            "post",
+            reverse("api:v1:playlist-add-videos", kwargs={"id": "playlistid"}),
+            data={
+                "ids": ["videoid{}".format(index) for index in range(self.NUM_VIDEOS)]
+            },
+        )
+
+    def test_remove_videos_from_playlist(self):
+        self.assertWithinBudget(
+            "playlist-remove-videos",
+            "post",
+            reverse("api:v1:playlist-remove-videos", kwargs={"id": "playlistid"}),
+            data={
+                "ids": ["videoid{}".format(index) for index in range(self.NUM_VIDEOS)]
+            },
+        )
+
+    def test_list_users(self):
+        self.assertWithinBudget("user-list", "get", reverse("api:v1:user-list"))
+
+    def test_get_user(self):
+        self.assertWithinBudget(
+            "user-detail",
+            "get",
+            reverse("api:v1:user-detail", kwargs={"username": "test"}),
+        )
+
+    def test_create_user(self):
+        self.assertWithinBudget(
+            "user-list", "post", reverse("api:v1:user-list"), data={"username": "new"}
+        )
+
+    def test_obtain_auth_token(self):
+        self.client.logout()
+        self.assertWithinBudget(
+            "auth-token",
+            "post",
+            reverse("api:v1:auth-token"),
+            data={"username": "test", "password": "password"},
+        )
+
+    def test_create_video_upload_url(self):
+        self.assertWithinBudget(
+            "videouploadurl-list", "post", reverse("api:v1:videouploadurl-list")
+        )
+
+    def test_get_video_upload_url(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="uploadid", owner=self.user, expires_at=2**31 - 1
+        )
+        self.assertWithinBudget(
+            "videouploadurl-detail",
+            "get",
+            reverse("api:v1:videouploadurl-detail", kwargs={"id": "uploadid"}),
+        )
+
+    def test_list_video_upload_urls(self):
+        self.assertWithinBudget(
+            "videouploadurl-list", "get", reverse("api:v1:videouploadurl-list")
+        )
+
+    def test_get_cache_stats(self):
+        self.assertWithinBudget("cache-stats", "get", reverse("api:v1:cache-stats"))
+
+    def test_api_root(self):
+        self.assertWithinBudget("api-root", "get", reverse("api:v1:api-root"))
+
+
+class RecorderTests(TestCase):
+    def test_database_cache_queries_are_cache_operations(self):
+        with budgets.Recorder() as recorder:
+            cache.set("key", "value")
+            cache.get_many(["key", "otherkey"])
+            models.Video.objects.count()
+
+        self.assertEqual(1, recorder.queries)
+        self.assertEqual(2, recorder.cache_operations)
+
+
+@override_settings(
+    MIDDLEWARE_CLASSES=[
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "api.v1.budgets.BudgetMiddleware",
+    ]
+)
+class BudgetMiddlewareTests(TestCase):
+    def test_budget_exceeded(self):
+        budget = budgets.Budget(queries=0, cache_operations=0, backend_calls=0, ms=0)
+        with patch.dict(budgets.BUDGETS, {("api-root", "GET"): budget}):
+            with self.assertLogs("api.v1.budgets", "WARNING") as logs:
+                self.client.get(reverse("api:v1:api-root"))
+
+        self.assertIn("(api-root): ms=", logs.output[0])
+
+    def test_head_requests_have_get_budgets(self):
+        budget = budgets.Budget(queries=0, cache_operations=0, backend_calls=0, ms=0)
+        with patch.dict(budgets.BUDGETS, {("api-root", "GET"): budget}):
+            with self.assertLogs("api.v1.budgets", "WARNING") as logs:
+                self.client.head(reverse("api:v1:api-root"))
+
+        self.assertIn("HEAD", logs.output[0])
+
+    def test_budget_not_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs("api.v1.budgets", "WARNING"):
+                self.client.get(reverse("api:v1:api-root"))
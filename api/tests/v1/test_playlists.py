@@ -1,5 +1,11 @@
+import hashlib
+import json
+
 from django.core.urlresolvers import reverse
 
+from mock import patch
+from rest_framework.renderers import JSONRenderer
+
 from pipeline.tests import factories
 
 from .base import BaseAuthenticatedTests
@@ -8,7 +14,7 @@ from .base import BaseAuthenticatedTests
 class PlaylistTests(BaseAuthenticatedTests):
     def test_list_playlists_no_result(self):
         response = self.client.get(reverse("api:v1:playlist-list"))
-        playlists = response.json()
+        playlists = response.json()["results"]
         self.assertEqual([], playlists)
 
     def test_get_playlist(self):
@@ -24,6 +30,40 @@ class PlaylistTests(BaseAuthenticatedTests):
         self.assertEqual("Funkadelic playlist", result["name"])
         self.assertEqual(playlist.public_id, result["id"])
 
+    def test_get_playlist_not_modified(self):
+        playlist = factories.PlaylistFactory(name="Funkadelic", owner=self.user)
+        url = reverse("api:v1:playlist-detail", kwargs={"id": playlist.public_id})
+        response1 = self.client.get(url)
+        response2 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+        playlist.name = "Rockabilly"
+        playlist.save()
+        response3 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+
+        self.assertEqual(304, response2.status_code)
+        self.assertEqual(200, response3.status_code)
+        self.assertEqual("Rockabilly", response3.json()["name"])
+
+    def test_get_playlist_is_rendered_once(self):
+        playlist = factories.PlaylistFactory(name="Funkadelic", owner=self.user)
+        url = reverse("api:v1:playlist-detail", kwargs={"id": playlist.public_id})
+        with patch.object(
+            JSONRenderer, "render", autospec=True, side_effect=JSONRenderer.render
+        ) as mock_render:
+            response = self.client.get(url)
+
+        self.assertEqual(1, mock_render.call_count)
+        self.assertEqual(
+            '"{}"'.format(hashlib.md5(response.content).hexdigest()), response["ETag"]
+        )
+
+    def test_list_playlists_not_modified(self):
+        factories.PlaylistFactory(owner=self.user)
+        url = reverse("api:v1:playlist-list")
+        response1 = self.client.get(url)
+        response2 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+
+        self.assertEqual(304, response2.status_code)
+
     def test_search_playlist_by_name(self):
         factories.PlaylistFactory(
             name="Funkadelic", owner=self.user, public_id="funkid"
@@ -35,11 +75,34 @@ class PlaylistTests(BaseAuthenticatedTests):
         response_funk = self.client.get(
             reverse("api:v1:playlist-list"), data={"name": "Funk"}
         )
-        playlists_funk = response_funk.json()
+        playlists_funk = response_funk.json()["results"]
 
         self.assertEqual(1, len(playlists_funk))
         self.assertEqual("funkid", playlists_funk[0]["id"])
 
+    def test_list_playlists_pagination(self):
+        for public_id in ["playlist1", "playlist2", "playlist3"]:
+            factories.PlaylistFactory(public_id=public_id, owner=self.user)
+
+        page1 = self.client.get(
+            reverse("api:v1:playlist-list"), data={"page_size": 2}
+        ).json()
+        page2 = self.client.get(page1["next"]).json()
+
+        self.assertEqual(
+            ["playlist1", "playlist2"], [p["id"] for p in page1["results"]]
+        )
+        self.assertEqual(["playlist3"], [p["id"] for p in page2["results"]])
+        self.assertIsNone(page2["next"])
+
+    def test_list_playlists_sparse_fields(self):
+        factories.PlaylistFactory(public_id="playlistid", owner=self.user)
+        playlists = self.client.get(
+            reverse("api:v1:playlist-list"), data={"fields": "id"}
+        ).json()["results"]
+
+        self.assertEqual([{"id": "playlistid"}], playlists)
+
     def test_insert_video_in_playlist(self):
         playlist = factories.PlaylistFactory(
             name="Funkadelic playlist", owner=self.user
@@ -93,3 +156,110 @@ class PlaylistTests(BaseAuthenticatedTests):
         )
 
         self.assertEqual(204, response.status_code)
+
+    def test_add_videos_to_playlist(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        video1 = factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        factories.VideoFactory(public_id="videoid3", owner=self.user)
+        playlist.videos.add(video1)
+
+        response = self.client.post(
+            reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id}),
+            data={"ids": ["videoid1", "videoid2", "videoid3"]},
+        )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(
+            ["videoid1", "videoid2", "videoid3"],
+            sorted(playlist.videos.values_list("public_id", flat=True)),
+        )
+
+    def test_add_videos_to_playlist_json(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+
+        response = self.client.post(
+            reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id}),
+            data=json.dumps({"ids": ["videoid1"]}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(1, playlist.videos.count())
+
+    def test_add_videos_invalidates_video_lists(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url, data={"playlist_id": playlist.public_id})
+        self.client.post(
+            reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id}),
+            data={"ids": ["videoid1"]},
+        )
+        videos = self.client.get(url, data={"playlist_id": playlist.public_id}).json()[
+            "results"
+        ]
+
+        self.assertEqual(["videoid1"], [video["id"] for video in videos])
+
+    def test_add_videos_from_different_user_to_playlist(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=factories.UserFactory())
+
+        response = self.client.post(
+            reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id}),
+            data={"ids": ["videoid1", "videoid2"]},
+        )
+
+        self.assertEqual(404, response.status_code)
+        self.assertIn("videoid2", response.json()["ids"])
+        self.assertEqual(0, playlist.videos.count())
+
+    def test_add_videos_missing_ids(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+
+        response = self.client.post(
+            reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id})
+        )
+
+        self.assertEqual(400, response.status_code)
+
+    def test_add_videos_non_string_ids(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        url = reverse("api:v1:playlist-add-videos", kwargs={"id": playlist.public_id})
+
+        for ids in ([123], [{"a": 1}], [["videoid1"]]):
+            response = self.client.post(
+                url, data=json.dumps({"ids": ids}), content_type="application/json"
+            )
+            self.assertEqual(400, response.status_code)
+            self.assertIn("ids", response.json())
+
+    def test_remove_videos_non_string_ids(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        response = self.client.post(
+            reverse("api:v1:playlist-remove-videos", kwargs={"id": playlist.public_id}),
+            data=json.dumps({"ids": [{"a": 1}]}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(400, response.status_code)
+
+    def test_remove_videos_from_playlist(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        video1 = factories.VideoFactory(public_id="videoid1", owner=self.user)
+        video2 = factories.VideoFactory(public_id="videoid2", owner=self.user)
+        video3 = factories.VideoFactory(public_id="videoid3", owner=self.user)
+        playlist.videos.add(video1, video2, video3)
+
+        response = self.client.post(
+            reverse("api:v1:playlist-remove-videos", kwargs={"id": playlist.public_id}),
+            data={"ids": ["videoid1", "videoid3"]},
+        )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(
+            ["videoid2"], list(playlist.videos.values_list("public_id", flat=True))
+        )
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from api.v1 import serializers
+from pipeline import models
+from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend
+
+
+@override_plugin_backend(
+    subtitle_url=lambda *args: "http://example.com/sub.vtt",
+    video_url=lambda *args: "http://example.com/video.mp4",
+)
+class VideoValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.user = factories.UserFactory()
+        video1 = factories.VideoFactory(
+            public_id="videoid1", title="Vidéo 1", owner=self.user
+        )
+        video1.formats.create(name="HD", bitrate=256)
+        video1.formats.create(name="SD", bitrate=128.5)
+        factories.SubtitleFactory(video=video1, public_id="subid1", language="fr")
+        factories.SubtitleFactory(video=video1, public_id="subid2", language="en")
+        video2 = factories.VideoFactory(public_id="videoid2", owner=self.user)
+        models.ProcessingState.objects.filter(video=video2).update(
+            status=models.ProcessingState.STATUS_PROCESSING, progress=42
+        )
+        video3 = factories.VideoFactory(public_id="videoid3", owner=self.user)
+        models.ProcessingState.objects.filter(video=video3).delete()
+        # Video from a different user
+        factories.VideoFactory(public_id="videoid4")
+
+    def get_queryset(self):
+        return models.Video.objects.filter(owner=self.user).order_by("id")
+
+    def assertSerializedEqual(self, fields=None):
+        queryset = self.get_queryset().prefetch_related("subtitles", "formats")
+        expected = serializers.VideoSerializer(queryset, many=True, fields=fields).data
+        values_serializer = serializers.VideoValuesSerializer(fields=fields)
+        actual = values_serializer.serialize(
+            values_serializer.values(self.get_queryset())
+        )
+
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(expected), renderer.render(actual))
+
+    def test_serialize_all_fields(self):
+        self.assertSerializedEqual()
+
+    def test_serialize_sparse_fields(self):
+        self.assertSerializedEqual(fields=["id", "processing"])
+        self.assertSerializedEqual(fields=["formats", "title"])
+
+    def test_serialize_no_video(self):
+        values_serializer = serializers.VideoValuesSerializer()
+        rows = values_serializer.values(models.Video.objects.none())
+
+        with self.assertNumQueries(0):
+            self.assertEqual([], values_serializer.serialize(rows))
+
+    def test_serialize_num_queries(self):
+        values_serializer = serializers.VideoValuesSerializer()
+        rows = values_serializer.values(self.get_queryset())
+
+        # Videos, subtitles and formats
+        with self.assertNumQueries(3):
+            values_serializer.serialize(rows)
+
+
+@override_plugin_backend(
+    subtitle_url=lambda *args: "http://example.com/sub.vtt",
+    video_url=lambda *args: "http://example.com/video.mp4",
+)
+class LoadVideoTests(TestCase):
+    def test_load_video(self):
+        video = factories.VideoFactory(public_id="videoid")
+        video.formats.create(name="HD", bitrate=256)
+        factories.SubtitleFactory(video=video, public_id="subid", language="fr")
+
+        with self.assertNumQueries(3):
+            data, owner_id = serializers.load_video("videoid")
+
+        self.assertEqual(video.owner_id, owner_id)
+        self.assertEqual(serializers.VideoSerializer(video).data, data)
+
+    def test_load_missing_video(self):
+        self.assertIsNone(serializers.load_video("videoid"))
+
+
+class BenchmarkVideoSerializersTests(TestCase):
+    def test_benchmark(self):
+        stdout = StringIO()
+        call_command("benchmark-video-serializers", "2", "--repeat", "1", stdout=stdout)
+
+        self.assertIn("2 videos: model serializer", stdout.getvalue())
+        self.assertEqual(0, models.Video.objects.count())
@@ -72,7 +72,10 @@ Also I have utf8 characters: é û ë ï 你好."""
         subfile = StringIO(self.SRT_CONTENT)
 
         upload_subtitle = Mock(side_effect=ValueError)
-        with override_plugin_backend(upload_subtitle=upload_subtitle):
+        with override_plugin_backend(
+            upload_subtitle=upload_subtitle,
+            subtitle_url=lambda *args: "http://example.com/sub.vtt",
+        ):
             self.assertRaises(
                 ValueError,
                 self.client.post,
@@ -89,7 +92,8 @@ Also I have utf8 characters: é û ë ï 你好."""
         subfile = StringIO(self.SRT_CONTENT)
 
         with override_plugin_backend(
-            upload_subtitle=lambda *args: None, subtitle_url=lambda *args: None
+            upload_subtitle=lambda *args: None,
+            subtitle_url=lambda *args: "http://example.com/sub.vtt",
         ):
             response = self.client.post(
                 url,
@@ -141,9 +145,9 @@ Also I have utf8 characters: é û ë ï 你好."""
 
     def test_get_subtitle(self):
         video = factories.VideoFactory(public_id="videoid", owner=self.user)
-        factories.SubtitleFactory(video=video, public_id="subid", language="fr")
 
         with override_plugin_backend(subtitle_url=lambda *args: "http://sub.vtt"):
+            factories.SubtitleFactory(video=video, public_id="subid", language="fr")
             response = self.client.get(
                 reverse("api:v1:subtitle-detail", kwargs={"id": "subid"})
             )
@@ -154,6 +158,18 @@ Also I have utf8 characters: é û ë ï 你好."""
         self.assertEqual("subid", subtitle["id"])
         self.assertEqual("http://sub.vtt", subtitle["url"])
 
+    def test_get_subtitle_sparse_fields(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+
+        with override_plugin_backend(subtitle_url=lambda *args: "http://sub.vtt"):
+            factories.SubtitleFactory(video=video, public_id="subid", language="fr")
+            response = self.client.get(
+                reverse("api:v1:subtitle-detail", kwargs={"id": "subid"}),
+                data={"fields": "language"},
+            )
+
+        self.assertEqual({"language": "fr"}, response.json())
+
     def test_delete_subtitle(self):
         video = factories.VideoFactory(public_id="videoid", owner=self.user)
         factories.SubtitleFactory(video=video, public_id="subid", language="fr")
@@ -7,7 +7,7 @@ from mock import Mock
 
 from pipeline import models
 from pipeline.tests import factories
-from pipeline.tests.utils import override_plugin_backend
+from pipeline.tests.utils import capture_on_commit_callbacks, override_plugin_backend
 
 from .base import BaseAuthenticatedTests
 
@@ -59,6 +59,18 @@ class VideoUploadUrlTests(BaseAuthenticatedTests):
         self.assertEqual(1, len(response.json()))
         self.assertEqual("unused", response.json()[0]["id"])
 
+    def test_get_videouploadurl_after_creation(self):
+        url = reverse("api:v1:videouploadurl-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        with capture_on_commit_callbacks(execute=True):
+            factories.VideoUploadUrlFactory(
+                public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+            )
+        response2 = self.client.get(url)
+
+        self.assertEqual(404, response1.status_code)
+        self.assertEqual(200, response2.status_code)
+
     def test_create_videouploadurl_with_playlist(self):
         playlist = factories.PlaylistFactory(owner=self.user)
         response = self.client.post(
@@ -1,7 +1,9 @@
+import gzip
 import json
 from io import BytesIO
 from time import time
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.test.utils import override_settings
@@ -9,9 +11,10 @@ from django.utils.timezone import datetime, get_current_timezone
 
 from mock import Mock, patch
 
-from pipeline import models
+from pipeline import cache as video_cache
+from pipeline import locks, models, tasks
 from pipeline.tests import factories
-from pipeline.tests.utils import override_plugin_backend
+from pipeline.tests.utils import capture_on_commit_callbacks, override_plugin_backend
 
 from .base import BaseAuthenticatedTests
 
@@ -40,11 +43,16 @@ class VideosTests(BaseAuthenticatedTests):
     # 5) formats prefetch
     VIDEOS_LIST_NUM_QUERIES = VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT + 2
 
+    def setUp(self):
+        super(VideosTests, self).setUp()
+        # Database rollbacks between tests do not invalidate the cache
+        cache.clear()
+
     def test_list_videos(self):
         url = reverse("api:v1:video-list")
         with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT):
             response = self.client.get(url)
-        videos = response.json()
+        videos = response.json()["results"]
 
         self.assertEqual(200, response.status_code)
         self.assertEqual([], videos)
@@ -52,11 +60,58 @@ class VideosTests(BaseAuthenticatedTests):
     def test_list_videos_with_different_owners(self):
         video1 = factories.VideoFactory(owner=self.user)
         factories.VideoFactory(owner=factories.UserFactory())
-        videos = self.client.get(reverse("api:v1:video-list")).json()
+        videos = self.client.get(reverse("api:v1:video-list")).json()["results"]
 
         self.assertEqual(1, len(videos))
         self.assertEqual(video1.public_id, videos[0]["id"])
 
+    def test_list_videos_pagination(self):
+        for public_id in ["video1", "video2", "video3"]:
+            factories.VideoFactory(public_id=public_id, owner=self.user)
+
+        response1 = self.client.get(reverse("api:v1:video-list"), {"page_size": 2})
+        page1 = response1.json()
+        # Create a video while the client is browsing pages: it should appear at
+        # the end of the list, without shifting page boundaries
+        factories.VideoFactory(public_id="video4", owner=self.user)
+        page2 = self.client.get(page1["next"]).json()
+
+        self.assertEqual(200, response1.status_code)
+        self.assertIsNone(page1["previous"])
+        self.assertEqual(["video1", "video2"], [v["id"] for v in page1["results"]])
+        self.assertEqual(["video3", "video4"], [v["id"] for v in page2["results"]])
+        self.assertIsNotNone(page2["previous"])
+        self.assertIsNone(page2["next"])
+
+    @override_settings(API_PAGE_SIZE=2, API_MAX_PAGE_SIZE=3)
+    def test_list_videos_page_size(self):
+        for _ in range(5):
+            factories.VideoFactory(owner=self.user)
+        url = reverse("api:v1:video-list")
+
+        self.assertEqual(2, len(self.client.get(url).json()["results"]))
+        self.assertEqual(
+            1, len(self.client.get(url, {"page_size": 1}).json()["results"])
+        )
+        self.assertEqual(
+            3, len(self.client.get(url, {"page_size": 100}).json()["results"])
+        )
+        self.assertEqual(
+            2, len(self.client.get(url, {"page_size": "abc"}).json()["results"])
+        )
+
+    def test_list_videos_invalid_cursor(self):
+        response = self.client.get(reverse("api:v1:video-list"), {"cursor": "a"})
+        self.assertEqual(404, response.status_code)
+
+    @override_settings(API_PAGE_SIZE=1, API_UNPAGINATED_USERNAMES=["test"])
+    def test_list_videos_unpaginated_legacy_user(self):
+        factories.VideoFactory(owner=self.user)
+        factories.VideoFactory(owner=self.user)
+        videos = self.client.get(reverse("api:v1:video-list")).json()
+
+        self.assertEqual(2, len(videos))
+
     def test_get_video(self):
         video = factories.VideoFactory(
             public_id="videoid", title="Some title", owner=self.user
@@ -93,7 +148,7 @@ class VideosTests(BaseAuthenticatedTests):
     def test_get_not_processing_video(self):
         factories.VideoFactory(public_id="videoid", title="videotitle", owner=self.user)
         url = reverse("api:v1:video-list")
-        videos = self.client.get(url).json()
+        videos = self.client.get(url).json()["results"]
 
         self.assertEqual(1, len(videos))
         self.assertEqual("videoid", videos[0]["id"])
@@ -109,7 +164,7 @@ class VideosTests(BaseAuthenticatedTests):
         video.processing_state.progress = 42
         video.processing_state.status = models.ProcessingState.STATUS_PROCESSING
         video.processing_state.save()
-        videos = self.client.get(reverse("api:v1:video-list")).json()
+        videos = self.client.get(reverse("api:v1:video-list")).json()["results"]
 
         self.assertEqual("processing", videos[0]["processing"]["status"])
         self.assertEqual(42, videos[0]["processing"]["progress"])
@@ -128,7 +183,59 @@ class VideosTests(BaseAuthenticatedTests):
 
         self.assertEqual(200, response_detail.status_code)
         self.assertEqual(200, response_list.status_code)
-        self.assertEqual([], response_list.json())
+        self.assertEqual([], response_list.json()["results"])
+
+    def test_list_videos_sparse_fields(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        factories.SubtitleFactory(video=video)
+        # Neither processing states, nor subtitles and formats are fetched
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT):
+            response = self.client.get(
+                reverse("api:v1:video-list"), data={"fields": "id,title"}
+            )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [{"id": "videoid", "title": video.title}], response.json()["results"]
+        )
+
+    def test_list_videos_invalid_fields(self):
+        response = self.client.get(
+            reverse("api:v1:video-list"), data={"fields": "id,owner"}
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("fields", response.json())
+
+    def test_get_video_sparse_fields(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response_miss = self.client.get(url, data={"fields": "id,processing"})
+        self.client.get(url)
+        response_hit = self.client.get(url, data={"fields": "id,processing"})
+
+        self.assertEqual(["id", "processing"], list(response_miss.json().keys()))
+        self.assertEqual(response_miss.json(), response_hit.json())
+
+    def test_get_video_sparse_fields_are_not_cached(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        self.client.get(url, data={"fields": "id"})
+        video = self.client.get(url).json()
+
+        self.assertIn("title", video)
+
+    def test_list_videos_by_ids_sparse_fields(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(reverse("api:v1:video-detail", kwargs={"id": "videoid1"}))
+        videos = self.client.get(
+            url, data={"ids": "videoid1,videoid2", "fields": "id"}
+        ).json()
+
+        self.assertEqual([{"id": "videoid1"}, {"id": "videoid2"}], videos)
+        self.assertIsNone(video_cache.get("videoid2"))
 
     def test_get_video_with_cache(self):
         factories.VideoFactory(public_id="videoid", title="Some title", owner=self.user)
@@ -144,6 +251,315 @@ class VideosTests(BaseAuthenticatedTests):
         self.assertEqual(200, response1.status_code)
         self.assertEqual(200, response2.status_code)
 
+    def test_list_videos_with_cache(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+            response1 = self.client.get(url)
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+            response2 = self.client.get(url)
+
+        self.assertEqual(200, response2.status_code)
+        self.assertEqual(response1.json(), response2.json())
+
+    def test_list_videos_cache_is_invalidated_on_video_change(self):
+        with capture_on_commit_callbacks(execute=True):
+            video = factories.VideoFactory(
+                public_id="videoid", title="title1", owner=self.user
+            )
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        video.title = "title2"
+        with capture_on_commit_callbacks(execute=True):
+            video.save()
+        videos = self.client.get(url).json()["results"]
+
+        self.assertEqual("title2", videos[0]["title"])
+
+    def test_list_videos_cache_is_invalidated_on_related_object_change(self):
+        with capture_on_commit_callbacks(execute=True):
+            video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        video.processing_state.status = models.ProcessingState.STATUS_SUCCESS
+        with capture_on_commit_callbacks(execute=True):
+            video.processing_state.save()
+        videos = self.client.get(url).json()["results"]
+
+        self.assertEqual("success", videos[0]["processing"]["status"])
+
+    def test_list_videos_cache_is_invalidated_on_processing_progress(self):
+        with capture_on_commit_callbacks(execute=True):
+            factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        # Processing state updates from the transcoding task do not send signals
+        with capture_on_commit_callbacks(execute=True):
+            tasks.update_processing_state(
+                "videoid",
+                1,
+                status=models.ProcessingState.STATUS_PROCESSING,
+                progress=42,
+            )
+        videos = self.client.get(url).json()["results"]
+
+        self.assertEqual("processing", videos[0]["processing"]["status"])
+        self.assertEqual(42, videos[0]["processing"]["progress"])
+
+    def test_list_videos_in_playlist_cache_is_invalidated(self):
+        with capture_on_commit_callbacks(execute=True):
+            playlist = factories.PlaylistFactory(owner=self.user)
+            video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        videos_before = self.client.get(
+            url, data={"playlist_id": playlist.public_id}
+        ).json()["results"]
+        with capture_on_commit_callbacks(execute=True):
+            playlist.videos.add(video)
+        videos_after = self.client.get(
+            url, data={"playlist_id": playlist.public_id}
+        ).json()["results"]
+
+        self.assertEqual([], videos_before)
+        self.assertEqual(["videoid"], [v["id"] for v in videos_after])
+
+    def test_list_videos_cache_is_not_shared_between_owners(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+
+        factories.UserFactory(username="other")
+        other_user = models.User.objects.get(username="other")
+        other_user.set_password("password")
+        other_user.save()
+        self.client.login(username="other", password="password")
+        videos = self.client.get(url).json()["results"]
+
+        self.assertEqual([], videos)
+
+    def test_get_cached_video_from_different_owner(self):
+        other_user = factories.UserFactory()
+        video = factories.VideoFactory(public_id="videoid", owner=other_user)
+        video_cache.set("videoid", {"id": "videoid"}, video.owner_id)
+        response = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        )
+
+        self.assertEqual(404, response.status_code)
+
+    def test_list_videos_by_ids(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        factories.VideoFactory(public_id="videoid3", owner=self.user)
+        response = self.client.get(
+            reverse("api:v1:video-list"),
+            data={"ids": "videoid3,videoid1,unknownid,videoid3"},
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["videoid3", "videoid1"], [v["id"] for v in response.json()])
+
+    def test_list_videos_by_ids_with_live_progress(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url, data={"ids": "videoid"})
+        video_cache.publish_progress("videoid", "processing", 42)
+        videos = self.client.get(url, data={"ids": "videoid"}).json()
+
+        self.assertEqual("processing", videos[0]["processing"]["status"])
+        self.assertEqual(42, videos[0]["processing"]["progress"])
+
+    def test_list_videos_by_ids_includes_failed_videos(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        models.ProcessingState.objects.filter(video=video).update(
+            status=models.ProcessingState.STATUS_FAILED
+        )
+        videos = self.client.get(
+            reverse("api:v1:video-list"), data={"ids": "videoid"}
+        ).json()
+
+        self.assertEqual(["videoid"], [v["id"] for v in videos])
+
+    def test_list_videos_by_ids_with_cache(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        url = reverse("api:v1:video-list")
+        # Populate the cache with a detail call
+        self.client.get(reverse("api:v1:video-detail", kwargs={"id": "videoid1"}))
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+            response1 = self.client.get(url, data={"ids": "videoid1,videoid2"})
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+            response2 = self.client.get(url, data={"ids": "videoid1,videoid2"})
+
+        self.assertEqual(2, len(response1.json()))
+        self.assertEqual(response1.json(), response2.json())
+
+    def test_list_videos_by_ids_from_different_owner(self):
+        other_user = factories.UserFactory()
+        video = factories.VideoFactory(public_id="videoid", owner=other_user)
+        video_cache.set("videoid", {"id": "videoid"}, video.owner_id)
+        videos = self.client.get(
+            reverse("api:v1:video-list"), data={"ids": "videoid"}
+        ).json()
+
+        self.assertEqual([], videos)
+
+    @override_settings(API_MAX_PAGE_SIZE=2)
+    def test_list_videos_by_too_many_ids(self):
+        response = self.client.get(
+            reverse("api:v1:video-list"), data={"ids": "videoid1,videoid2,videoid3"}
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("ids", response.json())
+
+    def test_get_cached_video_content(self):
+        factories.VideoFactory(public_id="videoid", title="Vidéo", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        response2 = self.client.get(url)
+
+        self.assertEqual(response1.content, response2.content)
+        self.assertEqual(response1["Content-Type"], response2["Content-Type"])
+        self.assertEqual(response1["ETag"], response2["ETag"])
+
+    def test_get_compressed_video(self):
+        factories.VideoFactory(public_id="videoid", title="a" * 100, owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response_plain = self.client.get(url)
+        response_gzip = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response_refused = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+
+        self.assertNotIn("Content-Encoding", response_plain)
+        self.assertEqual("gzip", response_gzip["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response_gzip["Vary"])
+        self.assertEqual(response_plain.content, gzip.decompress(response_gzip.content))
+        self.assertNotIn("Content-Encoding", response_refused)
+
+    def test_list_compressed_videos(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        response_plain = self.client.get(url)
+        response_gzip = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual("gzip", response_gzip["Content-Encoding"])
+        self.assertEqual(response_plain.content, gzip.decompress(response_gzip.content))
+
+    def test_get_video_not_modified(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+            response2 = self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response1["ETag"],
+                HTTP_ACCEPT="application/json",
+            )
+
+        self.assertIn("ETag", response1)
+        self.assertIn("Last-Modified", response1)
+        self.assertEqual(304, response2.status_code)
+        self.assertEqual(b"", response2.content)
+        self.assertEqual(response1["ETag"], response2["ETag"])
+
+    def test_get_video_modified(self):
+        with capture_on_commit_callbacks(execute=True):
+            video = factories.VideoFactory(
+                public_id="videoid", title="title1", owner=self.user
+            )
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        video.title = "title2"
+        with capture_on_commit_callbacks(execute=True):
+            video.save()
+        response2 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+
+        self.assertEqual(200, response2.status_code)
+        self.assertEqual("title2", response2.json()["title"])
+        self.assertNotEqual(response1["ETag"], response2["ETag"])
+
+    def test_get_video_not_modified_since(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        response2 = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response1["Last-Modified"]
+        )
+
+        self.assertEqual(304, response2.status_code)
+
+    def test_list_videos_not_modified(self):
+        with capture_on_commit_callbacks(execute=True):
+            factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        response1 = self.client.get(url)
+        response2 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+        with capture_on_commit_callbacks(execute=True):
+            factories.VideoFactory(owner=self.user)
+        response3 = self.client.get(url, HTTP_IF_NONE_MATCH=response1["ETag"])
+
+        self.assertEqual(304, response2.status_code)
+        self.assertEqual(200, response3.status_code)
+        self.assertEqual(2, len(response3.json()["results"]))
+
+    @override_settings(API_EXPORT_CHUNK_SIZE=2)
+    def test_export_videos(self):
+        for index in range(5):
+            factories.VideoFactory(public_id="videoid{}".format(index), owner=self.user)
+        factories.VideoFactory(public_id="othervideoid")
+        url = reverse("api:v1:video-export")
+        response = self.client.get(url)
+        videos = json.loads(b"".join(response.streaming_content).decode())
+        # Each chunk of videos triggers 3 queries: videos, subtitles and formats
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH + 3 * 3 + 1):
+            b"".join(self.client.get(url).streaming_content)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/json", response["Content-Type"])
+        self.assertEqual(
+            ["videoid{}".format(index) for index in range(5)],
+            [video["id"] for video in videos],
+        )
+        self.assertEqual(
+            self.client.get(reverse("api:v1:video-list")).json()["results"], videos
+        )
+
+    def test_export_videos_ndjson(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        response = self.client.get(
+            reverse("api:v1:video-export"), data={"output": "ndjson", "fields": "id"}
+        )
+        content = b"".join(response.streaming_content).decode()
+
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        self.assertEqual('{"id":"videoid1"}\n{"id":"videoid2"}\n', content)
+
+    def test_export_no_video(self):
+        response = self.client.get(reverse("api:v1:video-export"))
+
+        self.assertEqual(b"[]", b"".join(response.streaming_content))
+
+    def test_export_videos_in_playlist(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        playlist.videos.add(
+            factories.VideoFactory(public_id="videoid1", owner=self.user)
+        )
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        response = self.client.get(
+            reverse("api:v1:video-export"), data={"playlist_id": playlist.public_id}
+        )
+        videos = json.loads(b"".join(response.streaming_content).decode())
+
+        self.assertEqual(["videoid1"], [video["id"] for video in videos])
+
+    def test_export_videos_invalid_output(self):
+        response = self.client.get(
+            reverse("api:v1:video-export"), data={"output": "xml"}
+        )
+
+        self.assertEqual(400, response.status_code)
+
     def test_list_failed_videos(self):
         video = factories.VideoFactory(
             public_id="videoid", title="videotitle", owner=self.user
@@ -151,7 +567,7 @@ class VideosTests(BaseAuthenticatedTests):
         video.processing_state.status = models.ProcessingState.STATUS_FAILED
         video.processing_state.save()
 
-        videos = self.client.get(reverse("api:v1:video-list")).json()
+        videos = self.client.get(reverse("api:v1:video-list")).json()["results"]
         self.assertEqual([], videos)
 
     def test_create_video_fails(self):
@@ -160,12 +576,21 @@ class VideosTests(BaseAuthenticatedTests):
         self.assertEqual(405, response.status_code)  # method not allowed
 
     @override_plugin_backend(
-        start_transcoding=lambda video_id: [], iter_formats=lambda video_id: []
+        upload_video=lambda video_id, file_object: None,
+        start_transcoding=lambda video_id: [],
+        create_thumbnail=lambda video_id, thumb_id: None,
+        iter_formats=lambda video_id: [],
     )
     def test_get_video_that_was_just_uploaded(self):
         factories.VideoUploadUrlFactory(
             public_video_id="videoid", expires_at=time() + 3600, owner=self.user
         )
+        video_file = BytesIO(b"some video content")
+        video_file.name = "video.mp4"
+        self.client.post(
+            reverse("api:v1:video-upload", kwargs={"video_id": "videoid"}),
+            {"name": "video.mp4", "file": video_file},
+        )
         response = self.client.get(
             reverse("api:v1:video-detail", kwargs={"id": "videoid"})
         )
@@ -186,14 +611,72 @@ class VideosTests(BaseAuthenticatedTests):
         mock_delete_video = Mock()
         factories.VideoFactory(public_id="videoid", owner=self.user)
         with override_plugin_backend(delete_video=mock_delete_video):
-            response = self.client.delete(
-                reverse("api:v1:video-detail", kwargs={"id": "videoid"})
-            )
+            with capture_on_commit_callbacks(execute=True):
+                response = self.client.delete(
+                    reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+                )
 
         self.assertEqual(204, response.status_code)
         self.assertEqual(0, models.Video.objects.count())
         mock_delete_video.assert_called_once_with("videoid")
 
+    def test_bulk_delete_videos(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        factories.VideoFactory(public_id="videoid3", owner=self.user)
+        mock_delete_video = Mock()
+        with override_plugin_backend(delete_video=mock_delete_video):
+            with capture_on_commit_callbacks(execute=True):
+                response = self.client.post(
+                    reverse("api:v1:video-bulk-delete"),
+                    data={"ids": ["videoid1", "videoid2"]},
+                )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(
+            ["videoid3"], list(models.Video.objects.values_list("public_id", flat=True))
+        )
+        self.assertEqual(2, mock_delete_video.call_count)
+        mock_delete_video.assert_any_call("videoid1")
+        mock_delete_video.assert_any_call("videoid2")
+
+    def test_bulk_delete_videos_from_different_user(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=factories.UserFactory())
+        response = self.client.post(
+            reverse("api:v1:video-bulk-delete"), data={"ids": ["videoid1", "videoid2"]}
+        )
+
+        self.assertEqual(404, response.status_code)
+        self.assertEqual(2, models.Video.objects.count())
+
+    def test_bulk_delete_videos_non_string_ids(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        for ids in ([123], [{"a": 1}], ["videoid", None]):
+            response = self.client.post(
+                reverse("api:v1:video-bulk-delete"),
+                data=json.dumps({"ids": ids}),
+                content_type="application/json",
+            )
+            self.assertEqual(400, response.status_code)
+            self.assertIn("ids", response.json())
+
+        self.assertEqual(1, models.Video.objects.count())
+
+    def test_bulk_delete_videos_invalidates_cache(self):
+        with capture_on_commit_callbacks(execute=True):
+            factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        with override_plugin_backend(delete_video=Mock()):
+            with capture_on_commit_callbacks(execute=True):
+                self.client.post(
+                    reverse("api:v1:video-bulk-delete"), data={"ids": ["videoid"]}
+                )
+
+        self.assertEqual([], self.client.get(url).json()["results"])
+        self.assertIsNone(video_cache.get("videoid"))
+
     @override_plugin_backend(
         subtitle_url=lambda vid, sid, lang: "http://example.com/{}.vtt".format(sid)
     )
@@ -268,7 +751,7 @@ class VideosTests(BaseAuthenticatedTests):
         response = self.client.get(
             reverse("api:v1:video-list"), data={"playlist_id": playlist.public_id}
         )
-        videos = response.json()
+        videos = response.json()["results"]
 
         self.assertEqual(1, len(videos))
         self.assertEqual(video_in_playlist.public_id, videos[0]["id"])
@@ -320,3 +803,164 @@ class VideosTests(BaseAuthenticatedTests):
 
         self.assertEqual(400, response.status_code)
         self.assertIn("file", response.json())
+
+    def test_get_video_progress(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        response = self.client.get(
+            reverse("api:v1:video-progress", kwargs={"id": "videoid"})
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {"version": 0, "status": "pending", "progress": 0}, response.json()
+        )
+
+    def test_get_published_video_progress(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        record = video_cache.publish_progress("videoid", "processing", 42)
+        response = self.client.get(
+            reverse("api:v1:video-progress", kwargs={"id": "videoid"})
+        )
+
+        self.assertEqual(record, response.json())
+
+    def test_wait_for_video_progress(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        record = video_cache.publish_progress("videoid", "processing", 42)
+
+        def publish(timeout):
+            video_cache.publish_progress("videoid", "processing", 43)
+
+        with patch.object(
+            locks.LocalListener, "wait", side_effect=publish
+        ) as mock_wait:
+            response = self.client.get(
+                reverse("api:v1:video-progress", kwargs={"id": "videoid"}),
+                {"since": record["version"]},
+            )
+
+        self.assertEqual(1, mock_wait.call_count)
+        self.assertEqual(43, response.json()["progress"])
+        self.assertLess(record["version"], response.json()["version"])
+
+    def test_wait_for_video_progress_releases_database_connection(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        record = video_cache.publish_progress("videoid", "processing", 42)
+        mock_connection = Mock(in_atomic_block=False)
+        closed_before_wait = []
+
+        def wait(timeout):
+            closed_before_wait.append(mock_connection.close.call_count)
+            if len(closed_before_wait) == 2:
+                video_cache.publish_progress("videoid", "processing", 43)
+
+        with patch("api.v1.views.connection", mock_connection):
+            with patch.object(locks.LocalListener, "wait", side_effect=wait):
+                response = self.client.get(
+                    reverse("api:v1:video-progress", kwargs={"id": "videoid"}),
+                    {"since": record["version"]},
+                )
+
+        self.assertEqual(43, response.json()["progress"])
+        # The connection is closed before each wait, after progress checks
+        self.assertEqual([1, 2], closed_before_wait)
+
+    def test_wait_for_video_progress_is_notified(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        record = video_cache.publish_progress("videoid", "processing", 42)
+        notifications = []
+
+        def wait(listener, timeout):
+            video_cache.publish_progress("videoid", "processing", 43)
+            notifications.append(listener.event.is_set())
+
+        # Waiters are woken up by progress notifications, without polling
+        with patch.object(locks.LocalListener, "wait", wait):
+            with override_settings(API_PROGRESS_POLL_INTERVAL=10):
+                self.client.get(
+                    reverse("api:v1:video-progress", kwargs={"id": "videoid"}),
+                    {"since": record["version"]},
+                )
+
+        self.assertEqual([True], notifications)
+
+    @override_settings(API_PROGRESS_TIMEOUT=0)
+    def test_wait_for_video_progress_timeout(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        record = video_cache.publish_progress("videoid", "processing", 42)
+        response = self.client.get(
+            reverse("api:v1:video-progress", kwargs={"id": "videoid"}),
+            {"since": record["version"]},
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(record, response.json())
+
+    def test_get_unknown_video_is_cached(self):
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+            response2 = self.client.get(url)
+
+        self.assertEqual(404, response1.status_code)
+        self.assertEqual(404, response2.status_code)
+
+    def test_get_unknown_video_does_not_take_recompute_lock(self):
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        self.client.get(url)
+        with patch.object(cache, "add") as mock_add:
+            response = self.client.get(url)
+
+        self.assertEqual(404, response.status_code)
+        mock_add.assert_not_called()
+
+    def test_get_unknown_video_after_creation(self):
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        factories.VideoFactory(public_id="videoid")
+        response2 = self.client.get(url)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        response3 = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid2"})
+        )
+
+        self.assertEqual(404, response1.status_code)
+        # Videos that belong to other users remain missing
+        self.assertEqual(404, response2.status_code)
+        self.assertEqual(200, response3.status_code)
+
+    def test_get_video_with_live_progress(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        response1 = self.client.get(url)
+        video_cache.publish_progress("videoid", "processing", 42)
+        response2 = self.client.get(url)
+
+        self.assertEqual("pending", response1.json()["processing"]["status"])
+        self.assertEqual("processing", response2.json()["processing"]["status"])
+        self.assertEqual(42, response2.json()["processing"]["progress"])
+        self.assertNotEqual(response1["ETag"], response2["ETag"])
+        # Progress updates do not modify the cache
+        self.assertEqual(
+            "pending",
+            video_cache.load(video_cache.get("videoid"))["processing"]["status"],
+        )
+
+    def test_get_video_progress_invalid_version(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        response = self.client.get(
+            reverse("api:v1:video-progress", kwargs={"id": "videoid"}),
+            {"since": "invalid"},
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("since", response.json())
+
+    def test_cannot_get_progress_of_other_user_video(self):
+        factories.VideoFactory(public_id="videoid")
+        video_cache.publish_progress("videoid", "processing", 42)
+        response = self.client.get(
+            reverse("api:v1:video-progress", kwargs={"id": "videoid"})
+        )
+
+        self.assertEqual(404, response.status_code)
@@ -1,7 +1,14 @@
+import json
+
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
+from mock import patch
+from rest_framework.schemas import SchemaGenerator
+
+from api.v1 import views
+
 
 class ApiV1Tests(TestCase):
     def test_unauthenticated_root(self):
@@ -26,3 +33,81 @@ class ApiV1Tests(TestCase):
         )
         self.assertEqual(200, response.status_code)
         self.assertEqual({"token": user.auth_token.key}, response.json())
+
+
+class SchemaViewTests(TestCase):
+    def setUp(self):
+        views._schemas.clear()
+        self.addCleanup(views._schemas.clear)
+        user = User.objects.create(username="test")
+        user.set_password("password")
+        user.save()
+        self.client.login(username="test", password="password")
+
+    def get_schema(self, **kwargs):
+        return self.client.get("/api/v1/docs", {"format": "openapi"}, **kwargs)
+
+    def test_get_schema(self):
+        response = self.get_schema()
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn("/api/v1/videos/", json.loads(response.content.decode())["paths"])
+        self.assertIn("ETag", response)
+
+    def test_schema_is_generated_once(self):
+        with patch(
+            "api.v1.views.SchemaGenerator", side_effect=SchemaGenerator
+        ) as mock_generator:
+            response1 = self.get_schema()
+            response2 = self.get_schema()
+
+        self.assertEqual(1, mock_generator.call_count)
+        self.assertEqual(response1.content, response2.content)
+        self.assertEqual(response1["ETag"], response2["ETag"])
+
+    def test_schema_not_modified(self):
+        etag = self.get_schema()["ETag"]
+        response = self.get_schema(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+
+    def test_schema_depends_on_access_level(self):
+        response1 = self.get_schema()
+        User.objects.filter(username="test").update(is_staff=True)
+        response2 = self.get_schema()
+
+        self.assertNotIn(
+            "/api/v1/users/", json.loads(response1.content.decode())["paths"]
+        )
+        self.assertIn("/api/v1/users/", json.loads(response2.content.decode())["paths"])
+        self.assertNotEqual(response1["ETag"], response2["ETag"])
+
+    def test_swagger_ui(self):
+        response = self.client.get("/api/v1/docs", HTTP_ACCEPT="text/html")
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn("ETag", response)
+
+
+class CacheStatsViewTests(TestCase):
+    def test_get_cache_stats(self):
+        user = User.objects.create(username="admin", is_staff=True)
+        user.set_password("password")
+        user.save()
+        self.client.login(username="admin", password="password")
+        response = self.client.get(reverse("api:v1:cache-stats"))
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn("local", response.json())
+        self.assertIn("shared", response.json())
+        self.assertIn("contention_rate", response.json()["locks"])
+
+    def test_cache_stats_require_staff_user(self):
+        user = User.objects.create(username="test")
+        user.set_password("password")
+        user.save()
+        self.client.login(username="test", password="password")
+        response = self.client.get(reverse("api:v1:cache-stats"))
+
+        self.assertEqual(403, response.status_code)
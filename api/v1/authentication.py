@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.encoding import force_bytes
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from pipeline.utils import LRUCache
+
+# Authentication data is cached for a short time in the shared cache, and for
+# an even shorter time in the local memory of each process: local entries
+# cannot be invalidated from other processes, so that a revoked token or a
+# modified password may remain valid for up to LOCAL_CACHE_TIMEOUT seconds in
+# other processes.
+TOKEN_CACHE_TIMEOUT = 300
+CREDENTIALS_CACHE_TIMEOUT = 300
+LOCAL_CACHE_TIMEOUT = 10
+LOCAL_CACHE_SIZE = 1000
+# Users are cached without their password hash and personal data: only the
+# fields that are required to check permissions are stored, and the other
+# fields are deferred, i.e: they are loaded from the database on access.
+USER_CACHED_FIELDS = ("id", "username", "is_active", "is_staff", "is_superuser")
+
+_local_cache = LRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TIMEOUT)
+
+
+def _get(cache_key):
+    value = _local_cache.get(cache_key)
+    if value is None:
+        value = cache.get(cache_key)
+        if value is not None:
+            _local_cache.set(cache_key, value)
+    return value
+
+
+def _set(cache_key, value, timeout):
+    cache.set(cache_key, value, timeout)
+    _local_cache.set(cache_key, value)
+
+
+def _delete(cache_key):
+    _local_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def _digest(*values):
+    """
+    Keyed digest of secret values, such that they do not leak in the cache.
+    """
+    message = b"\0".join(force_bytes(value) for value in values)
+    return hmac.new(
+        force_bytes(settings.SECRET_KEY), message, hashlib.sha256
+    ).hexdigest()
+
+
+def _dump_user(user):
+    return {field_name: getattr(user, field_name) for field_name in USER_CACHED_FIELDS}
+
+
+def _load_user(values):
+    model = get_user_model()
+    # Values must be passed in the order of the model fields
+    field_names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        router.db_for_read(model),
+        field_names,
+        [values[field_name] for field_name in field_names],
+    )
+
+
+def _token_cache_key(key):
+    return "AUTH_TOKEN:" + _digest(key)
+
+
+def _credentials_cache_key(username):
+    return "AUTH_CREDENTIALS:" + _digest(username)
+
+
+def get_token(key):
+    """
+    Returns:
+        token (Token): token object along with its user, whose uncached fields
+        are deferred; None in case of a cache miss.
+    """
+    user_values = _get(_token_cache_key(key))
+    if user_values is None:
+        return None
+    user = _load_user(user_values)
+    token = Token.from_db(router.db_for_read(Token), ("key", "user_id"), (key, user.pk))
+    token.user = user
+    return token
+
+
+def set_token(token):
+    _set(_token_cache_key(token.key), _dump_user(token.user), TOKEN_CACHE_TIMEOUT)
+
+
+def invalidate_token(key):
+    _delete(_token_cache_key(key))
+
+
+def get_credentials_user(username, password):
+    """
+    Returns:
+        user (User): user whose credentials were previously verified, with
+        deferred uncached fields; None in case of a cache miss or if the
+        password does not match the verified password.
+    """
+    value = _get(_credentials_cache_key(username))
+    if value is None:
+        return None
+    digest, user_values = value
+    if not hmac.compare_digest(digest, _digest(username, password)):
+        return None
+    return _load_user(user_values)
+
+
+def set_credentials_user(username, password, user):
+    """
+    Store the digest of verified credentials. Only the last verified password
+    of each user is stored.
+    """
+    _set(
+        _credentials_cache_key(username),
+        (_digest(username, password), _dump_user(user)),
+        CREDENTIALS_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_credentials(username):
+    _delete(_credentials_cache_key(username))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for `TokenAuthentication` which avoids fetching tokens
+    and users from the database on every request. Cached tokens are
+    invalidated whenever tokens or users are modified (see `api.models`).
+    """
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related("user").get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            set_token(token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        return (token.user, token)
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Drop-in replacement for `BasicAuthentication` which avoids hashing the
+    password of every request. Successfully verified credentials are cached
+    as a keyed digest, and they are invalidated whenever users are modified
+    (see `api.models`). Failed attempts are never cached, such that password
+    guesses still cost a full password hash.
+    """
+
+    def authenticate_credentials(self, userid, password):
+        user = get_credentials_user(userid, password)
+        if user is None:
+            credentials = {
+                get_user_model().USERNAME_FIELD: userid,
+                "password": password,
+            }
+            user = authenticate(**credentials)
+            if user is None:
+                raise exceptions.AuthenticationFailed(_("Invalid username/password."))
+            set_credentials_user(userid, password, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        return (user, None)
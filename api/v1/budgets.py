@@ -0,0 +1,249 @@
+"""
+Performance budgets of the API endpoints.
+
+Each route and http method of the API declares the maximum number of SQL
+queries, cache operations and plugin backend calls that a single request may
+trigger, along with a latency budget. Budgets are enforced in the test suite, and
+`BudgetMiddleware` can be enabled to log budget overruns in production.
+"""
+import logging
+from collections import namedtuple
+from timeit import default_timer
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.deprecation import MiddlewareMixin
+
+from pipeline import backend
+
+logger = logging.getLogger(__name__)
+
+Budget = namedtuple("Budget", ["queries", "cache_operations", "backend_calls", "ms"])
+
+# Budgets are indexed by url name and http method; HEAD requests have the
+# budgets of GET requests. Budgets are targets: they are set close to the
+# measured costs, such that regressions are detected. Note that:
+# - authenticating a request costs 2 queries;
+# - deleting videos costs a few queries per 100 deleted videos, because related
+# objects are collected and deleted in batches by django; cache invalidations
+# are performed once, when the transaction is committed. The
+# "video-bulk-delete" budget is for 200 videos;
+# - exporting videos costs 3 queries per chunk of API_EXPORT_CHUNK_SIZE videos.
+# - waiting for video progress costs a cache operation per poll, and up to
+# API_PROGRESS_TIMEOUT seconds.
+# - locking a video for processing costs up to 6 cache operations with the
+# default lock backend, and notifying its release costs a query (see
+# pipeline.locks). Tests notify releases in-process.
+BUDGETS = {
+    ("api-root", "GET"): Budget(queries=2, cache_operations=0, backend_calls=0, ms=200),
+    ("auth-token", "POST"): Budget(
+        queries=2, cache_operations=0, backend_calls=0, ms=500
+    ),
+    ("cache-stats", "GET"): Budget(
+        queries=2, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("playlist-list", "GET"): Budget(
+        queries=3, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("playlist-detail", "GET"): Budget(
+        queries=3, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("playlist-add-video", "POST"): Budget(
+        queries=6, cache_operations=1, backend_calls=0, ms=200
+    ),
+    ("playlist-remove-video", "POST"): Budget(
+        queries=6, cache_operations=1, backend_calls=0, ms=200
+    ),
+    ("playlist-add-videos", "POST"): Budget(
+        queries=8, cache_operations=1, backend_calls=0, ms=500
+    ),
+    ("playlist-remove-videos", "POST"): Budget(
+        queries=6, cache_operations=1, backend_calls=0, ms=500
+    ),
+    ("subtitle-detail", "GET"): Budget(
+        queries=3, cache_operations=1, backend_calls=0, ms=200
+    ),
+    ("subtitle-detail", "DELETE"): Budget(
+        queries=4, cache_operations=4, backend_calls=1, ms=200
+    ),
+    ("user-list", "GET"): Budget(
+        queries=3, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("user-list", "POST"): Budget(
+        queries=5, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("user-detail", "GET"): Budget(
+        queries=3, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("video-list", "GET"): Budget(
+        queries=5, cache_operations=5, backend_calls=0, ms=500
+    ),
+    ("video-bulk-delete", "POST"): Budget(
+        queries=30, cache_operations=10, backend_calls=2, ms=5000
+    ),
+    ("video-export", "GET"): Budget(
+        queries=6, cache_operations=0, backend_calls=0, ms=1000
+    ),
+    ("video-detail", "GET"): Budget(
+        queries=5, cache_operations=10, backend_calls=0, ms=500
+    ),
+    ("video-detail", "PATCH"): Budget(
+        queries=6, cache_operations=4, backend_calls=1, ms=500
+    ),
+    ("video-detail", "DELETE"): Budget(
+        queries=22, cache_operations=11, backend_calls=1, ms=500
+    ),
+    ("video-progress", "GET"): Budget(
+        queries=3, cache_operations=26, backend_calls=0, ms=30000
+    ),
+    ("video-subtitles", "POST"): Budget(
+        queries=9, cache_operations=5, backend_calls=2, ms=500
+    ),
+    ("video-thumbnail", "POST"): Budget(
+        queries=8, cache_operations=4, backend_calls=3, ms=500
+    ),
+    ("video-upload", "POST"): Budget(
+        queries=28, cache_operations=28, backend_calls=5, ms=1000
+    ),
+    ("videouploadurl-list", "GET"): Budget(
+        queries=3, cache_operations=0, backend_calls=0, ms=200
+    ),
+    ("videouploadurl-list", "POST"): Budget(
+        queries=3, cache_operations=1, backend_calls=0, ms=200
+    ),
+    ("videouploadurl-detail", "GET"): Budget(
+        queries=3, cache_operations=1, backend_calls=0, ms=200
+    ),
+}
+
+
+class Recorder(object):
+    """
+    Record the SQL queries, cache operations and plugin backend calls that are
+    triggered in the current thread.
+
+    Usage:
+
+        with Recorder() as recorder:
+            do_something()
+        print(recorder.queries, recorder.cache_operations)
+    """
+
+    CACHE_OPERATIONS = (
+        "add",
+        "get",
+        "set",
+        "delete",
+        "get_many",
+        "set_many",
+        "delete_many",
+        "incr",
+        "decr",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.cache_operations = 0
+        self.backend_calls = 0
+        self.ms = 0
+        self._queries_context = CaptureQueriesContext(connection)
+        self._cache_attributes = {}
+        self._cache_depth = 0
+        self._cache_queries = 0
+        self._start = None
+
+    def __enter__(self):
+        self._queries_context.__enter__()
+        # Cache objects are thread-local, so that we can safely wrap them
+        cache = caches[DEFAULT_CACHE_ALIAS]
+        self._cache_attributes = {
+            name: cache.__dict__.get(name) for name in self.CACHE_OPERATIONS
+        }
+        for name in self.CACHE_OPERATIONS:
+            setattr(cache, name, self._count_cache_operation(getattr(cache, name)))
+        backend.requested.connect(self._count_backend_call)
+        self._start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.ms = (default_timer() - self._start) * 1000
+        backend.requested.disconnect(self._count_backend_call)
+        cache = caches[DEFAULT_CACHE_ALIAS]
+        for name, attribute in self._cache_attributes.items():
+            if attribute is None:
+                delattr(cache, name)
+            else:
+                # Nested recorders
+                setattr(cache, name, attribute)
+        self._queries_context.__exit__(exc_type, exc_value, traceback)
+        # SQL queries of the database cache backend are counted as cache
+        # operations
+        self.queries = len(self._queries_context) - self._cache_queries
+
+    def _count_cache_operation(self, operation):
+        def wrapped(*args, **kwargs):
+            # Cache backends may implement operations on top of other
+            # operations, e.g: `set_many` calls `set`. Only the outermost
+            # operation is counted.
+            if self._cache_depth == 0:
+                self.cache_operations += 1
+                queries_before = len(connection.queries_log)
+            self._cache_depth += 1
+            try:
+                return operation(*args, **kwargs)
+            finally:
+                self._cache_depth -= 1
+                if self._cache_depth == 0:
+                    self._cache_queries += len(connection.queries_log) - queries_before
+
+        return wrapped
+
+    def _count_backend_call(self, **kwargs):
+        self.backend_calls += 1
+
+    def get_overruns(self, budget):
+        """
+        Returns:
+            overruns (list): (name, measured, budgeted) tuples of all exceeded
+            budget values.
+        """
+        return [
+            (name, getattr(self, name), getattr(budget, name))
+            for name in Budget._fields
+            if getattr(self, name) > getattr(budget, name)
+        ]
+
+
+class BudgetMiddleware(MiddlewareMixin):
+    """
+    Log a warning whenever an API request exceeds its budget. This middleware
+    is not enabled by default: add "api.v1.budgets.BudgetMiddleware" to the
+    MIDDLEWARE_CLASSES setting to enable it. Note that SQL queries are recorded
+    in memory for the duration of each request.
+    """
+
+    def process_request(self, request):
+        request.budget_recorder = Recorder().__enter__()
+
+    def process_response(self, request, response):
+        recorder = getattr(request, "budget_recorder", None)
+        if recorder is None:
+            return response
+        recorder.__exit__(None, None, None)
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.url_name if resolver_match else None
+        method = "GET" if request.method == "HEAD" else request.method
+        budget = BUDGETS.get((url_name, method))
+        if budget is not None:
+            for name, measured, budgeted in recorder.get_overruns(budget):
+                logger.warning(
+                    "Budget exceeded for %s %s (%s): %s=%d > %d",
+                    request.method,
+                    request.path,
+                    url_name,
+                    name,
+                    measured,
+                    budgeted,
+                )
+        return response
@@ -0,0 +1,44 @@
+from django.conf import settings
+
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination for list endpoints.
+
+    Results are ordered by primary key, which is both indexed and unique: page
+    boundaries are thus stable, even when objects are created while a client
+    is iterating over the pages. Clients may request smaller or larger pages
+    with the `page_size` query parameter, up to the API_MAX_PAGE_SIZE setting.
+
+    Users listed in the API_UNPAGINATED_USERNAMES setting keep receiving the
+    full, unpaginated list of results.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.user.username in settings.API_UNPAGINATED_USERNAMES:
+            return None
+        return super(CursorPagination, self).paginate_queryset(
+            queryset, request, view=view
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        # Support paginating querysets of `.values()` rows
+        if isinstance(instance, dict):
+            return str(instance[ordering[0].lstrip("-")])
+        return super(CursorPagination, self)._get_position_from_instance(
+            instance, ordering
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.API_PAGE_SIZE
+        if page_size <= 0:
+            return settings.API_PAGE_SIZE
+        return min(page_size, settings.API_MAX_PAGE_SIZE)
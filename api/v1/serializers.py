@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from time import time
 
 from django.contrib.auth.models import User
@@ -8,8 +9,24 @@ from pipeline import models
 
 from . import utils
 
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
-class PlaylistSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin(object):
+    """
+    Serializers that accept an optional `fields` argument: when defined, only
+    the listed fields are serialized.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class PlaylistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.CharField(source="public_id", read_only=True)
     owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -19,14 +36,14 @@ class PlaylistSerializer(serializers.ModelSerializer):
 
 
 class ProcessingStateSerializer(serializers.ModelSerializer):
-    started_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ")
+    started_at = serializers.DateTimeField(format=DATETIME_FORMAT)
 
     class Meta:
         fields = ("status", "progress", "started_at")
         model = models.ProcessingState
 
 
-class SubtitleSerializer(serializers.ModelSerializer):
+class SubtitleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.CharField(source="public_id", read_only=True)
     video_id = serializers.CharField(source="video__id", read_only=True)
     url = serializers.CharField(read_only=True)
@@ -78,7 +95,7 @@ class VideoFormatSerializer(serializers.ModelSerializer):
         model = models.VideoFormat
 
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.CharField(source="public_id", read_only=True)
     processing = ProcessingStateSerializer(source="processing_state", read_only=True)
     subtitles = SubtitleSerializer(many=True, read_only=True)
@@ -88,3 +105,162 @@ class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ("id", "title", "processing", "subtitles", "formats", "thumbnail")
         model = models.Video
+
+
+def load_video(public_video_id):
+    """
+    Serialize a video for the pipeline cache (see the VIDEO_CACHE_LOADER
+    setting).
+
+    Returns:
+        data (dict)
+        owner_id (int)
+
+        None is returned if the video does not exist.
+    """
+    video = (
+        models.Video.objects.select_related("processing_state")
+        .prefetch_related("subtitles", "formats")
+        .filter(public_id=public_video_id)
+        .first()
+    )
+    if video is None:
+        return None
+    return VideoSerializer(video).data, video.owner_id
+
+
+class VideoValuesSerializer(object):
+    """
+    Read-only alternative to VideoSerializer for video lists. Videos and their
+    related objects are fetched with `.values()` queries and assembled as
+    plain dicts, which skips both model instantiation and DRF field
+    machinery. The output is identical to that of VideoSerializer.
+
+    Usage:
+
+        serializer = VideoValuesSerializer(fields=["id", "title"])
+        rows = serializer.values(queryset)
+        data = serializer.serialize(rows)
+    """
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (list): serialized field names; None for all fields.
+        """
+        self.fields = [
+            field_name
+            for field_name in VideoSerializer.Meta.fields
+            if fields is None or field_name in fields
+        ]
+
+    def values(self, queryset):
+        """
+        Convert a video queryset to a queryset of rows. The result can be
+        filtered, sliced and paginated just like the original queryset.
+        """
+        columns = ["id", "public_id", "title", "thumbnail_url"]
+        if "processing" in self.fields:
+            columns += [
+                "processing_state__id",
+                "processing_state__status",
+                "processing_state__progress",
+                "processing_state__started_at",
+            ]
+        # Related objects are fetched in `serialize`
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows):
+        """
+        Args:
+            rows (iterable): video rows, as returned by `values`.
+
+        Returns:
+            data (list): serialized videos.
+        """
+        rows = list(rows)
+        video_ids = [row["id"] for row in rows]
+        subtitles = {}
+        formats = {}
+        if "subtitles" in self.fields:
+            subtitles = self._get_related(
+                models.Subtitle.objects.order_by("id"),
+                video_ids,
+                ("public_id", "language", "url"),
+                self._serialize_subtitle,
+            )
+        if "formats" in self.fields:
+            formats = self._get_related(
+                models.VideoFormat.objects.order_by("id"),
+                video_ids,
+                ("name", "url", "bitrate"),
+                self._serialize_format,
+            )
+        return [self._serialize_video(row, subtitles, formats) for row in rows]
+
+    def _get_related(self, queryset, video_ids, columns, serialize):
+        """
+        Fetch and serialize related objects in a single query.
+
+        Returns:
+            related (dict): lists of serialized objects indexed by video id.
+        """
+        related = {}
+        if not video_ids:
+            return related
+        for row in queryset.filter(video_id__in=video_ids).values("video_id", *columns):
+            related.setdefault(row["video_id"], []).append(serialize(row))
+        return related
+
+    def _serialize_video(self, row, subtitles, formats):
+        data = OrderedDict()
+        for field_name in self.fields:
+            if field_name == "id":
+                data["id"] = row["public_id"]
+            elif field_name == "title":
+                data["title"] = row["title"]
+            elif field_name == "processing":
+                data["processing"] = self._serialize_processing_state(row)
+            elif field_name == "subtitles":
+                data["subtitles"] = subtitles.get(row["id"], [])
+            elif field_name == "formats":
+                data["formats"] = formats.get(row["id"], [])
+            elif field_name == "thumbnail":
+                data["thumbnail"] = row["thumbnail_url"]
+        return data
+
+    def _serialize_processing_state(self, row):
+        if row["processing_state__id"] is None:
+            return None
+        started_at = row["processing_state__started_at"]
+        return OrderedDict(
+            [
+                ("status", row["processing_state__status"]),
+                ("progress", float(row["processing_state__progress"])),
+                (
+                    "started_at",
+                    started_at.strftime(DATETIME_FORMAT) if started_at else None,
+                ),
+            ]
+        )
+
+    @staticmethod
+    def _serialize_subtitle(row):
+        # Note that SubtitleSerializer does not output the "video_id" field
+        return OrderedDict(
+            [
+                ("id", row["public_id"]),
+                ("language", row["language"]),
+                ("url", row["url"]),
+            ]
+        )
+
+    @staticmethod
+    def _serialize_format(row):
+        return OrderedDict(
+            [
+                ("name", row["name"]),
+                ("url", row["url"]),
+                ("bitrate", float(row["bitrate"])),
+            ]
+        )
@@ -38,5 +38,6 @@ router.register(
 urlpatterns = [
     url(r"^", include(router.urls)),
     url(r"^docs$", views.schema_view),
+    url(r"^cache-stats$", views.cache_stats_view, name="cache-stats"),
     url(r"^auth-token/", authtoken_views.obtain_auth_token, name="auth-token"),
 ]
@@ -7,3 +7,30 @@ def random_password(length=20):
     Return a random password of given length.
     """
     return "".join([random.choice(string.printable) for _ in range(0, length)])
+
+
+def iter_chunks(queryset, chunk_size):
+    """
+    Iterate over a queryset in chunks of rows, ordered by primary key. Each
+    chunk is fetched with a separate keyset query, such that the whole
+    queryset is never loaded in memory at once.
+
+    Args:
+        queryset (QuerySet): model instances or `.values()` rows. In the latter
+            case, the "id" column must be part of the values.
+        chunk_size (int)
+
+    Yields:
+        chunk (list)
+    """
+    last_id = None
+    while True:
+        chunk_queryset = queryset.order_by("id")
+        if last_id is not None:
+            chunk_queryset = chunk_queryset.filter(id__gt=last_id)
+        chunk = list(chunk_queryset[:chunk_size].iterator())
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+        last_id = last["id"] if isinstance(last, dict) else last.id
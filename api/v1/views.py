@@ -1,43 +1,239 @@
+import json
+from time import time
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import connection, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
 
 import django_filters
 from rest_framework import filters, mixins
 from rest_framework import status as rest_status
 from rest_framework import viewsets
-from rest_framework.authentication import (
-    BasicAuthentication,
-    SessionAuthentication,
-    TokenAuthentication,
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import (
+    api_view,
+    detail_route,
+    list_route,
+    permission_classes,
+    renderer_classes,
 )
-from rest_framework.decorators import api_view, detail_route, renderer_classes
-from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.schemas import SchemaGenerator
 from rest_framework_swagger.renderers import OpenAPIRenderer, SwaggerUIRenderer
 
-from pipeline import cache, exceptions, models, tasks
+from pipeline import cache, exceptions, locks, models, tasks
 
-from . import serializers
+from . import pagination, serializers, utils
+from .authentication import CachedBasicAuthentication, CachedTokenAuthentication
 
 AUTHENTICATION_CLASSES = (
-    BasicAuthentication,
+    CachedBasicAuthentication,
     SessionAuthentication,
-    TokenAuthentication,
+    CachedTokenAuthentication,
 )
 PERMISSION_CLASSES = (IsAuthenticated,)
 
 
+# Generated API schemas, indexed by access level. Schemas only depend on the
+# code, so they are generated once per process.
+_schemas = {}
+
+
 @api_view()
 @renderer_classes([OpenAPIRenderer, SwaggerUIRenderer])
 def schema_view(request):
     """
     Swagger API documentation
     """
-    generator = SchemaGenerator(title="Videofront API")
-    return Response(generator.get_schema(request=request))
+    schema, digest = get_schema(request)
+    if request.accepted_renderer.format == OpenAPIRenderer.format:
+        # The rendered specification includes the request host
+        etag = cache.make_etag(
+            "{}:{}".format(digest, request.get_host()).encode("utf-8")
+        )
+        response = get_conditional_response(request, etag=etag)
+        return set_validator_headers(response or Response(schema), etag)
+    return Response(schema)
+
+
+@api_view()
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    """
+    Hit rates of the local and shared video caches, and lock contention. Local
+    caches are specific to each process: the returned statistics are those of
+    the process that serves the request.
+    """
+    stats = cache.get_stats()
+    stats["locks"] = locks.get_stats()
+    return Response(stats)
+
+
+def get_schema(request):
+    """
+    Schemas only include the endpoints that the user has access to, so we
+    generate one schema per access level.
+
+    Returns:
+        schema (coreapi.Document)
+        digest (str): fingerprint of the schema content
+    """
+    access_level = (bool(request.user.is_authenticated), request.user.is_staff)
+    if access_level not in _schemas:
+        schema = SchemaGenerator(title="Videofront API").get_schema(request=request)
+        specification = OpenAPIRenderer().get_openapi_specification(schema)
+        digest = cache.make_etag(
+            json.dumps(specification, sort_keys=True).encode("utf-8")
+        )
+        _schemas[access_level] = (schema, digest)
+    return _schemas[access_level]
+
+
+class ConditionalResponseMixin(object):
+    """
+    Add ETag (and Last-Modified, when available) headers to JSON responses, and
+    respond with 304 Not Modified to GET requests from clients that already
+    have an up-to-date copy of the content.
+    """
+
+    def cached_response(self, entry):
+        """
+        Build a response from a pipeline.cache entry. JSON responses are served
+        from the cached bytes, compressed if the client accepts it, without
+        decoding or re-encoding the content.
+        """
+        if not is_json_request(self.request):
+            return set_validator_headers(
+                Response(cache.load(entry)), entry["etag"], entry["modified"]
+            )
+        response = get_conditional_response(
+            self.request, etag=entry["etag"], last_modified=entry["modified"]
+        )
+        if response is None:
+            encoding = get_accepted_encoding(self.request, entry["encodings"])
+            if encoding is None:
+                response = HttpResponse(
+                    entry["content"], content_type=entry["content_type"]
+                )
+            else:
+                response = HttpResponse(
+                    entry["encodings"][encoding], content_type=entry["content_type"]
+                )
+                response["Content-Encoding"] = encoding
+        if entry["encodings"]:
+            # The Vary header of the response is overridden by the view headers
+            # in `finalize_response`
+            self.headers["Vary"] = ", ".join(
+                [
+                    value
+                    for value in (self.headers.get("Vary"), "Accept-Encoding")
+                    if value
+                ]
+            )
+        return set_validator_headers(response, entry["etag"], entry["modified"])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ConditionalResponseMixin, self).finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (
+            is_json_request(request)
+            and isinstance(response, Response)
+            and response.status_code == rest_status.HTTP_200_OK
+            and not response.has_header("ETag")
+        ):
+            # The response is rendered once, here: the rendered content is
+            # kept and it is not rendered again by django.
+            etag = cache.make_etag(response.render().content)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                response = super(ConditionalResponseMixin, self).finalize_response(
+                    request, not_modified, *args, **kwargs
+                )
+            response = set_validator_headers(response, etag)
+        return response
+
+
+class SparseFieldsMixin(object):
+    """
+    Restrict the fields of GET responses to those passed as a comma-separated
+    list in the `?fields=` argument, e.g: `?fields=id,title`. Related objects
+    that were not requested are not fetched from the database.
+    """
+
+    def get_requested_fields(self):
+        """
+        Returns:
+            fields (list): requested field names; None if all fields should be
+            returned.
+
+        Raise:
+            ValidationError: in case of unknown field names.
+        """
+        fields = self.request.query_params.get("fields")
+        if fields is None or self.request.method not in SAFE_METHODS:
+            return None
+        fields = [field_name for field_name in fields.split(",") if field_name]
+        available_fields = self.get_serializer_class().Meta.fields
+        invalid_fields = [
+            field_name for field_name in fields if field_name not in available_fields
+        ]
+        if invalid_fields:
+            raise ValidationError(
+                {
+                    "fields": "Invalid fields: {}. Available fields: {}".format(
+                        ", ".join(invalid_fields), ", ".join(available_fields)
+                    )
+                }
+            )
+        return fields
+
+    def is_field_requested(self, field_name):
+        fields = self.get_requested_fields()
+        return fields is None or field_name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_requested_fields())
+        return super(SparseFieldsMixin, self).get_serializer(*args, **kwargs)
+
+
+class NotFoundCacheMixin(object):
+    """
+    Cache the 404 results of object lookups for a short time, such that
+    repeated requests to unknown objects, e.g: from scrapers or broken embeds,
+    do not hit the database. Cached results are cleared as soon as the missing
+    object is created (see `pipeline.models`).
+    """
+
+    def get_not_found_key(self):
+        model_name = self.get_queryset().model._meta.model_name
+        owner_id = self.request.user.id
+        public_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return model_name, owner_id, public_id
+
+    def check_not_found(self):
+        """
+        Raise Http404 if the object was recently looked up and could not be
+        found. Views that look up objects elsewhere before calling
+        `get_object`, e.g: in the video cache, should call this first.
+        """
+        if cache.is_not_found(*self.get_not_found_key()):
+            raise Http404
+
+    def get_object(self):
+        self.check_not_found()
+        try:
+            return super(NotFoundCacheMixin, self).get_object()
+        except Http404:
+            cache.set_not_found(*self.get_not_found_key())
+            raise
 
 
 class PlaylistFilter(filters.FilterSet):
@@ -52,15 +248,19 @@ class PlaylistFilter(filters.FilterSet):
         fields = ["name"]
 
 
-class PlaylistViewSet(viewsets.ModelViewSet):
+class PlaylistViewSet(
+    ConditionalResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     """
-    List, update and create video playlists.
+    List, update and create video playlists. Playlist lists are paginated, just
+    like video lists. Returned fields can be restricted with `?fields=id,name`.
     """
 
     authentication_classes = AUTHENTICATION_CLASSES
     permission_classes = PERMISSION_CLASSES
 
     serializer_class = serializers.PlaylistSerializer
+    pagination_class = pagination.CursorPagination
 
     lookup_field = "public_id"
     lookup_url_kwarg = "id"
@@ -99,6 +299,81 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         playlist.videos.remove(video)
         return Response(status=rest_status.HTTP_204_NO_CONTENT)
 
+    @detail_route(methods=["POST"])
+    def add_videos(self, request, **kwargs):
+        """
+        Add multiple videos to a playlist
+
+        Video ids must be passed as an "ids" list. If one of the videos does not
+        exist, no video is added. Videos that already belong to the playlist
+        are ignored.
+        """
+        try:
+            playlist, video_ids = self._get_playlist_videos(request)
+        except ErrorResponse as e:
+            return e.response
+        through_model = models.Playlist.videos.through
+        with transaction.atomic():
+            existing_video_ids = set(
+                through_model.objects.filter(
+                    playlist=playlist, video_id__in=video_ids
+                ).values_list("video_id", flat=True)
+            )
+            through_model.objects.bulk_create(
+                [
+                    through_model(playlist_id=playlist.id, video_id=video_id)
+                    for video_id in video_ids
+                    if video_id not in existing_video_ids
+                ]
+            )
+        # Bulk operations do not trigger m2m signals
+        cache.invalidate_owner(request.user.id)
+        return Response(status=rest_status.HTTP_204_NO_CONTENT)
+
+    @detail_route(methods=["POST"])
+    def remove_videos(self, request, **kwargs):
+        """
+        Remove multiple videos from a playlist
+
+        Video ids must be passed as an "ids" list. If one of the videos does not
+        exist, no video is removed.
+        """
+        try:
+            playlist, video_ids = self._get_playlist_videos(request)
+        except ErrorResponse as e:
+            return e.response
+        models.Playlist.videos.through.objects.filter(
+            playlist=playlist, video_id__in=video_ids
+        ).delete()
+        # Bulk operations do not trigger m2m signals
+        cache.invalidate_owner(request.user.id)
+        return Response(status=rest_status.HTTP_204_NO_CONTENT)
+
+    def _get_playlist_videos(self, request):
+        """
+        Get the playlist and videos associated to a call to add_videos or
+        remove_videos. Video ownership is checked in a single query.
+
+        Returns:
+            playlist (models.Playlist)
+            video_ids (list): primary keys of the videos
+
+        Raise:
+            ErrorResponse
+        """
+        playlist = self.get_object()
+        public_video_ids = get_request_ids(request)
+        video_ids = dict(
+            models.Video.objects.filter(
+                owner=request.user, public_id__in=public_video_ids
+            )
+            .exclude(processing_state__status=models.ProcessingState.STATUS_FAILED)
+            .values_list("public_id", "id")
+        )
+        check_missing_ids(public_video_ids, video_ids)
+
+        return playlist, list(video_ids.values())
+
     def _get_playlist_video(self, request, **kwargs):
         """
         Get the playlist and video objects associated to a call to add_video or remove_video
@@ -136,7 +411,11 @@ class PlaylistViewSet(viewsets.ModelViewSet):
 
 
 class SubtitleViewSet(
-    mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    NotFoundCacheMixin,
+    SparseFieldsMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     authentication_classes = AUTHENTICATION_CLASSES
     permission_classes = PERMISSION_CLASSES
@@ -200,21 +479,48 @@ class VideoFilter(filters.FilterSet):
 class VideoQuerysetMixin(object):
     def get_queryset(self):
         # Note that here we do not exclude failed videos
-        queryset = (
-            models.Video.objects.select_related("processing_state")
-            .prefetch_related("subtitles", "formats")
-            .filter(owner=self.request.user)
-        )
+        queryset = models.Video.objects.filter(owner=self.request.user)
+
+        # Related objects are fetched only if they are part of the response
+        if self.is_field_requested("processing"):
+            queryset = queryset.select_related("processing_state")
+        prefetched = [
+            field_name
+            for field_name in ("subtitles", "formats")
+            if self.is_field_requested(field_name)
+        ]
+        if prefetched:
+            queryset = queryset.prefetch_related(*prefetched)
 
         return queryset
 
 
 class VideoListViewSet(
-    mixins.ListModelMixin, VideoQuerysetMixin, viewsets.GenericViewSet
+    ConditionalResponseMixin,
+    SparseFieldsMixin,
+    mixins.ListModelMixin,
+    VideoQuerysetMixin,
+    viewsets.GenericViewSet,
 ):
     """
     List available videos. Note that you may obtain only the videos that belong
     to a certain playlist by passing the argument `?playlist_id=xxxx`.
+
+    Results are paginated: follow the `next` and `previous` links to browse
+    pages, and pass `?page_size=n` to change the number of videos per page.
+
+    Multiple videos may also be fetched at once by passing a comma-separated
+    list of video ids: `?ids=id1,id2,id3`. In that case, the response is the
+    (unpaginated) list of the corresponding videos, in the same order. Just
+    like for individual video calls, failed videos are included and unknown
+    ids are ignored.
+
+    To make responses lighter, returned fields can be restricted with
+    `?fields=`. For instance, `?fields=id,title,processing` will not include
+    the video subtitles and formats.
+
+    To fetch a complete video catalog in a single call, use the `/videos/export`
+    endpoint.
     """
 
     # Similar to a generic model viewset, but without creation features. Video
@@ -224,6 +530,7 @@ class VideoListViewSet(
     permission_classes = PERMISSION_CLASSES
 
     serializer_class = serializers.VideoSerializer
+    pagination_class = pagination.CursorPagination
 
     filter_backends = (filters.DjangoFilterBackend,)
     filter_class = VideoFilter
@@ -235,8 +542,149 @@ class VideoListViewSet(
             .exclude(processing_state__status=models.ProcessingState.STATUS_FAILED)
         )
 
+    def list(self, request, *args, **kwargs):
+        if "ids" in request.query_params:
+            return self.list_ids(request)
+
+        # We override the `list` method in order to cache API results. Cached
+        # lists are invalidated whenever one of the owner videos is modified.
+        cache_key = cache.list_key(request.user.id, get_list_cache_params(request))
+        entry = cache.get_list(cache_key)
+        if entry is None:
+            entry = cache.set_list(cache_key, self.get_list_data(), request.user.id)
+        return self.cached_response(entry)
+
+    def get_list_data(self):
+        """
+        Equivalent to the `list` method of the parent class, but faster: videos
+        are serialized with a values serializer instead of a model serializer.
+        """
+        serializer = serializers.VideoValuesSerializer(
+            fields=self.get_requested_fields()
+        )
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page)).data
+        return serializer.serialize(rows)
+
+    @list_route(methods=["GET"])
+    def export(self, request):
+        """
+        Export all videos at once, as a streamed JSON array. Pass
+        `?output=ndjson` to obtain newline-delimited JSON instead, with one
+        video per line. Just like for video lists, results may be filtered with
+        `?playlist_id=` and `?fields=`.
+        """
+        output = request.query_params.get("output", "json")
+        if output not in ("json", "ndjson"):
+            return Response(
+                {"output": "Invalid output format: expected 'json' or 'ndjson'"},
+                status=rest_status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = serializers.VideoValuesSerializer(
+            fields=self.get_requested_fields()
+        )
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        chunks = (
+            serializer.serialize(chunk)
+            for chunk in utils.iter_chunks(rows, settings.API_EXPORT_CHUNK_SIZE)
+        )
+        if output == "ndjson":
+            return StreamingHttpResponse(
+                iter_ndjson(chunks), content_type="application/x-ndjson"
+            )
+        return StreamingHttpResponse(
+            iter_json_array(chunks), content_type="application/json"
+        )
+
+    @list_route(methods=["POST"])
+    def bulk_delete(self, request):
+        """
+        Delete multiple videos
+
+        Video ids must be passed as an "ids" list. If one of the videos does not
+        exist, no video is deleted. Video files are deleted from storage
+        asynchronously.
+        """
+        try:
+            public_video_ids = get_request_ids(request)
+            # Note that we do not exclude failed videos
+            found_video_ids = (
+                super(VideoListViewSet, self)
+                .get_queryset()
+                .filter(public_id__in=public_video_ids)
+                .values_list("public_id", flat=True)
+            )
+            check_missing_ids(public_video_ids, found_video_ids)
+        except ErrorResponse as e:
+            return e.response
+        tasks.delete_videos(list(public_video_ids))
+        return Response(status=rest_status.HTTP_204_NO_CONTENT)
+
+    def list_ids(self, request):
+        """
+        Fetch videos by id, first from the cache, then from the database. Cache
+        entries are shared with /video/<videoid> calls.
+        """
+        public_video_ids = []
+        for public_video_id in request.query_params["ids"].split(","):
+            if public_video_id and public_video_id not in public_video_ids:
+                public_video_ids.append(public_video_id)
+        if len(public_video_ids) > settings.API_MAX_PAGE_SIZE:
+            return Response(
+                {
+                    "ids": "Too many ids. Maximum allowed: {}".format(
+                        settings.API_MAX_PAGE_SIZE
+                    )
+                },
+                status=rest_status.HTTP_400_BAD_REQUEST,
+            )
+
+        fields = self.get_requested_fields()
+        entries = {
+            public_video_id: entry
+            for public_video_id, entry in cache.get_many(public_video_ids).items()
+            if entry.get("owner_id") == request.user.id
+        }
+        # Cached entries do not include progress updates
+        videos_data = {
+            public_video_id: filter_fields(video_data, fields)
+            for public_video_id, video_data in cache.load_many(entries).items()
+        }
+        missing_ids = [
+            public_video_id
+            for public_video_id in public_video_ids
+            if public_video_id not in videos_data
+        ]
+        if missing_ids:
+            # Note that we do not exclude failed videos
+            videos = (
+                super(VideoListViewSet, self)
+                .get_queryset()
+                .filter(public_id__in=missing_ids)
+            )
+            missing_data = {
+                video.public_id: self.get_serializer(video).data for video in videos
+            }
+            videos_data.update(missing_data)
+            if fields is None:
+                # Only complete video representations are cached
+                cache.set_many(missing_data, request.user.id)
+
+        return Response(
+            [
+                videos_data[public_video_id]
+                for public_video_id in public_video_ids
+                if public_video_id in videos_data
+            ]
+        )
+
 
 class VideoViewSet(
+    ConditionalResponseMixin,
+    NotFoundCacheMixin,
+    SparseFieldsMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -245,7 +693,8 @@ class VideoViewSet(
 ):
     """
     Viewset for individual videos. This is a view that allows a user to access
-    videos that have failed transcoding.
+    videos that have failed transcoding. Just like for video lists, returned
+    fields can be restricted with `?fields=`.
     """
 
     # Similar to a generic model viewset, but without creation features. Video
@@ -263,18 +712,105 @@ class VideoViewSet(
         # We override the `retrieve` method in order to cache API results for
         # /video/<videoid> calls.
         public_video_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
-        response_data = cache.get(public_video_id)
-        if response_data is None:
+        fields = self.get_requested_fields()
+        if fields is None:
+            # Concurrent cache misses are coalesced, such that popular videos
+            # are not serialized by all clients at once. Unknown videos are
+            # rejected before they take the recompute lock.
+            entry = cache.fetch(
+                public_video_id, self.serialize_video, check=self.check_not_found
+            )
+        else:
+            entry = cache.get(public_video_id)
+        if entry is None or entry.get("owner_id") != request.user.id:
+            # Videos that belong to other users will raise a 404 here
             instance = self.get_object()
             serializer = self.get_serializer(instance)
-            response_data = serializer.data
-            cache.set(public_video_id, response_data)
-        return Response(response_data)
+            if fields is not None:
+                # Only complete video representations are cached
+                return Response(serializer.data)
+            entry = cache.set(public_video_id, serializer.data, instance.owner_id)
+        # Cached entries do not include progress updates
+        entry = cache.overlay_progress(public_video_id, entry)
+        if fields is not None:
+            return Response(filter_fields(cache.load(entry), fields))
+        return self.cached_response(entry)
+
+    def serialize_video(self):
+        """
+        Returns:
+            data (dict)
+            owner_id (int)
+
+        Raise:
+            Http404 in case of a missing video or a video that belongs to
+            another user.
+        """
+        instance = self.get_object()
+        return self.get_serializer(instance).data, instance.owner_id
 
     def perform_destroy(self, instance):
-        # Delete external resources
-        super(VideoViewSet, self).perform_destroy(instance)
-        tasks.delete_video(instance.public_id)
+        # External resources are deleted asynchronously
+        tasks.delete_videos([instance.public_id])
+
+    @detail_route(methods=["GET"])
+    def progress(self, request, **kwargs):
+        """
+        Processing progress
+
+        Returns the "status" and "progress" of the video processing, along
+        with a "version" number. This is a long-polling endpoint: when the
+        version of the last received progress is passed as the `?since=`
+        argument, the response is delayed until the progress changes, or until
+        a timeout expires. In the latter case, the response is unchanged.
+        """
+        public_video_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        since = request.query_params.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ValidationError({"since": "Invalid version"})
+
+        # Videos that belong to other users will raise a 404 here
+        processing_state = get_object_or_404(
+            models.ProcessingState.objects.filter(
+                video__public_id=public_video_id, video__owner=request.user
+            ).values("status", "progress")
+        )
+        record = cache.get_progress(public_video_id)
+        if record is None:
+            record = dict(processing_state, version=0)
+
+        if since is not None and record["version"] <= since:
+            record = self._wait_for_progress(public_video_id, since, record)
+
+        return Response(record)
+
+    @staticmethod
+    def _wait_for_progress(public_video_id, since, record):
+        """
+        Wait for a progress record more recent than `since`. Waiters are woken
+        up by progress notifications, but they also check the progress every
+        API_PROGRESS_POLL_INTERVAL seconds, in case notifications are lost.
+        """
+        deadline = time() + settings.API_PROGRESS_TIMEOUT
+        with cache.listen_progress(public_video_id) as listener:
+            # Progress may have been published before we started listening
+            record = cache.get_progress(public_video_id) or record
+            while record["version"] <= since:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                # Waiting requests must not hold a database connection each:
+                # progress checks, which may query a database cache, reopen the
+                # connection for a short time only. Note that connections
+                # cannot be closed inside transactions, e.g: in tests.
+                if not connection.in_atomic_block:
+                    connection.close()
+                listener.wait(min(remaining, settings.API_PROGRESS_POLL_INTERVAL))
+                record = cache.get_progress(public_video_id) or record
+        return record
 
     @detail_route(methods=["POST"])
     def subtitles(self, request, **kwargs):
@@ -352,7 +888,7 @@ class VideoViewSet(
         )
 
 
-class VideoUploadUrlViewSet(viewsets.ModelViewSet):
+class VideoUploadUrlViewSet(NotFoundCacheMixin, viewsets.ModelViewSet):
     """
     Manage upload urls. Once an upload url has been created, it can be used by
     any user (even unauthenticated users) to upload a new video. Once a video
@@ -408,6 +944,149 @@ class UploadViewset(viewsets.ViewSet):
         return Response({"id": video_upload_url.public_video_id}, headers=cors_headers)
 
 
+def is_json_request(request):
+    """
+    Conditional responses are restricted to JSON content: in particular, the
+    browsable API is not affected.
+    """
+    renderer = getattr(request, "accepted_renderer", None)
+    return (
+        request.method in ("GET", "HEAD")
+        and getattr(renderer, "format", None) == "json"
+    )
+
+
+def get_accepted_encoding(request, encodings):
+    """
+    Select the preferred content-coding accepted by the client.
+
+    Args:
+        encodings (dict): available encodings, as stored in cache entries.
+
+    Returns:
+        encoding (str): None if none of the available encodings is accepted.
+    """
+    accepted = []
+    for value in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = value.partition(";")
+        quality = params.strip().lower()
+        if quality.startswith("q=") and is_zero(quality[2:]):
+            # Explicitly refused encoding
+            continue
+        accepted.append(coding.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in encodings and encoding in accepted:
+            return encoding
+    return None
+
+
+def is_zero(value):
+    try:
+        return float(value) == 0
+    except ValueError:
+        return False
+
+
+def set_validator_headers(response, etag, last_modified=None):
+    response["ETag"] = quote_etag(etag)
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def filter_fields(data, fields):
+    """
+    Restrict serialized data to a list of fields; all fields are kept if fields
+    is None.
+    """
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+
+def get_list_cache_params(request):
+    """
+    String that identifies the content of a list response: pagination links
+    depend on the host, and results depend on filters and page cursor.
+    """
+    return "{}?{}".format(
+        request.get_host(), urlencode(sorted(request.query_params.lists()), doseq=True)
+    )
+
+
+def get_request_ids(request):
+    """
+    Get the list of object ids passed as an "ids" list in the request data.
+
+    Returns:
+        ids (set)
+
+    Raise:
+        ErrorResponse
+    """
+    if hasattr(request.data, "getlist"):
+        ids = request.data.getlist("ids")
+    else:
+        ids = request.data.get("ids")
+    if not ids or not isinstance(ids, list):
+        raise ErrorResponse(
+            {"ids": "Missing argument"}, status=rest_status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(object_id, str) for object_id in ids):
+        raise ErrorResponse(
+            {"ids": "Ids must be strings"}, status=rest_status.HTTP_400_BAD_REQUEST
+        )
+    ids = set(ids)
+    if len(ids) > settings.API_MAX_PAGE_SIZE:
+        raise ErrorResponse(
+            {
+                "ids": "Too many ids. Maximum allowed: {}".format(
+                    settings.API_MAX_PAGE_SIZE
+                )
+            },
+            status=rest_status.HTTP_400_BAD_REQUEST,
+        )
+    return ids
+
+
+def check_missing_ids(public_video_ids, found_video_ids):
+    """
+    Raise:
+        ErrorResponse: in case some of the requested videos were not found.
+    """
+    missing_ids = set(public_video_ids) - set(found_video_ids)
+    if missing_ids:
+        raise ErrorResponse(
+            {"ids": "Videos do not exist: {}".format(", ".join(sorted(missing_ids)))},
+            status=rest_status.HTTP_404_NOT_FOUND,
+        )
+
+
+def iter_json_array(chunks):
+    """
+    Render chunks of serialized objects as a single JSON array, one object at
+    a time.
+    """
+    renderer = JSONRenderer()
+    yield b"["
+    separator = b""
+    for chunk in chunks:
+        for data in chunk:
+            yield separator + renderer.render(data)
+            separator = b","
+    yield b"]"
+
+
+def iter_ndjson(chunks):
+    """
+    Render chunks of serialized objects as newline-delimited JSON.
+    """
+    renderer = JSONRenderer()
+    for chunk in chunks:
+        for data in chunk:
+            yield renderer.render(data) + b"\n"
+
+
 class ErrorResponse(Exception):
     def __init__(self, response_data, status=None):
         super(ErrorResponse, self).__init__(response_data, status)
@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_local_caches():
+    """
+    In-process caches are not rolled back along with the test database, so
+    that they must be cleared before each test.
+    """
+    from api.v1 import authentication
+    from pipeline import cache, locks
+
+    authentication._local_cache.clear()
+    cache.clear_local()
+    locks.clear_stats()
+
+
+@pytest.fixture(autouse=True)
+def notify_lock_releases_locally():
+    """
+    Lock releases are notified in-process, such that tests do not depend on
+    the notification channel of the database.
+    """
+    from django.test.utils import override_settings
+
+    with override_settings(LOCK_NOTIFIER="pipeline.locks.LocalNotifier"):
+        yield
@@ -167,6 +167,35 @@ class Backend(pipeline.backend.BaseBackend):
         folder = self.get_video_folder_key(public_video_id)
         self.delete_objects(folder)
 
+    def delete_videos(self, public_video_ids):
+        failed_video_ids = set()
+        for bucket in [settings.S3_BUCKET, settings.S3_PRIVATE_BUCKET]:
+            video_ids = {}
+            for public_video_id in public_video_ids:
+                prefix = self.get_video_folder_key(public_video_id)
+                for key in self.iter_object_keys(bucket, prefix):
+                    video_ids[key] = public_video_id
+            keys = sorted(video_ids)
+            # Objects are deleted by batches of at most 1000 keys
+            for start in range(0, len(keys), 1000):
+                end = start + 1000
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket,
+                    Delete={
+                        "Objects": [{"Key": key} for key in keys[start:end]],
+                        "Quiet": True,
+                    },
+                )
+                # In quiet mode, only the objects that could not be deleted
+                # are listed in the response
+                for error in response.get("Errors", []):
+                    failed_video_ids.add(video_ids[error["Key"]])
+        return [
+            public_video_id
+            for public_video_id in public_video_ids
+            if public_video_id in failed_video_ids
+        ]
+
     def delete_subtitle(self, public_video_id, public_subtitle_id):
         prefix = self.SUBTITLE_BASE_KEY_PATTERN.format(
             video_id=public_video_id, subtitle_id=public_subtitle_id
@@ -180,9 +209,23 @@ class Backend(pipeline.backend.BaseBackend):
         and the private bucket.
         """
         for bucket in [settings.S3_BUCKET, settings.S3_PRIVATE_BUCKET]:
-            list_objects = self.s3_client.list_objects(Bucket=bucket, Prefix=prefix)
-            for obj in list_objects.get("Contents", []):
-                self.s3_client.delete_object(Bucket=bucket, Key=obj["Key"])
+            for key in list(self.iter_object_keys(bucket, prefix)):
+                self.s3_client.delete_object(Bucket=bucket, Key=key)
+
+    def iter_object_keys(self, bucket, prefix):
+        """
+        Iterate on the keys of all objects with the given prefix. S3 lists at
+        most 1000 objects per call, so objects are listed page by page.
+        """
+        kwargs = {"Bucket": bucket, "Prefix": prefix}
+        while True:
+            list_objects = self.s3_client.list_objects(**kwargs)
+            contents = list_objects.get("Contents", [])
+            for obj in contents:
+                yield obj["Key"]
+            if not list_objects.get("IsTruncated") or not contents:
+                break
+            kwargs["Marker"] = contents[-1]["Key"]
 
     def iter_formats(self, public_video_id):
         for resolution, _preset_id, bitrate in settings.ELASTIC_TRANSCODER_PRESETS:
@@ -48,6 +48,77 @@ class VideoUploadUrlTests(TestCase):
             Bucket="publics3bucket", Prefix="videos/videoid/"
         )
 
+    def test_delete_videos(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            list_objects=Mock(
+                side_effect=lambda Bucket, Prefix: {
+                    "Contents": [{"Key": Prefix + "file.mp4"}]
+                }
+            ),
+            delete_objects=Mock(return_value={}),
+        )
+        self.assertEqual([], backend.delete_videos(["videoid1", "videoid2"]))
+
+        self.assertEqual(4, backend.s3_client.list_objects.call_count)
+        self.assertEqual(2, backend.s3_client.delete_objects.call_count)
+        backend.s3_client.delete_objects.assert_any_call(
+            Bucket="publics3bucket",
+            Delete={
+                "Objects": [
+                    {"Key": "videos/videoid1/file.mp4"},
+                    {"Key": "videos/videoid2/file.mp4"},
+                ],
+                "Quiet": True,
+            },
+        )
+
+    def test_delete_videos_with_errors(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            list_objects=Mock(
+                side_effect=lambda Bucket, Prefix: {
+                    "Contents": [{"Key": Prefix + "file.mp4"}]
+                }
+            ),
+            delete_objects=Mock(
+                return_value={
+                    "Errors": [
+                        {"Key": "videos/videoid2/file.mp4", "Code": "AccessDenied"}
+                    ]
+                }
+            ),
+        )
+
+        self.assertEqual(["videoid2"], backend.delete_videos(["videoid1", "videoid2"]))
+
+    def test_delete_videos_with_many_objects(self):
+        def list_objects(Bucket, Prefix, Marker=""):
+            # Objects are listed by pages of 1000 keys
+            keys = [Prefix + "{:04d}.png".format(index) for index in range(1500)]
+            page = [key for key in keys if key > Marker][:1000]
+            return {
+                "Contents": [{"Key": key} for key in page],
+                "IsTruncated": page[-1] != keys[-1],
+            }
+
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            list_objects=Mock(side_effect=list_objects),
+            delete_objects=Mock(return_value={}),
+        )
+        backend.delete_videos(["videoid"])
+
+        self.assertEqual(4, backend.s3_client.list_objects.call_count)
+        self.assertEqual(4, backend.s3_client.delete_objects.call_count)
+        deleted_keys = [
+            obj["Key"]
+            for call in backend.s3_client.delete_objects.call_args_list
+            for obj in call[1]["Delete"]["Objects"]
+        ]
+        self.assertEqual(3000, len(deleted_keys))
+        self.assertEqual(1500, len(set(deleted_keys)))
+
     def test_delete_subtitle(self):
         backend = aws_backend.Backend()
         backend._s3_client = Mock(list_objects=Mock(return_value={}))
@@ -9,6 +9,19 @@ python_path = "/app"
 graceful_timeout = 90
 timeout = 90
 workers = 3
+# Asynchronous workers, such that long-polling requests to the video progress
+# endpoint do not block a worker each
+worker_class = "gevent"
+worker_connections = 1000
+
+
+def post_fork(server, worker):
+    # Database queries must yield to other requests instead of blocking the
+    # worker, since psycopg2 is not patched by gevent
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+
 
 # Logging
 # Using '-' for the access log file makes gunicorn log accesses to stdout
@@ -1,6 +1,7 @@
 import importlib
 
 from django.conf import settings
+from django.dispatch import Signal
 
 
 class BaseBackend(object):
@@ -49,6 +50,20 @@ class BaseBackend(object):
         """
         raise NotImplementedError
 
+    def delete_videos(self, video_ids):
+        """
+        Delete all resources associated to multiple videos. By default, videos
+        are deleted one by one: override this method to implement batched
+        deletion.
+
+        Returns:
+            failed_video_ids (list): videos whose resources could not all be
+            deleted. Their deletion will be retried later.
+        """
+        for video_id in video_ids:
+            self.delete_video(video_id)
+        return []
+
     def delete_subtitle(self, video_id, subtitle_id):
         """
         Delete subtitle from a video.
@@ -61,9 +76,10 @@ class BaseBackend(object):
         the given format. This is the url that will be passed to the html5
         video player.
 
-        Note that there will be one call to this method for every format and
-        for every video object, at every call to the videos API. So the result
-        of this method should either be fast, or cached.
+        Note that this method is called whenever a video format object is
+        saved, and the result is stored in the database. Whenever urls change
+        (e.g: after a change of settings), stored urls should be recomputed
+        with the `rebuild-asset-urls` management command.
         """
         raise NotImplementedError
 
@@ -124,16 +140,17 @@ class BaseBackend(object):
 
     def subtitle_url(self, video_id, subtitle_id, language_code):
         """
-        Returns the url at which the subtitle file can be downloaded. Note
-        that this method once for every subtitle object for every API videos
-        API call. So the result of this result should either be fast or cached.
+        Returns the url at which the subtitle file can be downloaded. As for
+        `video_url`, the result of this method is stored in the database
+        whenever a subtitle object is saved.
         """
         raise NotImplementedError
 
     def thumbnail_url(self, video_id, thumb_id):
         """
-        Returns the url at which the video thumbnail can be downloaded. This
-        should be a fast method.
+        Returns the url at which the video thumbnail can be downloaded. As for
+        `video_url`, the result of this method is stored in the database
+        whenever a video object is saved.
 
         This feature is optional. If undefined, the thumbnail url will be an
         empty string.
@@ -141,6 +158,11 @@ class BaseBackend(object):
         return ""
 
 
+# Sent whenever the plugin backend is requested; this is used to monitor
+# backend calls.
+requested = Signal()
+
+
 class UndefinedPluginBackend(Exception):
     pass
 
@@ -159,6 +181,7 @@ def get():
         MissingPluginBackend in case of a missing plugin class definition
 
     """
+    requested.send(sender=None)
     setting = getattr(settings, "PLUGIN_BACKEND")
     if setting is None:
         raise UndefinedPluginBackend()
@@ -1,8 +1,66 @@
+import gzip
+import hashlib
 import json
+import zlib
+from time import sleep, time
 
+from django.conf import settings
 from django.core.cache import cache
+from django.utils.module_loading import import_string
 
+from rest_framework.renderers import JSONRenderer
+
+from . import locks, utils
+
+try:
+    import brotli
+except ImportError:
+    # Brotli compression is optional
+    brotli = None
+
+# Video entries are deleted from the cache after VIDEO_CACHE_TIMEOUT seconds
+# (hard timeout), but they are recomputed in the background by `fetch` after
+# VIDEO_CACHE_SOFT_TIMEOUT seconds (soft timeout).
 VIDEO_CACHE_TIMEOUT = 3600
+VIDEO_CACHE_SOFT_TIMEOUT = 600
+# On cache misses, only one client recomputes a video entry: the others wait
+# for at most RECOMPUTE_WAIT_TIMEOUT seconds before recomputing the entry
+# themselves.
+RECOMPUTE_LOCK_TIMEOUT = 10
+RECOMPUTE_WAIT_TIMEOUT = 2
+RECOMPUTE_WAIT_INTERVAL = 0.05
+PROGRESS_CACHE_TIMEOUT = 3600
+# Video lists are stored under keys that become unreachable as soon as the
+# lists of their owner are invalidated (see `list_key`): they expire quickly,
+# such that unreachable lists do not fill the cache.
+LIST_CACHE_TIMEOUT = 120
+# Lookups of missing objects, e.g: unknown video ids, are cached for
+# NOT_FOUND_CACHE_TIMEOUT seconds ("negative caching"). Missing objects are
+# cached per owner, since objects that belong to other users are missing, too.
+NOT_FOUND_CACHE_TIMEOUT = 60
+# Processing progress is published while videos are being transcoded (see
+# `publish_progress`), and it is merged at read time into cached entries of
+# videos whose processing is not finished. Final statuses are those of
+# `models.ProcessingState`.
+PROGRESS_FINAL_STATUSES = ("success", "failed")
+
+# Videos are also cached in the memory of each process, in front of the shared
+# cache. Local entries are discarded as soon as a video is invalidated by any
+# process: to detect invalidations without querying the shared cache on every
+# call, the invalidation generations are checked at most every
+# GENERATION_CHECK_INTERVAL seconds. Thus, local entries may be out of date
+# for up to GENERATION_CHECK_INTERVAL seconds. Videos are spread over
+# GENERATION_BUCKETS generation counters, such that an invalidation only
+# discards the local entries of the videos that share its bucket.
+LOCAL_CACHE_SIZE = 1000
+LOCAL_CACHE_TIMEOUT = 60
+GENERATION_CHECK_INTERVAL = 1
+GENERATION_BUCKETS = 64
+
+_local_cache = utils.LRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TIMEOUT)
+_generations = {"values": None, "checked_at": None}
+_shared_stats = {"hits": 0, "misses": 0}
+_codec = {"path": None, "codec": None}
 
 
 def _cache_key(public_id):
@@ -13,16 +71,604 @@ def _cache_key(public_id):
     return "VIDEO:" + public_id
 
 
+def _recompute_lock_key(public_id):
+    """
+    Key which is set while a video entry is being computed.
+    """
+    return "VIDEO_RECOMPUTE:" + public_id
+
+
+def _generation_cache_key(owner_id):
+    """
+    Key which stores the generation counter of the video lists of a given
+    owner. Incrementing this counter invalidates all cached lists at once.
+    """
+    return "VIDEOS_GENERATION:{}".format(owner_id)
+
+
+def _invalidation_generation_cache_key(bucket):
+    """
+    Key which stores the invalidation generation of the videos of a bucket
+    (see `_generation_bucket`).
+    """
+    return "VIDEOS_INVALIDATION_GENERATION:{}".format(bucket)
+
+
+def _generation_bucket(key):
+    """
+    Bucket of the invalidation generation of a video cache key. Note that
+    buckets must be identical in all processes, so we cannot use `hash`.
+    """
+    return zlib.crc32(key.encode("utf-8")) % GENERATION_BUCKETS
+
+
+def _progress_cache_key(public_id):
+    """
+    Key which stores the latest processing progress published for a video.
+    """
+    return "VIDEO_PROGRESS:" + public_id
+
+
+def _not_found_cache_key(model_name, owner_id, public_id):
+    """
+    Key which is set when an object could not be found by a given owner.
+    """
+    return "NOT_FOUND:{}:{}:{}".format(model_name, owner_id, public_id)
+
+
+def make_etag(content):
+    """
+    Unquoted entity tag of a response body.
+
+    Args:
+        content (bytes)
+    """
+    return hashlib.md5(content).hexdigest()
+
+
+def render(data):
+    """
+    Render data to the JSON bytes that are sent to API clients.
+    """
+    return JSONRenderer().render(data)
+
+
+def compress(content):
+    """
+    Pre-compress content in all supported encodings.
+
+    Returns:
+        encodings (dict): compressed content indexed by content-coding name.
+        Encodings that do not reduce the content size are skipped.
+    """
+    encodings = {"gzip": gzip.compress(content)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(content)
+    return {
+        encoding: compressed
+        for encoding, compressed in encodings.items()
+        if len(compressed) < len(content)
+    }
+
+
+def _make_entry(data, owner_id, compressed=True):
+    """
+    Cache entries store the rendered data, in plain and compressed versions,
+    along with the validators that are required to answer conditional requests.
+    Cache hits can thus be served without decoding or encoding the content.
+    The owner of the data is stored, too, such that permissions can be checked
+    without hitting the database. Entries that are not stored in the cache may
+    skip compression (`compressed=False`).
+    """
+    content = render(data)
+    processing = data.get("processing") if isinstance(data, dict) else None
+    return {
+        "content": content,
+        "content_type": JSONRenderer.media_type,
+        "encodings": compress(content) if compressed else {},
+        "etag": make_etag(content),
+        "modified": int(time()),
+        "owner_id": owner_id,
+        "processing": {
+            "status": processing["status"],
+            "progress": processing["progress"],
+        }
+        if processing
+        else None,
+    }
+
+
+def _get_codec():
+    """
+    Codec of the entries that are stored in the shared cache, as defined by
+    the VIDEO_CACHE_CODEC setting (see `pipeline.codecs`).
+    """
+    path = settings.VIDEO_CACHE_CODEC
+    if _codec["path"] != path:
+        _codec.update(path=path, codec=import_string(path)())
+    return _codec["codec"]
+
+
+def _get_entry(key):
+    return _get_codec().decode(cache.get(key))
+
+
+def _set_entry(key, data, owner_id, timeout=VIDEO_CACHE_TIMEOUT):
+    entry = _make_entry(data, owner_id)
+    cache.set(key, _get_codec().encode(entry), timeout)
+    return entry
+
+
+def _get_generation(key):
+    """
+    Invalidation generation of a video cache key, as last read from the shared
+    cache. The generations of all buckets are read in a single call. Buckets
+    without invalidations have no counter, and their generation is None.
+    """
+    checked_at = _generations["checked_at"]
+    now = time()
+    if checked_at is None or now - checked_at >= GENERATION_CHECK_INTERVAL:
+        generation_keys = [
+            _invalidation_generation_cache_key(bucket)
+            for bucket in range(GENERATION_BUCKETS)
+        ]
+        values = cache.get_many(generation_keys)
+        _generations.update(
+            values=[values.get(k) for k in generation_keys], checked_at=now
+        )
+    return _generations["values"][_generation_bucket(key)]
+
+
+def _get_local_entry(key):
+    value = _local_cache.get(key)
+    if value is None:
+        return None
+    generation, entry = value
+    if generation != _get_generation(key):
+        # Videos of the same bucket were invalidated since the entry was
+        # stored: because we do not know which ones, we need to re-fetch it
+        _local_cache.delete(key)
+        return None
+    return entry
+
+
+def _set_local_entry(key, entry):
+    _local_cache.set(key, (_get_generation(key), entry))
+
+
+def _get_shared_entry(key):
+    entry = _get_entry(key)
+    _shared_stats["hits" if entry is not None else "misses"] += 1
+    return entry
+
+
+def clear_local():
+    """
+    Clear the local cache and the cache statistics of the current process.
+    """
+    _local_cache.clear()
+    _local_cache.hits = _local_cache.misses = 0
+    _generations.update(values=None, checked_at=None)
+    _shared_stats.update(hits=0, misses=0)
+
+
+def get_stats():
+    """
+    Hit and miss counts of the local and shared caches, for the current
+    process. Only video entries are taken into account.
+
+    Returns:
+        stats (dict): {"local": {"hits": int, "misses": int, "hit_rate": float,
+        "size": int}, "shared": {"hits": int, "misses": int, "hit_rate": float}}
+    """
+    local_stats = {"hits": _local_cache.hits, "misses": _local_cache.misses}
+    shared_stats = dict(_shared_stats)
+    for stats in (local_stats, shared_stats):
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] * 1.0 / total if total else None
+    local_stats["size"] = len(_local_cache)
+    return {"local": local_stats, "shared": shared_stats}
+
+
+def load(entry):
+    """
+    Decode the data of a cache entry.
+    """
+    return json.loads(entry["content"].decode("utf-8"))
+
+
 def invalidate(public_video_id):
-    cache.delete(_cache_key(public_video_id))
+    invalidate_many([public_video_id])
+
+
+def invalidate_many(public_video_ids):
+    """
+    Invalidate multiple videos in a single call.
+    """
+    keys = [_cache_key(public_video_id) for public_video_id in public_video_ids]
+    if not keys:
+        return
+    for key in keys:
+        _local_cache.delete(key)
+    cache.delete_many(keys)
+    # Notify other processes
+    for bucket in {_generation_bucket(key) for key in keys}:
+        generation_key = _invalidation_generation_cache_key(bucket)
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            # The counter does not exist yet, or it was evicted: creating it
+            # notifies other processes as well. See `list_key` for the
+            # initialisation of counters.
+            cache.add(generation_key, int(time() * 1000), None)
 
 
 def get(public_video_id):
-    content = cache.get(_cache_key(public_video_id))
-    if content is not None:
-        return json.loads(content)
-    return None
+    """
+    Fetch a video from the local cache or, in case of a local cache miss, from
+    the shared cache.
+
+    Returns:
+        entry (dict): with keys "content" (bytes), "content_type" (str),
+        "encodings" (dict of compressed bytes), "etag" (str), "modified" (int
+        timestamp), "owner_id" (int) and "processing" (dict with "status" and
+        "progress" keys, or None); None in case of a cache miss.
+    """
+    key = _cache_key(public_video_id)
+    entry = _get_local_entry(key)
+    if entry is None:
+        entry = _get_shared_entry(key)
+        if entry is not None:
+            _set_local_entry(key, entry)
+    return entry
+
+
+def set(public_video_id, data, owner_id):
+    """
+    Store video data in the cache and return the corresponding cache entry.
+    """
+    key = _cache_key(public_video_id)
+    entry = _set_entry(key, data, owner_id)
+    _set_local_entry(key, entry)
+    return entry
+
+
+def fetch(public_video_id, compute, check=None):
+    """
+    Get a video from the cache or, in case of a cache miss, compute and store
+    it. Concurrent cache misses are coalesced: a single caller computes the
+    video data while the others wait for the result ("single flight"). Entries
+    older than the soft timeout are recomputed by a single caller as well, and
+    the others are served the stale entry in the meantime
+    ("stale-while-revalidate").
+
+    Args:
+        public_video_id (str)
+        compute (function): returns the (data, owner_id) of the video. The
+        exceptions raised by this function are propagated.
+        check (function): called on cache misses, before the entry is
+        computed or waited for, e.g: to reject unknown videos. The exceptions
+        raised by this function are propagated.
+
+    Returns:
+        entry (dict): see `get`.
+    """
+    entry = get(public_video_id)
+    if entry is not None and time() - entry["modified"] < VIDEO_CACHE_SOFT_TIMEOUT:
+        return entry
+    if entry is None and check is not None:
+        check()
+
+    key = _cache_key(public_video_id)
+    lock_key = _recompute_lock_key(public_video_id)
+    deadline = time() + RECOMPUTE_WAIT_TIMEOUT
+    while True:
+        # The lock is acquired again on every iteration, such that waiters
+        # take over as soon as the computing caller fails and releases it
+        if cache.add(lock_key, True, RECOMPUTE_LOCK_TIMEOUT):
+            try:
+                data, owner_id = compute()
+                return set(public_video_id, data, owner_id)
+            finally:
+                cache.delete(lock_key)
+
+        if entry is not None:
+            # Another caller is recomputing a stale entry
+            return entry
+        if time() >= deadline:
+            break
+
+        # Wait for the entry to be computed by another caller
+        sleep(RECOMPUTE_WAIT_INTERVAL)
+        entry = _get_entry(key)
+        if entry is not None:
+            _set_local_entry(key, entry)
+            return entry
+
+    data, owner_id = compute()
+    return set(public_video_id, data, owner_id)
+
+
+def refresh(public_video_id):
+    """
+    Recompute and store a video entry ("write-through"), such that clients do
+    not have to wait for the video to be serialized on their next request.
+    Video data are computed by the function defined by the VIDEO_CACHE_LOADER
+    setting.
+
+    Returns:
+        entry (dict): see `get`; None if the video does not exist.
+    """
+    loader = import_string(settings.VIDEO_CACHE_LOADER)
+    result = loader(public_video_id)
+    if result is None:
+        return None
+    data, owner_id = result
+    return set(public_video_id, data, owner_id)
+
+
+def get_many(public_video_ids):
+    """
+    Fetch multiple videos from the local cache and, for local cache misses,
+    from the shared cache in a single call.
+
+    Returns:
+        entries (dict): cache entries indexed by public video id. Cache misses
+        are absent from the result.
+    """
+    entries = {}
+    missing_keys = {}
+    for public_video_id in public_video_ids:
+        key = _cache_key(public_video_id)
+        entry = _get_local_entry(key)
+        if entry is None:
+            missing_keys[key] = public_video_id
+        else:
+            entries[public_video_id] = entry
+    if missing_keys:
+        values = cache.get_many(list(missing_keys))
+        codec = _get_codec()
+        shared_hits = 0
+        for key, value in values.items():
+            entry = codec.decode(value)
+            if entry is not None:
+                entries[missing_keys[key]] = entry
+                _set_local_entry(key, entry)
+                shared_hits += 1
+        _shared_stats["hits"] += shared_hits
+        _shared_stats["misses"] += len(missing_keys) - shared_hits
+    return entries
+
+
+def set_many(data, owner_id):
+    """
+    Store multiple videos in the cache in a single call.
+
+    Args:
+        data (dict): video data indexed by public video id
+        owner_id (int): owner of all videos
+
+    Returns:
+        entries (dict): cache entries indexed by public video id.
+    """
+    entries = {
+        public_video_id: _make_entry(video_data, owner_id)
+        for public_video_id, video_data in data.items()
+    }
+    keyed_entries = {
+        _cache_key(public_video_id): entry for public_video_id, entry in entries.items()
+    }
+    codec = _get_codec()
+    cache.set_many(
+        {key: codec.encode(entry) for key, entry in keyed_entries.items()},
+        VIDEO_CACHE_TIMEOUT,
+    )
+    for key, entry in keyed_entries.items():
+        _set_local_entry(key, entry)
+    return entries
+
+
+def invalidate_owner(owner_id):
+    """
+    Invalidate all cached video lists of an owner.
+    """
+    try:
+        cache.incr(_generation_cache_key(owner_id))
+    except ValueError:
+        # The counter does not exist: it will be created with a fresh value
+        # on the next call to `list_key`.
+        pass
+
+
+def list_key(owner_id, params):
+    """
+    Key which stores a video list in the cache. The key contains the current
+    generation of the owner video lists, such that cached lists become
+    unreachable as soon as the generation is incremented.
+
+    Args:
+        owner_id (int)
+        params (str): uniquely identifies the list (filters, page cursor, etc.)
+    """
+    generation_key = _generation_cache_key(owner_id)
+    generation = cache.get(generation_key)
+    if generation is None:
+        # Counters are initialised with the current time such that, in case a
+        # counter is evicted from the cache, it is not reset to a previous
+        # value.
+        cache.add(generation_key, int(time() * 1000), None)
+        generation = cache.get(generation_key)
+    params_hash = hashlib.md5(params.encode("utf-8")).hexdigest()
+    return "VIDEOS:{}:{}:{}".format(owner_id, generation, params_hash)
+
+
+def get_list(key):
+    return _get_entry(key)
+
+
+def set_list(key, data, owner_id):
+    return _set_entry(key, data, owner_id, LIST_CACHE_TIMEOUT)
+
+
+def publish_progress(public_video_id, status, progress):
+    """
+    Publish the processing progress of a video, and notify the clients that
+    wait for progress updates (see `listen_progress`). Each published record
+    has a version number greater than the previous one. Note that this
+    function should be called by a single process at a time, i.e: the
+    transcoding task.
+
+    Returns:
+        record (dict): with keys "version" (int), "status" (str) and
+        "progress" (float).
+    """
+    key = _progress_cache_key(public_video_id)
+    previous = cache.get(key)
+    version = int(time() * 1000)
+    if previous is not None:
+        version = max(version, previous["version"] + 1)
+    record = {"version": version, "status": status, "progress": progress}
+    cache.set(key, record, PROGRESS_CACHE_TIMEOUT)
+    locks.get_notifier().notify(key)
+    return record
+
+
+def listen_progress(public_video_id):
+    """
+    Listen to the progress updates of a video. Updates that are published
+    after the listener is created are not missed.
+
+    Yields:
+        listener: see `pipeline.locks.PostgresNotifier.listen`.
+    """
+    return locks.get_notifier().listen(_progress_cache_key(public_video_id))
+
+
+def get_progress(public_video_id):
+    """
+    Returns:
+        record (dict): latest record published with `publish_progress`; None
+        if no progress was published recently.
+    """
+    return cache.get(_progress_cache_key(public_video_id))
+
+
+def get_progress_many(public_video_ids):
+    """
+    Returns:
+        records (dict): see `get_progress`, indexed by public video id. Videos
+        without recent progress are absent from the result.
+    """
+    keys = {
+        _progress_cache_key(public_video_id): public_video_id
+        for public_video_id in public_video_ids
+    }
+    if not keys:
+        return {}
+    return {keys[key]: record for key, record in cache.get_many(list(keys)).items()}
+
+
+def _is_processed(entry):
+    """
+    Returns:
+        processed (bool): True if no progress may be published for this
+        entry, e.g: because its processing is finished.
+    """
+    processing = entry.get("processing")
+    return processing is None or processing["status"] in PROGRESS_FINAL_STATUSES
+
+
+def _is_live(entry, record):
+    """
+    Returns:
+        live (bool): True if the progress record is more recent than the
+        processing state of the entry.
+    """
+    processing = entry["processing"]
+    if record is None or (
+        record["status"] == processing["status"]
+        and record["progress"] == processing["progress"]
+    ):
+        return False
+    # Progress of a previous processing run may have been published before
+    # the entry was computed. Record versions are millisecond timestamps.
+    return record["version"] >= entry["modified"] * 1000
+
+
+def _overlay_data(data, record):
+    data["processing"]["status"] = record["status"]
+    data["processing"]["progress"] = record["progress"]
+
+
+def overlay_progress(public_video_id, entry):
+    """
+    Merge the latest published progress into a cached video entry. Progress
+    updates do not invalidate the cache, such that cached entries of videos
+    that are being processed would otherwise be out of date. Entries of videos
+    whose processing is finished are returned as is, without querying the
+    cache.
+
+    Returns:
+        entry (dict): the same entry if it is up to date, or a new entry with
+        live progress otherwise. The new entry is not stored in the cache, and
+        it is not compressed: progress changes too often for compressed
+        versions to be reused.
+    """
+    if _is_processed(entry):
+        return entry
+    record = get_progress(public_video_id)
+    if not _is_live(entry, record):
+        return entry
+    data = load(entry)
+    _overlay_data(data, record)
+    return _make_entry(data, entry["owner_id"], compressed=False)
+
+
+def load_many(entries):
+    """
+    Decode multiple video entries, and merge the latest published progress
+    into their data (see `overlay_progress`). Progress records are fetched
+    from the cache in a single call.
+
+    Args:
+        entries (dict): cache entries indexed by public video id.
+
+    Returns:
+        videos_data (dict): decoded data indexed by public video id.
+    """
+    records = get_progress_many(
+        [
+            public_video_id
+            for public_video_id, entry in entries.items()
+            if not _is_processed(entry)
+        ]
+    )
+    videos_data = {}
+    for public_video_id, entry in entries.items():
+        data = load(entry)
+        record = records.get(public_video_id)
+        if _is_live(entry, record):
+            _overlay_data(data, record)
+        videos_data[public_video_id] = data
+    return videos_data
+
+
+def is_not_found(model_name, owner_id, public_id):
+    """
+    Returns:
+        not_found (bool): True if the object was recently looked up by the
+        owner, and could not be found.
+    """
+    return cache.get(_not_found_cache_key(model_name, owner_id, public_id)) is not None
+
+
+def set_not_found(model_name, owner_id, public_id):
+    cache.set(
+        _not_found_cache_key(model_name, owner_id, public_id),
+        True,
+        NOT_FOUND_CACHE_TIMEOUT,
+    )
 
 
-def set(public_video_id, data):
-    return cache.set(_cache_key(public_video_id), json.dumps(data), VIDEO_CACHE_TIMEOUT)
+def clear_not_found(model_name, owner_id, public_id):
+    cache.delete(_not_found_cache_key(model_name, owner_id, public_id))
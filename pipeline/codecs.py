@@ -0,0 +1,91 @@
+"""
+Codecs of the video entries that are stored in the shared cache.
+
+Video entries are dicts (see `pipeline.cache`) which codecs convert to the
+values that are stored by the cache backend, and back. The codec is selected
+by the VIDEO_CACHE_CODEC setting. Codecs return None when decoding values that
+they did not encode, such that entries that were stored by other codecs, or by
+other versions of the same codec, are ignored after deploys.
+"""
+import marshal
+import sys
+
+
+class PickleCodec(object):
+    """
+    Store entries as dicts, which are pickled by the cache backend. Entries are
+    wrapped in a tuple along with a version tag that must be incremented
+    whenever their structure is modified. Note that values are unpickled by
+    the cache backend before they are decoded, such that the tag does not make
+    it safe to share the cache with untrusted writers.
+    """
+
+    TAG = "VFP1"
+
+    def encode(self, entry):
+        return (self.TAG, entry)
+
+    def decode(self, value):
+        # Values without a known tag were stored by other codecs or by other
+        # versions of this codec, e.g: as raw JSON strings
+        if not isinstance(value, tuple) or len(value) != 2 or value[0] != self.TAG:
+            return None
+        return value[1]
+
+
+class BinaryCodec(object):
+    """
+    Store entries in a compact binary format. Entries have a fixed structure,
+    such that they are stored as tuples, without field names, and serialized
+    with `marshal`, which is faster than `pickle` for builtin types. Encoded
+    entries are prefixed with a version tag that must be incremented whenever
+    their structure is modified. The marshal format may change between Python
+    versions: the tag also includes the Python version, such that entries that
+    were stored by other Python versions are ignored.
+    """
+
+    TAG = "VFC1-py{}.{}:".format(*sys.version_info[:2]).encode()
+    MARSHAL_VERSION = 4
+
+    def encode(self, entry):
+        processing = entry.get("processing")
+        return self.TAG + marshal.dumps(
+            (
+                entry["content"],
+                entry["content_type"],
+                entry["encodings"],
+                entry["etag"],
+                entry["modified"],
+                entry["owner_id"],
+                (processing["status"], processing["progress"]) if processing else None,
+            ),
+            self.MARSHAL_VERSION,
+        )
+
+    def decode(self, value):
+        if not isinstance(value, bytes) or not value.startswith(self.TAG):
+            return None
+        start = len(self.TAG)
+        try:
+            (
+                content,
+                content_type,
+                encodings,
+                etag,
+                modified,
+                owner_id,
+                processing,
+            ) = marshal.loads(memoryview(value)[start:])
+        except (EOFError, TypeError, ValueError):
+            return None
+        return {
+            "content": content,
+            "content_type": content_type,
+            "encodings": encodings,
+            "etag": etag,
+            "modified": modified,
+            "owner_id": owner_id,
+            "processing": {"status": processing[0], "progress": processing[1]}
+            if processing
+            else None,
+        }
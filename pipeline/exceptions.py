@@ -1,6 +1,7 @@
-class LockUnavailable(Exception):
+class LockLost(Exception):
     """
-    Raised whenever we try to acquire a lock that was already acquired.
+    Raised whenever the holder of a lock writes to a resource after its lock
+    was acquired by another holder.
     """
 
     pass
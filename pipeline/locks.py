@@ -0,0 +1,536 @@
+"""
+Distributed locks with leases and fencing tokens.
+
+Locks are acquired for a short lease, which is renewed in the background for
+as long as the holder is alive: when the holder crashes, the lock becomes
+available as soon as its lease expires. A holder that is stalled for longer
+than its lease may lose its lock to another worker without noticing, so every
+acquisition comes with a fencing token that is greater than the tokens of all
+previous acquisitions. Writes to shared resources must be rejected when their
+token is lower than the last token that was seen (see
+`pipeline.tasks.update_processing_state`).
+
+The lock implementation is defined by the LOCK_BACKEND setting. Workers that
+wait for a lock to be released are notified through the channel defined by the
+LOCK_NOTIFIER setting. This channel also carries other notifications, such as
+video progress updates (see `pipeline.cache.publish_progress`).
+"""
+import hashlib
+import logging
+import os
+import select
+import threading
+from contextlib import contextmanager
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.transaction import TransactionManagementError
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseLockBackend(object):
+
+    # Set to False if locks do not expire and their leases do not need to be
+    # renewed
+    expires = True
+
+    def acquire(self, name, lease):
+        """
+        Args:
+            name (str)
+            lease (int): lease duration, in seconds
+
+        Returns:
+            token (int): fencing token; None if the lock is unavailable.
+        """
+        raise NotImplementedError
+
+    def renew(self, name, token, lease):
+        """
+        Returns:
+            renewed (bool): False if the lock was lost, e.g: because its lease
+            expired.
+        """
+        raise NotImplementedError
+
+    def release(self, name, token):
+        """
+        Release a lock. Locks that were acquired with a different token are
+        not released.
+        """
+        raise NotImplementedError
+
+    def is_locked(self, name):
+        raise NotImplementedError
+
+
+class CacheLeaseBackend(BaseLockBackend):
+    """
+    Leases stored in the shared cache, in the manner of Redis locks. Note that
+    the Django cache API does not provide compare-and-set operations, such that
+    a holder may renew or release a lease right after it expired and was
+    acquired by another worker: fencing tokens protect shared resources against
+    such races.
+    """
+
+    def acquire(self, name, lease):
+        if not cache.add(name, 0, lease):
+            return None
+        # Tokens are drawn once the lock is acquired, such that they are
+        # issued in the order of acquisitions
+        token = self._next_token(name)
+        cache.set(name, token, lease)
+        return token
+
+    def renew(self, name, token, lease):
+        if cache.get(name) != token:
+            return False
+        cache.set(name, token, lease)
+        return True
+
+    def release(self, name, token):
+        # Note that in unit tests, and in case the wrapped code raises an
+        # IntegrityError, releasing the cache will result in a
+        # TransactionManagementError. This is because unit tests run inside
+        # atomic blocks. We cannot execute queries inside an atomic block if a
+        # transaction needs to be rollbacked.
+        try:
+            if cache.get(name) == token:
+                cache.delete(name)
+        except TransactionManagementError:
+            logger.error("Could not release lock %s", name)
+
+    def is_locked(self, name):
+        return cache.get(name) is not None
+
+    @staticmethod
+    def _next_token(name):
+        # Counters are initialised with a millisecond timestamp, such that
+        # tokens keep increasing when counters are evicted from the cache
+        key = "LOCK_FENCING_TOKEN:" + name
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The counter does not exist yet, or it was evicted
+            cache.add(key, int(time() * 1000), None)
+            return cache.incr(key)
+
+
+class PostgresAdvisoryLockBackend(BaseLockBackend):
+    """
+    Session-level PostgreSQL advisory locks. Advisory locks are held by the
+    database connection of the holder until they are released, or until the
+    connection is closed, e.g: when the holder crashes. Thus, they do not need
+    to be renewed.
+
+    Advisory locks are reentrant within a database session, but holders are
+    not: acquiring a lock that is already held by the current connection, e.g:
+    by another holder in the same thread, fails just like acquiring a lock that
+    is held by another connection.
+
+    Fencing tokens are drawn from a database sequence which starts at a
+    microsecond timestamp (see migration 0016), whereas the tokens of
+    CacheLeaseBackend are millisecond timestamps: tokens keep increasing when
+    switching from CacheLeaseBackend to this backend, but not the other way
+    around (see the LOCK_BACKEND setting).
+    """
+
+    expires = False
+    SEQUENCE = "pipeline_lock_fencing_token"
+    # Advisory locks on 64-bit keys are stored as two 32-bit halves
+    HELD_LOCKS_QUERY = (
+        "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted"
+        " AND classid = %s AND objid = %s AND objsubid = 1"
+    )
+
+    def acquire(self, name, lease):
+        key = self._key(name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN EXISTS ("
+                + self.HELD_LOCKS_QUERY
+                + " AND pid = pg_backend_pid()) THEN false"
+                " ELSE pg_try_advisory_lock(%s) END",
+                self._key_halves(key) + [key],
+            )
+            if not cursor.fetchone()[0]:
+                return None
+            cursor.execute("SELECT nextval(%s)", [self.SEQUENCE])
+            return cursor.fetchone()[0]
+
+    def renew(self, name, token, lease):
+        return True
+
+    def release(self, name, token):
+        # As with CacheLeaseBackend, queries cannot be executed inside an
+        # atomic block that needs to be rollbacked. The lock is then held until
+        # the database session ends.
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [self._key(name)])
+        except TransactionManagementError:
+            logger.error("Could not release lock %s", name)
+
+    def is_locked(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS (" + self.HELD_LOCKS_QUERY + ")",
+                self._key_halves(self._key(name)),
+            )
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def _key(name):
+        """
+        Advisory lock keys are signed 64-bit integers.
+        """
+        digest = hashlib.sha256(name.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    @staticmethod
+    def _key_halves(key):
+        """
+        Returns:
+            halves (list): the "classid" and "objid" of the key in pg_locks.
+        """
+        key &= 0xFFFFFFFFFFFFFFFF
+        return [key >> 32, key & 0xFFFFFFFF]
+
+
+def get_backend():
+    return import_string(settings.LOCK_BACKEND)()
+
+
+class PostgresNotifier(object):
+    """
+    Notify lock releases with PostgreSQL LISTEN/NOTIFY. Notifications are
+    delivered to listeners once the transaction of the notifier is committed.
+    The listeners of a process share a single database connection, which is
+    held by a background thread (see `PostgresDispatcher`): waiters do not hold
+    a database connection each.
+    """
+
+    CHANNEL = "pipeline_locks"
+
+    def notify(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.CHANNEL, name])
+
+    @contextmanager
+    def listen(self, name):
+        """
+        Listen to the releases of a lock. Releases are received from the moment
+        the listener is created, such that they cannot be missed between a
+        check of the lock and a call to `wait`. If the dispatcher cannot listen
+        to the database, releases are not received and waiters fall back to
+        polling.
+
+        Yields:
+            listener: object with a `wait(timeout)` method that returns True
+            if the lock was released, and False on timeout.
+        """
+        with LocalNotifier().listen(name) as listener:
+            if not _dispatcher.start(self.CHANNEL):
+                logger.error("Could not listen to channel %s", self.CHANNEL)
+            yield listener
+
+
+class PostgresDispatcher(object):
+    """
+    Background thread which listens to a notification channel on its own
+    database connection, and which forwards the received notifications to the
+    local listeners of the process.
+    """
+
+    START_TIMEOUT = 5
+
+    def __init__(self):
+        self._thread = None
+        self._wakeup_fds = None
+        self._started = threading.Event()
+        self._is_listening = False
+        self._mutex = threading.Lock()
+
+    def start(self, channel):
+        """
+        Start the dispatcher thread, if it is not running already.
+
+        Returns:
+            listening (bool): True once the dispatcher listens to the channel;
+            False if it could not listen to the channel.
+        """
+        with self._mutex:
+            if self._thread is None or not self._thread.is_alive():
+                self._close_wakeup_fds()
+                # Writing to this pipe wakes up the thread, such that it stops
+                self._wakeup_fds = os.pipe()
+                self._started.clear()
+                self._thread = threading.Thread(
+                    target=self._run, args=(channel, self._wakeup_fds[0]), daemon=True
+                )
+                self._thread.start()
+        self._started.wait(self.START_TIMEOUT)
+        return self._is_listening
+
+    def stop(self):
+        """
+        Stop the dispatcher thread and close its database connection, if it is
+        running. The dispatcher is started again by the next call to `start`.
+        """
+        with self._mutex:
+            if self._thread is None:
+                return
+            os.write(self._wakeup_fds[1], b"\0")
+            self._thread.join()
+            self._thread = None
+            self._close_wakeup_fds()
+
+    def _close_wakeup_fds(self):
+        if self._wakeup_fds is not None:
+            for fd in self._wakeup_fds:
+                os.close(fd)
+            self._wakeup_fds = None
+
+    def _run(self, channel, read_fd):
+        try:
+            # Database connections are specific to each thread
+            with connection.cursor() as cursor:
+                cursor.execute("LISTEN " + channel)
+            self._is_listening = True
+            self._started.set()
+            while True:
+                readable, _, _ = select.select([connection.connection, read_fd], [], [])
+                if read_fd in readable:
+                    break
+                self.dispatch(connection.connection)
+        except Exception:
+            logger.exception("Stopped listening to channel %s", channel)
+        finally:
+            self._is_listening = False
+            self._started.set()
+            connections.close_all()
+
+    @staticmethod
+    def dispatch(pg_connection):
+        pg_connection.poll()
+        notifies = pg_connection.notifies[:]
+        del pg_connection.notifies[:]
+        for notify in notifies:
+            LocalNotifier().notify(notify.payload)
+
+
+_dispatcher = PostgresDispatcher()
+
+
+class LocalNotifier(object):
+    """
+    Notify lock releases to the waiters of the current process only. This is
+    a stand-in for PostgresNotifier in tests, and it is used by
+    PostgresDispatcher to forward notifications.
+    """
+
+    def notify(self, name):
+        with _local_listeners_mutex:
+            for event in _local_listeners.get(name, ()):
+                event.set()
+
+    @contextmanager
+    def listen(self, name):
+        """
+        See `PostgresNotifier.listen`.
+        """
+        event = threading.Event()
+        with _local_listeners_mutex:
+            _local_listeners.setdefault(name, set()).add(event)
+        try:
+            yield LocalListener(event)
+        finally:
+            with _local_listeners_mutex:
+                _local_listeners[name].discard(event)
+                if not _local_listeners[name]:
+                    del _local_listeners[name]
+
+
+class LocalListener(object):
+    def __init__(self, event):
+        self.event = event
+
+    def wait(self, timeout):
+        released = self.event.wait(timeout)
+        self.event.clear()
+        return released
+
+
+_local_listeners = {}
+_local_listeners_mutex = threading.Lock()
+
+
+def get_notifier():
+    return import_string(settings.LOCK_NOTIFIER)()
+
+
+_stats = {
+    "acquisitions": 0,
+    "contentions": 0,
+    "waits": 0,
+    "wait_timeouts": 0,
+    "wait_time": 0.0,
+    "max_wait_time": 0.0,
+}
+
+
+def get_stats():
+    """
+    Lock statistics of the current process. Contentions are failed attempts to
+    acquire a lock; wait times are in seconds.
+
+    Returns:
+        stats (dict): {"acquisitions": int, "contentions": int,
+        "contention_rate": float, "waits": int, "wait_timeouts": int,
+        "wait_time": float, "mean_wait_time": float, "max_wait_time": float}
+    """
+    stats = dict(_stats)
+    attempts = stats["acquisitions"] + stats["contentions"]
+    stats["contention_rate"] = (
+        stats["contentions"] * 1.0 / attempts if attempts else None
+    )
+    stats["mean_wait_time"] = (
+        stats["wait_time"] / stats["waits"] if stats["waits"] else None
+    )
+    return stats
+
+
+def clear_stats():
+    _stats.update(
+        acquisitions=0,
+        contentions=0,
+        waits=0,
+        wait_timeouts=0,
+        wait_time=0.0,
+        max_wait_time=0.0,
+    )
+
+
+class Lock(object):
+    """
+    Lock context manager.
+
+    Usage:
+
+        with Lock('mylockname') as lock:
+            if lock.is_acquired:
+                run_not_thread_safe_code(lock.token)
+    """
+
+    def __init__(self, name, lease=None, wait=False, timeout=None):
+        """
+        Args:
+            name (str)
+            lease (int): lease duration, in seconds. Defaults to the
+            LOCK_LEASE_DURATION setting. The lease is renewed in the background
+            while the lock is held.
+            wait (bool): if True, and if there is a concurrent call to this
+            function, it will block until completion of the concurrent task.
+            Note, however, that in this case the lock will *not* be acquired.
+            timeout (float): maximum duration of the wait, in seconds. Defaults
+            to the LOCK_WAIT_TIMEOUT setting. On timeout, `timed_out` is set to
+            True.
+        """
+        self.name = name
+        self.lease = lease or settings.LOCK_LEASE_DURATION
+        self.wait = wait
+        self.timeout = timeout or settings.LOCK_WAIT_TIMEOUT
+        self.is_acquired = False
+        self.is_lost = False
+        self.timed_out = False
+        self.token = None
+        self._backend = get_backend()
+        self._notifier = get_notifier()
+        self._stopped = threading.Event()
+        self._renewal = None
+
+    def __enter__(self):
+        self.token = self._backend.acquire(self.name, self.lease)
+        if self.token is not None:
+            _stats["acquisitions"] += 1
+            self.is_acquired = True
+            self.is_lost = False
+            if self._backend.expires:
+                self._stopped.clear()
+                self._renewal = threading.Thread(
+                    target=self._renew_periodically, daemon=True
+                )
+                self._renewal.start()
+        else:
+            _stats["contentions"] += 1
+            if self.wait:
+                self._wait_for_release()
+        return self
+
+    def __exit__(self, exc_t, exc_v, trace):
+        if self.is_acquired:
+            if self._renewal is not None:
+                self._stopped.set()
+                self._renewal.join()
+                self._renewal = None
+            self._backend.release(self.name, self.token)
+            self.is_acquired = False
+            try:
+                self._notifier.notify(self.name)
+            except TransactionManagementError:
+                # See `CacheLeaseBackend.release`: waiters will fall back to
+                # polling
+                logger.error("Could not notify release of lock %s", self.name)
+
+    def _wait_for_release(self):
+        """
+        Block until the lock is released. Waiters are woken up by release
+        notifications, but they also check the lock every
+        LOCK_WAIT_POLL_INTERVAL seconds, because notifications are not sent
+        when holders crash or when leases expire.
+        """
+        started_at = time()
+        self.timed_out = False
+        with self._notifier.listen(self.name) as listener:
+            while self._backend.is_locked(self.name):
+                remaining = started_at + self.timeout - time()
+                if remaining <= 0:
+                    self.timed_out = True
+                    logger.warning(
+                        "Timed out after waiting %.1fs for lock %s",
+                        self.timeout,
+                        self.name,
+                    )
+                    break
+                listener.wait(min(remaining, settings.LOCK_WAIT_POLL_INTERVAL))
+
+        wait_time = time() - started_at
+        _stats["waits"] += 1
+        _stats["wait_timeouts"] += int(self.timed_out)
+        _stats["wait_time"] += wait_time
+        _stats["max_wait_time"] = max(_stats["max_wait_time"], wait_time)
+
+    def renew(self):
+        """
+        Renew the lease of the lock.
+
+        Returns:
+            renewed (bool): False if the lock was lost.
+        """
+        if not self._backend.renew(self.name, self.token, self.lease):
+            logger.warning("Lock %s was lost (token %s)", self.name, self.token)
+            self.is_lost = True
+        return not self.is_lost
+
+    def _renew_periodically(self):
+        try:
+            while not self._stopped.wait(self.lease / 3.0):
+                if not self.renew():
+                    break
+        finally:
+            # Database connections are specific to each thread
+            connections.close_all()
@@ -0,0 +1,91 @@
+import base64
+import pickle
+from timeit import repeat
+
+from django.core.management.base import BaseCommand
+
+from pipeline import cache, codecs
+
+CODECS = (codecs.PickleCodec, codecs.BinaryCodec)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the encoding and decoding time, and the stored size, of video"
+        " cache entries with each codec. Stored values are pickled and base64"
+        " encoded, like in the database cache backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--number", type=int, default=10000, help="Number of runs per timing"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Keep the best of n timings"
+        )
+
+    def handle(self, *args, **options):
+        entry = cache._make_entry(make_video(), 1)
+        for codec_class in CODECS:
+            codec = codec_class()
+            value = store(codec, entry)
+            durations = [
+                min(
+                    repeat(
+                        func,
+                        number=options["number"],
+                        repeat=options["repeat"],
+                    )
+                )
+                / options["number"]
+                for func in (lambda: store(codec, entry), lambda: fetch(codec, value))
+            ]
+            self.stdout.write(
+                "{}: encode {:.1f} us, decode {:.1f} us, {} bytes".format(
+                    codec_class.__name__,
+                    durations[0] * 1e6,
+                    durations[1] * 1e6,
+                    len(value),
+                )
+            )
+
+
+def store(codec, entry):
+    return base64.b64encode(pickle.dumps(codec.encode(entry), pickle.HIGHEST_PROTOCOL))
+
+
+def fetch(codec, value):
+    return codec.decode(pickle.loads(base64.b64decode(value)))
+
+
+def make_video():
+    """
+    Video data, as returned by the API.
+    """
+    return {
+        "id": "Xk2fTqG8w7Lc",
+        "title": "Sample video",
+        "processing": {
+            "status": "success",
+            "progress": 100.0,
+            "started_at": "2016-01-01T00:00:00Z",
+        },
+        "subtitles": [
+            {
+                "id": "Xk2fTqG8w7Lc-{}".format(language),
+                "language": language,
+                "video_id": "Xk2fTqG8w7Lc",
+                "url": "https://cdn.example.com/Xk2fTqG8w7Lc/{}.vtt".format(language),
+            }
+            for language in ("en", "fr")
+        ],
+        "formats": [
+            {
+                "name": name,
+                "bitrate": bitrate,
+                "url": "https://cdn.example.com/Xk2fTqG8w7Lc/{}.mp4".format(name),
+            }
+            for name, bitrate in (("SD", 128), ("HD", 256))
+        ],
+        "thumbnail": "https://cdn.example.com/Xk2fTqG8w7Lc/thumbnail.jpg",
+    }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from pipeline import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored urls of video formats, subtitles and thumbnails. Run this"
+        " command whenever asset urls change, e.g: after modifying the"
+        " CLOUDFRONT_DOMAIN_NAME setting."
+    )
+
+    def handle(self, *args, **options):
+        self.rebuild(models.Video.objects.all(), "thumbnail_url", "get_thumbnail_url")
+        self.rebuild(models.Subtitle.objects.select_related("video"), "url", "get_url")
+        self.rebuild(
+            models.VideoFormat.objects.select_related("video"), "url", "get_url"
+        )
+
+    def rebuild(self, queryset, field_name, url_getter):
+        updated = 0
+        for obj in queryset.iterator():
+            if getattr(obj, field_name) != getattr(obj, url_getter)():
+                # Urls are recomputed on save, and caches are invalidated
+                obj.save()
+                updated += 1
+        self.stdout.write(
+            "Updated {} {} url(s)".format(updated, queryset.model._meta.verbose_name)
+        )
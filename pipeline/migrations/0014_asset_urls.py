@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 21:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from pipeline import backend
+
+
+def populate_asset_urls(apps, schema_editor):
+    """
+    Store the urls of existing assets. Note that the same urls can be later
+    recomputed with the `rebuild-asset-urls` management command.
+    """
+    Video = apps.get_model("pipeline", "Video")
+    Subtitle = apps.get_model("pipeline", "Subtitle")
+    VideoFormat = apps.get_model("pipeline", "VideoFormat")
+
+    # Subtitles and formats belong to videos. Empty databases, e.g: fresh
+    # installs, do not require a configured plugin backend.
+    if not Video.objects.exists():
+        return
+    plugin_backend = backend.get()
+
+    for video in Video.objects.iterator():
+        video.thumbnail_url = plugin_backend.thumbnail_url(
+            video.public_id, video.public_thumbnail_id
+        )
+        video.save(update_fields=["thumbnail_url"])
+    for subtitle in Subtitle.objects.select_related("video").iterator():
+        subtitle.url = plugin_backend.subtitle_url(
+            subtitle.video.public_id, subtitle.public_id, subtitle.language
+        )
+        subtitle.save(update_fields=["url"])
+    for video_format in VideoFormat.objects.select_related("video").iterator():
+        video_format.url = plugin_backend.video_url(
+            video_format.video.public_id, video_format.name
+        )
+        video_format.save(update_fields=["url"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0013_auto_20180124_0930")]
+
+    operations = [
+        migrations.AlterModelOptions(name="videoformat", options={"ordering": ["id"]}),
+        migrations.AddField(
+            model_name="subtitle",
+            name="url",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="thumbnail_url",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name="videoformat",
+            name="url",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.RunPython(populate_asset_urls, migrations.RunPython.noop),
+    ]
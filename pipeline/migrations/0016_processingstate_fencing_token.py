@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:40
+from __future__ import unicode_literals
+
+from time import time
+
+from django.db import migrations, models
+
+
+def create_fencing_token_sequence(apps, schema_editor):
+    # Fencing tokens of the PostgreSQL lock backend. The sequence starts at a
+    # microsecond timestamp, far above the millisecond-based tokens of the
+    # cache lock backend, such that the lock backend can be switched from the
+    # cache backend to the PostgreSQL backend (but not the other way around).
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE SEQUENCE IF NOT EXISTS pipeline_lock_fencing_token"
+            " START WITH {}".format(int(time() * 1000) * 1000)
+        )
+
+
+def drop_fencing_token_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP SEQUENCE IF EXISTS pipeline_lock_fencing_token")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pipeline", "0015_deletedvideo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingstate",
+            name="fencing_token",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            create_fencing_token_sequence, drop_fencing_token_sequence
+        ),
+    ]
@@ -1,3 +1,6 @@
+import threading
+import weakref
+
 from django.conf import global_settings
 from django.contrib.auth.models import User
 from django.core.validators import (
@@ -5,8 +8,8 @@ from django.core.validators import (
     MinLengthValidator,
     MinValueValidator,
 )
-from django.db import models
-from django.db.models.signals import post_delete, post_save
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 from . import backend, cache, managers, utils
@@ -30,12 +33,19 @@ class Video(models.Model):
         null=False,
         default=utils.generate_long_random_id,
     )
+    thumbnail_url = models.CharField(max_length=1024, blank=True)
 
     owner = models.ForeignKey(User)
 
     def __str__(self):
         return "{} - {}".format(self.public_id, self.title)
 
+    def save(self, *args, **kwargs):
+        # Asset urls are stored in the database, such that serializing videos
+        # does not require any call to the plugin backend.
+        self.thumbnail_url = self.get_thumbnail_url()
+        super(Video, self).save(*args, **kwargs)
+
     @property
     def processing_status(self):
         return self.processing_state.status if self.processing_state else None
@@ -48,8 +58,7 @@ class Video(models.Model):
     def processing_started_at(self):
         return self.processing_state.started_at if self.processing_state else None
 
-    @property
-    def thumbnail_url(self):
+    def get_thumbnail_url(self):
         return backend.get().thumbnail_url(self.public_id, self.public_thumbnail_id)
 
 
@@ -121,6 +130,19 @@ class VideoUploadUrl(models.Model):
         return self.public_video_id
 
 
+class DeletedVideo(models.Model):
+    """
+    Deletion queue of video assets. Video objects are deleted immediately, but
+    their assets are purged later by the `purge_deleted_videos` task.
+    """
+
+    public_id = models.CharField(max_length=20)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.public_id
+
+
 class ProcessingState(models.Model):
 
     STATUS_PENDING = "pending"
@@ -153,6 +175,9 @@ class ProcessingState(models.Model):
         default=STATUS_PENDING,
     )
     message = models.CharField(max_length=1024, blank=True)
+    # Token of the last lock holder that processed the video (see
+    # `pipeline.locks`)
+    fencing_token = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return "{} - {}".format(self.video, self.status)
@@ -176,13 +201,17 @@ class Subtitle(models.Model):
         null=True,
         blank=False,
     )
+    url = models.CharField(max_length=1024, blank=True)
 
-    @property
-    def url(self):
+    def get_url(self):
         return backend.get().subtitle_url(
             self.video.public_id, self.public_id, self.language
         )
 
+    def save(self, *args, **kwargs):
+        self.url = self.get_url()
+        super(Subtitle, self).save(*args, **kwargs)
+
     def __str__(self):
         return "{} - {} [{}]".format(self.public_id, self.video, self.language)
 
@@ -192,14 +221,18 @@ class VideoFormat(models.Model):
     video = models.ForeignKey(Video, related_name="formats")
     name = models.CharField(max_length=128)
     bitrate = models.FloatField(validators=[MinValueValidator(0)])
+    url = models.CharField(max_length=1024, blank=True)
 
     class Meta:
         ordering = ["id"]
 
-    @property
-    def url(self):
+    def get_url(self):
         return backend.get().video_url(self.video.public_id, self.name)
 
+    def save(self, *args, **kwargs):
+        self.url = self.get_url()
+        super(VideoFormat, self).save(*args, **kwargs)
+
     def __str__(self):
         return "{} - {} [{}]".format(self.name, self.video, self.bitrate)
 
@@ -207,7 +240,9 @@ class VideoFormat(models.Model):
 @receiver([post_save, post_delete], sender=Video)
 def invalidate_video_cache(sender, instance=None, created=False, **kwargs):
     if instance:
-        invalidate_cache(instance.public_id)
+        invalidate_cache_on_commit(
+            public_video_id=instance.public_id, owner_id=instance.owner_id
+        )
 
 
 @receiver([post_save, post_delete], sender=Subtitle)
@@ -215,11 +250,144 @@ def invalidate_video_cache(sender, instance=None, created=False, **kwargs):
 @receiver([post_save, post_delete], sender=VideoFormat)
 def invalidate_related_video_cache(sender, instance=None, created=False, **kwargs):
     """
-    Invalidate the video cache whenever a related object is saved.
+    Invalidate the video cache whenever a related object is saved. Note that
+    we do not fetch the related video if it was not already fetched: related
+    objects are often saved in bulk, and their videos are resolved all at once
+    when the cache is invalidated.
+    """
+    if not instance:
+        return
+    if sender.video.is_cached(instance):
+        invalidate_cache_on_commit(
+            public_video_id=instance.video.public_id, owner_id=instance.video.owner_id
+        )
+    else:
+        invalidate_cache_on_commit(video_id=instance.video_id)
+
+
+@receiver(post_delete, sender=Playlist)
+@receiver(m2m_changed, sender=Playlist.videos.through)
+def invalidate_playlist_videos_cache(sender, instance=None, action=None, **kwargs):
     """
+    Invalidate the cached video lists whenever playlist contents change, since
+    video lists can be filtered by playlist. Note that `instance` is a Video
+    object when the relation is modified from the video side.
+    """
+    if action is not None and not action.startswith("post_"):
+        return
     if instance:
-        invalidate_cache(instance.video.public_id)
+        invalidate_cache_on_commit(owner_id=instance.owner_id)
+
 
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Subtitle)
+@receiver(post_save, sender=VideoUploadUrl)
+def clear_not_found_cache(sender, instance=None, created=False, **kwargs):
+    """
+    Objects may have been looked up by their owner before they were created:
+    the corresponding cached 404 results must be cleared.
+    """
+    if not instance or not created:
+        return
+    if sender is Subtitle:
+        owner_id, public_id = instance.video.owner_id, instance.public_id
+    elif sender is VideoUploadUrl:
+        owner_id, public_id = instance.owner_id, instance.public_video_id
+    else:
+        owner_id, public_id = instance.owner_id, instance.public_id
+    transaction.on_commit(
+        lambda: cache.clear_not_found(sender._meta.model_name, owner_id, public_id)
+    )
+
+
+def invalidate_cache(public_video_id, owner_id=None):
+    """
+    Invalidate the cached video and the cached video lists of its owner.
 
-def invalidate_cache(public_video_id):
+    Args:
+        public_video_id (str)
+        owner_id (int): if undefined, the owner will be fetched from the db.
+    """
     cache.invalidate(public_video_id)
+    if owner_id is None:
+        owner_id = (
+            Video.objects.filter(public_id=public_video_id)
+            .values_list("owner_id", flat=True)
+            .first()
+        )
+    if owner_id is not None:
+        cache.invalidate_owner(owner_id)
+
+
+class InvalidationBatch(object):
+    """
+    Cache invalidations that are collected during a transaction, and that are
+    flushed by a single commit hook.
+    """
+
+    def __init__(self):
+        self.public_video_ids = set()
+        self.video_ids = set()
+        self.owner_ids = set()
+
+    def add(self, public_video_id=None, video_id=None, owner_id=None):
+        if public_video_id is not None:
+            self.public_video_ids.add(public_video_id)
+        if video_id is not None:
+            self.video_ids.add(video_id)
+        if owner_id is not None:
+            self.owner_ids.add(owner_id)
+
+    def __call__(self):
+        """
+        Commit hook: perform the collected invalidations.
+        """
+        if _get_batch() is self:
+            _invalidations.batch = None
+        public_video_ids = set(self.public_video_ids)
+        owner_ids = set(self.owner_ids)
+        if self.video_ids:
+            # Videos that no longer exist were deleted, and thus invalidated
+            # by their own post_delete signal.
+            for public_video_id, owner_id in Video.objects.filter(
+                id__in=self.video_ids
+            ).values_list("public_id", "owner_id"):
+                public_video_ids.add(public_video_id)
+                owner_ids.add(owner_id)
+        cache.invalidate_many(public_video_ids)
+        for owner_id in owner_ids:
+            cache.invalidate_owner(owner_id)
+
+
+# The batch of the current transaction is only referenced by its commit hook:
+# when the transaction is rolled back, the hook is discarded and the batch is
+# garbage collected, such that the next invalidation starts a new batch.
+_invalidations = threading.local()
+
+
+def _get_batch():
+    batch_ref = getattr(_invalidations, "batch", None)
+    return batch_ref() if batch_ref is not None else None
+
+
+def invalidate_cache_on_commit(public_video_id=None, video_id=None, owner_id=None):
+    """
+    Invalidate the cached video and the cached video lists of its owner once
+    the current transaction is committed. Invalidations are deduplicated and
+    performed all at once at the end of the transaction; they are discarded
+    if the transaction is rolled back. Outside of transactions, the cache is
+    invalidated immediately.
+
+    Args:
+        public_video_id (str)
+        video_id (int): video primary key, in case the public id is unknown
+        owner_id (int): owner of the video lists to invalidate
+    """
+    batch = _get_batch()
+    if batch is None or not transaction.get_connection().in_atomic_block:
+        batch = InvalidationBatch()
+        _invalidations.batch = weakref.ref(batch)
+        batch.add(public_video_id, video_id, owner_id)
+        transaction.on_commit(batch)
+    else:
+        batch.add(public_video_id, video_id, owner_id)
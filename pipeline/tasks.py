@@ -1,9 +1,8 @@
 import logging
 from tempfile import NamedTemporaryFile
-from time import sleep
 
-from django.core.cache import cache
-from django.db.transaction import TransactionManagementError
+from django.conf import settings
+from django.db import transaction
 from django.utils.timezone import now
 
 import pycaption
@@ -11,78 +10,14 @@ from celery import shared_task
 
 from videofront.celery_videofront import send_task
 
-from . import backend, exceptions, models, utils
+from . import backend
+from . import cache as video_cache
+from . import exceptions, models, utils
+from .locks import Lock
 
 logger = logging.getLogger(__name__)
 
 
-class Lock(object):
-    """
-    Lock context manager.
-
-    Usage:
-
-        with Lock('mylockname', timeout=3600) as lock:
-            if lock.is_acquired:
-                run_not_thread_safe_code()
-    """
-
-    def __init__(self, name, timeout=60, wait=False):
-        """
-        Args:
-            name (str)
-            timeout (int): lock expiry duration, in seconds. Set to None if the
-            lock should not expire (not recommended).
-            wait (bool): if True, and if there is a concurrent call to this
-            function, it will block until completion of the concurrent task.
-            Note, however, that in this case the lock will *not* be acquired.
-        """
-        self.name = name
-        self.timeout = timeout
-        self.wait = wait
-        self.is_acquired = False
-
-    def __enter__(self):
-        try:
-            acquire_lock(self.name, expires_in=self.timeout)
-            self.is_acquired = True
-        except exceptions.LockUnavailable:
-            if self.wait:
-                while cache.get(self.name) is not None:
-                    sleep(0.1)
-        return self
-
-    def __exit__(self, exc_t, exc_v, trace):
-        if self.is_acquired:
-            release_lock(self.name)
-            self.is_acquired = False
-
-
-def acquire_lock(name, expires_in=None):
-    """
-    Acquire a database lock. Raises LockUnavailable when the lock is unavailable.
-    """
-    if cache.add(name, True, timeout=expires_in):
-        return True
-    raise exceptions.LockUnavailable(name)
-
-
-def release_lock(name):
-    """
-    Release a lock for all. Note that the lock will be released even if it was
-    never acquired.
-    """
-    # Note that in unit tests, and in case the wrapped code raises an
-    # IntegrityError, releasing the cache will result in a
-    # TransactionManagementError. This is because unit tests run inside atomic
-    # blocks. We cannot execute queries inside an atomic block if a transaction
-    # needs to be rollbacked.
-    try:
-        cache.delete(name)
-    except TransactionManagementError:
-        logger.error("Could not release lock %s", name)
-
-
 def upload_video(public_video_id, file_object):
     """
     Store a video file for transcoding.
@@ -103,14 +38,15 @@ def upload_video(public_video_id, file_object):
     # Upload video
     backend.get().upload_video(public_video_id, file_object)
 
-    # Create video object
-    video = models.Video.objects.create(
-        public_id=video_upload_url.public_video_id,
-        owner=video_upload_url.owner,
-        title=file_object.name,
-    )
-    if video_upload_url.playlist:
-        video.playlists.add(video_upload_url.playlist)
+    # Create video object, along with its processing state
+    with transaction.atomic():
+        video = models.Video.objects.create(
+            public_id=video_upload_url.public_video_id,
+            owner=video_upload_url.owner,
+            title=file_object.name,
+        )
+        if video_upload_url.playlist:
+            video.playlists.add(video_upload_url.playlist)
 
     # Start transcoding
     send_task("transcode_video", args=(public_video_id,))
@@ -118,7 +54,7 @@ def upload_video(public_video_id, file_object):
 
 @shared_task(name="transcode_video_restart")
 def transcode_video_restart():
-    with Lock("TASK_LOCK_TRANSCODE_VIDEO_RESTART", 60) as lock:
+    with Lock("TASK_LOCK_TRANSCODE_VIDEO_RESTART") as lock:
         if lock.is_acquired:
             for processing_state in models.ProcessingState.objects.filter(
                 status=models.ProcessingState.STATUS_RESTART
@@ -137,33 +73,102 @@ def transcode_video(public_video_id, delete=True):
         public_video_id (str)
         delete (bool): delete video on failure
     """
-    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id, 3600) as lock:
+    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id) as lock:
         if lock.is_acquired:
             try:
                 models.invalidate_cache(public_video_id)
-                _transcode_video(public_video_id, delete=delete)
+                _transcode_video(public_video_id, lock.token, delete=delete)
+            except exceptions.LockLost:
+                # The video is being processed by another worker
+                raise
             except Exception as error:
                 # Store error message
                 message = "\n".join([str(arg) for arg in error.args])
-                models.ProcessingState.objects.filter(
-                    video__public_id=public_video_id
-                ).update(status=models.ProcessingState.STATUS_FAILED, message=message)
+                update_processing_state(
+                    public_video_id,
+                    lock.token,
+                    status=models.ProcessingState.STATUS_FAILED,
+                    message=message,
+                )
                 raise
             finally:
                 models.invalidate_cache(public_video_id)
+                publish_processing_state(public_video_id)
+                # Clients are likely to request the video as soon as it is
+                # ready, so we store it in the cache right away
+                transaction.on_commit(
+                    lambda: send_task("refresh_video_cache", args=(public_video_id,))
+                )
+
 
+@shared_task(name="refresh_video_cache")
+def refresh_video_cache(public_video_id):
+    video_cache.refresh(public_video_id)
 
-def _transcode_video(public_video_id, delete=True):
+
+def publish_processing_state(public_video_id):
+    """
+    Notify clients that wait for progress updates of the current processing
+    state of a video.
+    """
+    processing_state = (
+        models.ProcessingState.objects.filter(video__public_id=public_video_id)
+        .values("status", "progress")
+        .first()
+    )
+    if processing_state is not None:
+        video_cache.publish_progress(
+            public_video_id, processing_state["status"], processing_state["progress"]
+        )
+
+
+def update_processing_state(public_video_id, fencing_token, **kwargs):
+    """
+    Update the processing state of a video on behalf of the holder of a
+    transcoding lock. Updates from holders that lost their lock to another
+    worker, i.e: whose fencing token is lower than the last token that was
+    used, are rejected.
+
+    Raises:
+        LockLost
+    """
+    updated = models.ProcessingState.objects.filter(
+        video__public_id=public_video_id, fencing_token__lte=fencing_token
+    ).update(fencing_token=fencing_token, **kwargs)
+    if (
+        not updated
+        and models.ProcessingState.objects.filter(
+            video__public_id=public_video_id
+        ).exists()
+    ):
+        raise exceptions.LockLost(public_video_id, fencing_token)
+
+    # Queryset updates do not send signals: cached video lists of the owner,
+    # which include the processing state, must be invalidated explicitly.
+    # Cached videos are not invalidated, since progress is merged into them at
+    # read time (see `pipeline.cache.overlay_progress`).
+    owner_id = (
+        models.Video.objects.filter(public_id=public_video_id)
+        .values_list("owner_id", flat=True)
+        .first()
+    )
+    if owner_id is not None:
+        models.invalidate_cache_on_commit(owner_id=owner_id)
+
+
+def _transcode_video(public_video_id, fencing_token, delete=True):
     """
     This function is not thread-safe. It should only be called by the transcode_video task.
     """
     video = models.Video.objects.get(public_id=public_video_id)
-    processing_state = models.ProcessingState.objects.filter(
-        video__public_id=public_video_id
-    )
-    processing_state.update(
-        progress=0, status=models.ProcessingState.STATUS_PENDING, started_at=now()
+    update_processing_state(
+        public_video_id,
+        fencing_token,
+        progress=0,
+        status=models.ProcessingState.STATUS_PENDING,
+        started_at=now(),
     )
+    publish_processing_state(public_video_id)
 
     jobs = backend.get().start_transcoding(public_video_id)
     success_job_indexes = []
@@ -190,10 +195,13 @@ def _transcode_video(public_video_id, delete=True):
         # Note that we do not delete original assets once transcoding has
         # ended. This is because we want to keep the possibility of restarting
         # the transcoding process.
-        processing_state.update(
+        update_processing_state(
+            public_video_id,
+            fencing_token,
             progress=sum(jobs_progress) * 1. / len(jobs),
             status=models.ProcessingState.STATUS_PROCESSING,
         )
+        publish_processing_state(public_video_id)
 
     # Create thumbnail
     if not errors:
@@ -207,21 +215,27 @@ def _transcode_video(public_video_id, delete=True):
     models.VideoFormat.objects.filter(video=video).delete()
 
     # Check status
-    processing_state.update(message="\n".join(errors))
+    update_processing_state(public_video_id, fencing_token, message="\n".join(errors))
     if errors:
-        processing_state.update(status=models.ProcessingState.STATUS_FAILED)
+        update_processing_state(
+            public_video_id, fencing_token, status=models.ProcessingState.STATUS_FAILED
+        )
         if delete:
             # In case of errors, wipe all data
             delete_video(public_video_id)
     else:
         # Create video formats first so that they are available as soon as the
-        # video object becomes available from the API
-        for format_name, bitrate in backend.get().iter_formats(public_video_id):
-            models.VideoFormat.objects.create(
-                video=video, name=format_name, bitrate=bitrate
-            )
+        # video object becomes available from the API. Formats are created in
+        # a single transaction such that the video cache is invalidated once.
+        with transaction.atomic():
+            for format_name, bitrate in backend.get().iter_formats(public_video_id):
+                models.VideoFormat.objects.create(
+                    video=video, name=format_name, bitrate=bitrate
+                )
 
-        processing_state.update(status=models.ProcessingState.STATUS_SUCCESS)
+        update_processing_state(
+            public_video_id, fencing_token, status=models.ProcessingState.STATUS_SUCCESS
+        )
 
     # If the video was deleted while the file was transcoding, wipe all data
     if not models.Video.objects.filter(public_id=public_video_id).exists():
@@ -289,6 +303,67 @@ def delete_video(public_video_id):
     backend.get().delete_video(public_video_id)
 
 
+def delete_videos(public_video_ids):
+    """
+    Delete video objects and schedule the deletion of their assets. Storage is
+    not accessed here, such that this function remains fast even for a large
+    number of videos.
+
+    Args:
+        public_video_ids (list)
+    """
+    with transaction.atomic():
+        models.DeletedVideo.objects.bulk_create(
+            [
+                models.DeletedVideo(public_id=public_video_id)
+                for public_video_id in public_video_ids
+            ]
+        )
+        models.Video.objects.filter(public_id__in=public_video_ids).delete()
+    # This function may be called inside a transaction: the purge must not
+    # start before the deletion queue is committed
+    transaction.on_commit(lambda: send_task("purge_deleted_videos"))
+
+
+@shared_task(name="purge_deleted_videos")
+def purge_deleted_videos():
+    """
+    Delete the assets of deleted videos, in batches. Videos are removed from
+    the deletion queue only once their assets were deleted, so that failed
+    deletions are retried on the next run.
+    """
+    with Lock("TASK_LOCK_PURGE_DELETED_VIDEOS") as lock:
+        if lock.is_acquired:
+            last_id = 0
+            while True:
+                deleted_videos = list(
+                    models.DeletedVideo.objects.filter(id__gt=last_id)
+                    .order_by("id")
+                    .values_list("id", "public_id")[: settings.VIDEO_PURGE_BATCH_SIZE]
+                )
+                if not deleted_videos:
+                    break
+                last_id = deleted_videos[-1][0]
+                failed_video_ids = set(
+                    backend.get().delete_videos(
+                        [public_id for _pk, public_id in deleted_videos]
+                    )
+                    or []
+                )
+                if failed_video_ids:
+                    logger.warning(
+                        "Could not purge the assets of %d deleted videos",
+                        len(failed_video_ids),
+                    )
+                models.DeletedVideo.objects.filter(
+                    id__in=[
+                        pk
+                        for pk, public_id in deleted_videos
+                        if public_id not in failed_video_ids
+                    ]
+                ).delete()
+
+
 def delete_subtitle(public_video_id, public_subtitle_id):
     """ Delete subtitle associated to video"""
     backend.get().delete_subtitle(public_video_id, public_subtitle_id)
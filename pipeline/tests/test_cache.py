@@ -0,0 +1,374 @@
+import gzip
+
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+
+from pipeline import cache
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    def test_set_get(self):
+        cache.set("videoid", {"id": "videoid", "title": "Vidéo"}, 1)
+        entry = cache.get("videoid")
+
+        self.assertEqual('{"id":"videoid","title":"Vidéo"}'.encode(), entry["content"])
+        self.assertEqual("application/json", entry["content_type"])
+        self.assertEqual(1, entry["owner_id"])
+        self.assertEqual({"id": "videoid", "title": "Vidéo"}, cache.load(entry))
+
+    def test_entries_are_compressed(self):
+        cache.set("videoid", {"title": "a" * 1000}, 1)
+        entry = cache.get("videoid")
+
+        self.assertIn("gzip", entry["encodings"])
+        self.assertEqual(entry["content"], gzip.decompress(entry["encodings"]["gzip"]))
+
+    def test_small_entries_are_not_compressed(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+
+        self.assertNotIn("gzip", cache.get("videoid")["encodings"])
+
+    def test_legacy_entries_are_ignored(self):
+        django_cache.set("VIDEO:videoid", '{"id": "videoid"}')
+        django_cache.set("VIDEO:videoid2", {"content": '{"id": "videoid2"}'})
+
+        self.assertIsNone(cache.get("videoid"))
+        self.assertEqual({}, cache.get_many(["videoid", "videoid2"]))
+
+    def test_lists_expire_quickly(self):
+        with patch.object(django_cache, "set", wraps=django_cache.set) as mock_set:
+            cache.set_list("VIDEOS:1:1:hash", {"results": []}, 1)
+
+        self.assertEqual(cache.LIST_CACHE_TIMEOUT, mock_set.call_args[0][2])
+        self.assertEqual({"results": []}, cache.load(cache.get_list("VIDEOS:1:1:hash")))
+
+    def test_publish_progress(self):
+        self.assertIsNone(cache.get_progress("videoid"))
+        record1 = cache.publish_progress("videoid", "processing", 10)
+        record2 = cache.publish_progress("videoid", "processing", 20)
+
+        self.assertEqual("processing", record1["status"])
+        self.assertEqual(10, record1["progress"])
+        self.assertLess(record1["version"], record2["version"])
+        self.assertEqual(record2, cache.get_progress("videoid"))
+
+    def test_listen_progress(self):
+        with cache.listen_progress("videoid") as listener:
+            with cache.listen_progress("othervideoid") as other_listener:
+                cache.publish_progress("videoid", "processing", 10)
+                self.assertTrue(listener.wait(0))
+                self.assertFalse(other_listener.wait(0))
+
+    def test_overlay_progress(self):
+        entry = cache.set(
+            "videoid", {"processing": {"status": "pending", "progress": 0}}, 1
+        )
+        self.assertIs(entry, cache.overlay_progress("videoid", entry))
+
+        cache.publish_progress("videoid", "processing", 42)
+        overlaid = cache.overlay_progress("videoid", entry)
+
+        self.assertEqual(
+            {"processing": {"status": "processing", "progress": 42}},
+            cache.load(overlaid),
+        )
+        self.assertNotEqual(entry["etag"], overlaid["etag"])
+        self.assertEqual(1, overlaid["owner_id"])
+        # Overlaid entries are not compressed
+        self.assertEqual({}, overlaid["encodings"])
+
+    def test_load_many_with_progress(self):
+        entries = {
+            "videoid1": cache.set(
+                "videoid1", {"processing": {"status": "pending", "progress": 0}}, 1
+            ),
+            "videoid2": cache.set(
+                "videoid2", {"processing": {"status": "success", "progress": 100}}, 1
+            ),
+        }
+        cache.publish_progress("videoid1", "processing", 42)
+        with patch.object(
+            django_cache, "get_many", wraps=django_cache.get_many
+        ) as mock_get_many:
+            videos_data = cache.load_many(entries)
+
+        self.assertEqual(
+            {
+                "videoid1": {"processing": {"status": "processing", "progress": 42}},
+                "videoid2": {"processing": {"status": "success", "progress": 100}},
+            },
+            videos_data,
+        )
+        # Progress is only fetched for videos that are being processed
+        mock_get_many.assert_called_once_with(["VIDEO_PROGRESS:videoid1"])
+
+    def test_overlay_progress_of_finished_video(self):
+        entry = cache.set(
+            "videoid", {"processing": {"status": "success", "progress": 0}}, 1
+        )
+        with patch("pipeline.cache.get_progress") as mock_get_progress:
+            self.assertIs(entry, cache.overlay_progress("videoid", entry))
+        mock_get_progress.assert_not_called()
+
+    def test_overlay_progress_of_previous_run(self):
+        with patch("pipeline.cache.time", return_value=1000):
+            cache.publish_progress("videoid", "success", 100)
+        entry = cache.set(
+            "videoid", {"processing": {"status": "restart", "progress": 0}}, 1
+        )
+
+        self.assertIs(entry, cache.overlay_progress("videoid", entry))
+
+
+class LocalCacheTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    def test_local_cache_hit(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        with patch.object(django_cache, "get") as mock_get:
+            entry = cache.get("videoid")
+
+        mock_get.assert_not_called()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+
+    def test_shared_cache_hit(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        cache.clear_local()
+
+        self.assertEqual({"id": "videoid"}, cache.load(cache.get("videoid")))
+        self.assertEqual(1, cache.get_stats()["shared"]["hits"])
+        self.assertEqual(1, cache.get_stats()["local"]["misses"])
+
+    def test_invalidate(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        cache.invalidate("videoid")
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_invalidate_increments_generation(self):
+        key = cache._invalidation_generation_cache_key(
+            cache._generation_bucket("VIDEO:videoid")
+        )
+        cache.invalidate("videoid")
+        generation = django_cache.get(key)
+        self.assertIsNotNone(generation)
+
+        cache.invalidate("videoid")
+        self.assertEqual(generation + 1, django_cache.get(key))
+
+    def test_invalidate_many(self):
+        cache.set_many({"videoid1": {"id": "videoid1"}, "videoid2": {}}, 1)
+        with patch.object(
+            django_cache, "delete_many", wraps=django_cache.delete_many
+        ) as mock_delete_many:
+            cache.invalidate_many(["videoid1", "videoid2"])
+
+        mock_delete_many.assert_called_once_with(["VIDEO:videoid1", "VIDEO:videoid2"])
+        self.assertEqual({}, cache.get_many(["videoid1", "videoid2"]))
+
+    def test_entries_of_other_codecs_are_ignored(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        cache.clear_local()
+
+        with override_settings(VIDEO_CACHE_CODEC="pipeline.codecs.PickleCodec"):
+            self.assertIsNone(cache.get("videoid"))
+            cache.set("videoid", {"id": "videoid"}, 1)
+            cache.clear_local()
+            self.assertIn("videoid", cache.get_many(["videoid"]))
+
+    def test_invalidation_by_other_process(self):
+        with patch("pipeline.cache.time", return_value=0):
+            cache.set("videoid", {"id": "videoid"}, 1)
+            # Simulate an invalidation by another process
+            bucket = cache._generation_bucket("VIDEO:videoid")
+            django_cache.set(cache._invalidation_generation_cache_key(bucket), 1)
+            cache._set_entry("VIDEO:videoid", {"id": "new"}, 1)
+            # Other processes are not checked immediately
+            self.assertEqual({"id": "videoid"}, cache.load(cache.get("videoid")))
+
+        with patch("pipeline.cache.time", return_value=cache.GENERATION_CHECK_INTERVAL):
+            self.assertEqual({"id": "new"}, cache.load(cache.get("videoid")))
+
+    def test_invalidation_of_other_buckets_by_other_process(self):
+        bucket1 = cache._generation_bucket("VIDEO:videoid1")
+        bucket2 = cache._generation_bucket("VIDEO:videoid2")
+        self.assertNotEqual(bucket1, bucket2)
+        with patch("pipeline.cache.time", return_value=0):
+            cache.set("videoid1", {"id": "videoid1"}, 1)
+            cache.set("videoid2", {"id": "videoid2"}, 1)
+            # Simulate an invalidation of videoid2 by another process
+            django_cache.set(cache._invalidation_generation_cache_key(bucket2), 1)
+            cache._set_entry("VIDEO:videoid1", {"id": "new1"}, 1)
+            cache._set_entry("VIDEO:videoid2", {"id": "new2"}, 1)
+
+        with patch("pipeline.cache.time", return_value=cache.GENERATION_CHECK_INTERVAL):
+            # Local entries of other buckets are kept
+            self.assertEqual({"id": "videoid1"}, cache.load(cache.get("videoid1")))
+            self.assertEqual({"id": "new2"}, cache.load(cache.get("videoid2")))
+
+    def test_get_many(self):
+        cache.set("videoid1", {"id": "videoid1"}, 1)
+        cache.set_many({"videoid2": {"id": "videoid2"}}, 1)
+        cache.clear_local()
+        cache.get("videoid1")
+
+        entries = cache.get_many(["videoid1", "videoid2", "videoid3"])
+
+        self.assertEqual(["videoid1", "videoid2"], sorted(entries))
+        self.assertEqual(
+            {"hits": 1, "misses": 3, "hit_rate": 0.25, "size": 2},
+            cache.get_stats()["local"],
+        )
+        self.assertEqual(
+            {"hits": 2, "misses": 1, "hit_rate": 2 / 3}, cache.get_stats()["shared"]
+        )
+
+    def test_stats_without_calls(self):
+        self.assertIsNone(cache.get_stats()["local"]["hit_rate"])
+
+
+class RefreshTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    @override_settings(VIDEO_CACHE_LOADER="pipeline.tests.test_cache.load_video")
+    def test_refresh(self):
+        entry = cache.refresh("videoid")
+
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+        self.assertEqual(1, entry["owner_id"])
+        self.assertEqual(entry, cache.get("videoid"))
+
+    @override_settings(VIDEO_CACHE_LOADER="pipeline.tests.test_cache.load_video")
+    def test_refresh_missing_video(self):
+        self.assertIsNone(cache.refresh("missing"))
+        self.assertIsNone(cache.get("missing"))
+
+
+def load_video(public_video_id):
+    if public_video_id == "missing":
+        return None
+    return {"id": public_video_id}, 1
+
+
+class FetchTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    def test_fetch_missing_entry(self):
+        compute = Mock(return_value=({"id": "videoid"}, 1))
+        entry = cache.fetch("videoid", compute)
+
+        compute.assert_called_once_with()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+        self.assertEqual(entry, cache.get("videoid"))
+        # The recompute lock is released
+        self.assertIsNone(django_cache.get("VIDEO_RECOMPUTE:videoid"))
+
+    def test_fetch_existing_entry(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        compute = Mock()
+        entry = cache.fetch("videoid", compute)
+
+        compute.assert_not_called()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+
+    def test_check_missing_entry(self):
+        compute = Mock()
+        with self.assertRaises(ValueError):
+            cache.fetch("videoid", compute, check=Mock(side_effect=ValueError))
+
+        compute.assert_not_called()
+        self.assertIsNone(django_cache.get("VIDEO_RECOMPUTE:videoid"))
+
+    def test_check_is_skipped_for_existing_entry(self):
+        cache.set("videoid", {"id": "videoid"}, 1)
+        check = Mock()
+        cache.fetch("videoid", Mock(), check=check)
+
+        check.assert_not_called()
+
+    def test_compute_exceptions_release_lock(self):
+        with self.assertRaises(ValueError):
+            cache.fetch("videoid", Mock(side_effect=ValueError))
+        self.assertIsNone(django_cache.get("VIDEO_RECOMPUTE:videoid"))
+
+    def test_stale_entry_is_recomputed(self):
+        with patch("pipeline.cache.time", return_value=0):
+            cache.set("videoid", {"id": "videoid"}, 1)
+        compute = Mock(return_value=({"id": "new"}, 1))
+        entry = cache.fetch("videoid", compute)
+
+        compute.assert_called_once_with()
+        self.assertEqual({"id": "new"}, cache.load(entry))
+
+    def test_stale_entry_is_served_while_recomputed_elsewhere(self):
+        with patch("pipeline.cache.time", return_value=0):
+            cache.set("videoid", {"id": "videoid"}, 1)
+        django_cache.add("VIDEO_RECOMPUTE:videoid", True)
+        compute = Mock()
+        entry = cache.fetch("videoid", compute)
+
+        compute.assert_not_called()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+
+    def test_wait_for_entry_computed_elsewhere(self):
+        django_cache.add("VIDEO_RECOMPUTE:videoid", True)
+        compute = Mock()
+
+        def compute_elsewhere(interval):
+            cache._set_entry("VIDEO:videoid", {"id": "videoid"}, 1)
+
+        with patch("pipeline.cache.sleep", side_effect=compute_elsewhere):
+            entry = cache.fetch("videoid", compute)
+
+        compute.assert_not_called()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+
+    def test_wait_for_entry_computed_and_released_elsewhere(self):
+        django_cache.add("VIDEO_RECOMPUTE:videoid", True)
+        compute = Mock(return_value=({"id": "other"}, 1))
+
+        def compute_elsewhere(interval):
+            # The computing caller stores the entry and releases the lock
+            cache._set_entry("VIDEO:videoid", {"id": "videoid"}, 1)
+            django_cache.delete("VIDEO_RECOMPUTE:videoid")
+
+        with patch("pipeline.cache.sleep", side_effect=compute_elsewhere):
+            entry = cache.fetch("videoid", compute)
+
+        compute.assert_not_called()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+
+    def test_wait_for_entry_when_computing_caller_raises(self):
+        django_cache.add("VIDEO_RECOMPUTE:videoid", True)
+        compute = Mock(return_value=({"id": "videoid"}, 1))
+
+        def fail_elsewhere(interval):
+            # The computing caller raises and releases the lock
+            django_cache.delete("VIDEO_RECOMPUTE:videoid")
+
+        with patch("pipeline.cache.sleep", side_effect=fail_elsewhere) as mock_sleep:
+            entry = cache.fetch("videoid", compute)
+
+        # The waiter computes the entry without waiting for the timeout
+        self.assertEqual(1, mock_sleep.call_count)
+        compute.assert_called_once_with()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
+        self.assertIsNone(django_cache.get("VIDEO_RECOMPUTE:videoid"))
+
+    def test_wait_timeout(self):
+        django_cache.add("VIDEO_RECOMPUTE:videoid", True)
+        compute = Mock(return_value=({"id": "videoid"}, 1))
+        with patch("pipeline.cache.RECOMPUTE_WAIT_TIMEOUT", 0):
+            entry = cache.fetch("videoid", compute)
+
+        compute.assert_called_once_with()
+        self.assertEqual({"id": "videoid"}, cache.load(entry))
@@ -0,0 +1,66 @@
+from django.test import TestCase
+
+from pipeline import cache, codecs
+
+
+class BinaryCodecTests(TestCase):
+    def setUp(self):
+        self.codec = codecs.BinaryCodec()
+
+    def test_encode_decode(self):
+        entry = cache._make_entry(
+            {"id": "videoid", "processing": {"status": "processing", "progress": 42.5}},
+            1,
+        )
+        value = self.codec.encode(entry)
+
+        self.assertIsInstance(value, bytes)
+        self.assertEqual(entry, self.codec.decode(value))
+
+    def test_encode_decode_compressed_entry(self):
+        entry = cache._make_entry({"title": "Vidéo " * 100}, None)
+
+        self.assertIn("gzip", entry["encodings"])
+        self.assertEqual(entry, self.codec.decode(self.codec.encode(entry)))
+
+    def test_encoded_entries_are_smaller_than_dicts(self):
+        entry = cache._make_entry({"id": "videoid"}, 1)
+        self.assertLess(len(self.codec.encode(entry)), len(repr(entry)))
+
+    def test_decode_other_version(self):
+        value = self.codec.encode(cache._make_entry({"id": "videoid"}, 1))
+
+        self.assertIsNone(self.codec.decode(b"VFC0" + value[4:]))
+
+    def test_decode_other_python_version(self):
+        value = self.codec.encode(cache._make_entry({"id": "videoid"}, 1))
+        start = len(codecs.BinaryCodec.TAG)
+
+        self.assertIsNone(self.codec.decode(b"VFC1-py2.7:" + value[start:]))
+
+    def test_decode_other_formats(self):
+        entry = cache._make_entry({"id": "videoid"}, 1)
+
+        self.assertIsNone(self.codec.decode(None))
+        self.assertIsNone(self.codec.decode(entry))
+        self.assertIsNone(self.codec.decode(codecs.BinaryCodec.TAG))
+        self.assertIsNone(self.codec.decode(codecs.BinaryCodec.TAG + b"\xff"))
+        self.assertIsNone(self.codec.decode(entry["content"]))
+
+
+class PickleCodecTests(TestCase):
+    def test_encode_decode(self):
+        codec = codecs.PickleCodec()
+        entry = cache._make_entry({"id": "videoid"}, 1)
+
+        self.assertEqual(entry, codec.decode(codec.encode(entry)))
+        self.assertIsNone(codec.decode(codecs.BinaryCodec().encode(entry)))
+        self.assertIsNone(codec.decode('{"id": "videoid"}'))
+
+    def test_decode_other_version(self):
+        codec = codecs.PickleCodec()
+        entry = cache._make_entry({"id": "videoid"}, 1)
+
+        self.assertIsNone(codec.decode(entry))
+        self.assertIsNone(codec.decode(("VFP0", entry)))
+        self.assertIsNone(codec.decode((codecs.PickleCodec.TAG,)))
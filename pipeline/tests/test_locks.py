@@ -0,0 +1,366 @@
+import threading
+from time import time
+from unittest import skipIf, skipUnless
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.utils import IntegrityError
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from mock import Mock, patch
+
+from pipeline import locks, models
+
+
+class LockTests(TransactionTestCase):
+    """
+    Tests in this test case will not be wrapped inside an atomic transaction.
+    Do not create data in this test case.
+    """
+
+    def setUp(self):
+        cache.delete("dummylock")
+
+    def tearDown(self):
+        cache.delete("dummylock")
+
+    def test_acquire_release_lock_cycle(self):
+        backend = locks.CacheLeaseBackend()
+        token = backend.acquire("dummylock", 30)
+        self.assertIsNotNone(token)
+        self.assertTrue(backend.is_locked("dummylock"))
+        self.assertIsNone(backend.acquire("dummylock", 30))
+        backend.release("dummylock", token)
+        self.assertFalse(backend.is_locked("dummylock"))
+        self.assertIsNotNone(backend.acquire("dummylock", 30))
+
+    def test_fencing_tokens_increase(self):
+        backend = locks.CacheLeaseBackend()
+        token1 = backend.acquire("dummylock", 30)
+        backend.release("dummylock", token1)
+        token2 = backend.acquire("dummylock", 30)
+        self.assertLess(token1, token2)
+
+        # Tokens keep increasing when counters are evicted
+        cache.delete("LOCK_FENCING_TOKEN:dummylock")
+        backend.release("dummylock", token2)
+        self.assertLess(token2, backend.acquire("dummylock", 30))
+
+    def test_release_with_stale_token(self):
+        backend = locks.CacheLeaseBackend()
+        token1 = backend.acquire("dummylock", 30)
+        # The lease expires and the lock is acquired by another holder
+        cache.delete("dummylock")
+        token2 = backend.acquire("dummylock", 30)
+
+        self.assertFalse(backend.renew("dummylock", token1, 30))
+        backend.release("dummylock", token1)
+        self.assertTrue(backend.is_locked("dummylock"))
+        self.assertTrue(backend.renew("dummylock", token2, 30))
+
+    def test_release_lock_with_integrity_error(self):
+        def failing_task():
+            with locks.Lock("dummylock"):
+                models.Video.objects.create(public_id="id")
+                models.Video.objects.create(public_id="id")
+
+        self.assertRaises(IntegrityError, failing_task)
+        with locks.Lock("dummylock") as lock:
+            self.assertTrue(lock.is_acquired)
+
+    def test_postgres_advisory_lock_release_in_failed_transaction(self):
+        backend = locks.PostgresAdvisoryLockBackend()
+        with transaction.atomic():
+            transaction.set_rollback(True)
+            with self.assertLogs("pipeline.locks", "ERROR") as logs:
+                backend.release("dummylock", 1)
+        self.assertEqual(
+            ["ERROR:pipeline.locks:Could not release lock dummylock"], logs.output
+        )
+
+    def test_context_manager(self):
+
+        # 1) Lock is available
+        with locks.Lock("dummylock") as lock:
+            self.assertTrue(lock.is_acquired)
+            self.assertIsNotNone(lock.token)
+            with locks.Lock("dummylock") as concurrent_lock:
+                self.assertFalse(concurrent_lock.is_acquired)
+
+        self.assertFalse(lock.is_acquired)
+
+        # 2) Lock is unavailable
+        token = locks.CacheLeaseBackend().acquire("dummylock", 30)
+        with locks.Lock("dummylock") as lock:
+            self.assertFalse(lock.is_acquired)
+            self.assertIsNone(lock.token)
+
+        self.assertTrue(locks.CacheLeaseBackend().is_locked("dummylock"))
+        locks.CacheLeaseBackend().release("dummylock", token)
+
+    def test_wait(self):
+        token = locks.CacheLeaseBackend().acquire("dummylock", 30)
+
+        def release():
+            locks.CacheLeaseBackend().release("dummylock", token)
+            locks.get_notifier().notify("dummylock")
+
+        timer = threading.Timer(0.2, release)
+        timer.start()
+        started_at = time()
+        # Waiters are woken up by the notification, without polling
+        with override_settings(LOCK_WAIT_POLL_INTERVAL=10):
+            with locks.Lock("dummylock", wait=True) as lock:
+                self.assertFalse(lock.is_acquired)
+                self.assertFalse(lock.timed_out)
+        timer.join()
+        self.assertLess(time() - started_at, 5)
+        self.assertFalse(locks.CacheLeaseBackend().is_locked("dummylock"))
+
+    def test_release_notifies_waiters(self):
+        with locks.get_notifier().listen("dummylock") as listener:
+            with locks.get_notifier().listen("otherlock") as other_listener:
+                with locks.Lock("dummylock"):
+                    pass
+                self.assertTrue(listener.wait(0))
+                self.assertFalse(other_listener.wait(0))
+            self.assertFalse(listener.wait(0))
+
+    @override_settings(LOCK_WAIT_POLL_INTERVAL=0.1)
+    def test_wait_for_expired_lease(self):
+        # Expired leases are not notified
+        locks.CacheLeaseBackend().acquire("dummylock", 30)
+        timer = threading.Timer(0.2, cache.delete, args=("dummylock",))
+        timer.start()
+        with locks.Lock("dummylock", wait=True) as lock:
+            self.assertFalse(lock.timed_out)
+        timer.join()
+        self.assertFalse(locks.CacheLeaseBackend().is_locked("dummylock"))
+
+    @override_settings(LOCK_WAIT_POLL_INTERVAL=0.1)
+    def test_wait_timeout(self):
+        locks.CacheLeaseBackend().acquire("dummylock", 30)
+        with locks.Lock("dummylock", wait=True, timeout=0.3) as lock:
+            self.assertTrue(lock.timed_out)
+        self.assertTrue(locks.CacheLeaseBackend().is_locked("dummylock"))
+
+    def test_stats(self):
+        with locks.Lock("dummylock"):
+            with locks.Lock("dummylock", wait=True, timeout=0.1):
+                pass
+
+        stats = locks.get_stats()
+        self.assertEqual(1, stats["acquisitions"])
+        self.assertEqual(1, stats["contentions"])
+        self.assertEqual(0.5, stats["contention_rate"])
+        self.assertEqual(1, stats["waits"])
+        self.assertEqual(1, stats["wait_timeouts"])
+        self.assertLessEqual(0.1, stats["mean_wait_time"])
+        self.assertEqual(stats["wait_time"], stats["max_wait_time"])
+
+    def test_lease_is_renewed(self):
+        with patch.object(
+            locks.CacheLeaseBackend, "renew", return_value=True
+        ) as mock_renew:
+            with locks.Lock("dummylock", lease=0.3) as lock:
+                threading.Event().wait(0.5)
+                self.assertFalse(lock.is_lost)
+
+        self.assertLess(0, mock_renew.call_count)
+        mock_renew.assert_called_with("dummylock", lock.token, 0.3)
+
+    def test_lock_is_lost(self):
+        with locks.Lock("dummylock") as lock:
+            # The lease expires and the lock is acquired by another holder
+            cache.delete("dummylock")
+            locks.CacheLeaseBackend().acquire("dummylock", 30)
+            self.assertFalse(lock.renew())
+            self.assertTrue(lock.is_lost)
+
+        # The lock of the other holder is not released
+        self.assertTrue(locks.CacheLeaseBackend().is_locked("dummylock"))
+
+    @override_settings(LOCK_BACKEND="pipeline.locks.PostgresAdvisoryLockBackend")
+    def test_get_backend(self):
+        self.assertIsInstance(locks.get_backend(), locks.PostgresAdvisoryLockBackend)
+        self.assertFalse(locks.Lock("dummylock")._backend.expires)
+
+    @override_settings(LOCK_NOTIFIER="pipeline.locks.PostgresNotifier")
+    def test_get_notifier(self):
+        self.assertIsInstance(locks.get_notifier(), locks.PostgresNotifier)
+
+    def test_postgres_dispatcher_forwards_notifications(self):
+        pg_connection = Mock(notifies=[])
+        pg_connection.poll.side_effect = lambda: pg_connection.notifies.extend(
+            [Mock(payload="otherlock"), Mock(payload="dummylock")]
+        )
+        with locks.LocalNotifier().listen("dummylock") as listener:
+            with locks.LocalNotifier().listen("nolock") as other_listener:
+                locks.PostgresDispatcher.dispatch(pg_connection)
+                self.assertTrue(listener.wait(0))
+                self.assertFalse(other_listener.wait(0))
+        self.assertEqual([], pg_connection.notifies)
+
+    @skipIf(connection.vendor == "postgresql", "LISTEN is supported by PostgreSQL")
+    def test_postgres_dispatcher_cannot_listen(self):
+        self.assertFalse(locks.PostgresDispatcher().start("channel"))
+
+    def test_postgres_dispatcher_stop(self):
+        dispatcher = locks.PostgresDispatcher()
+        dispatcher.stop()
+        dispatcher.start("channel")
+        dispatcher.stop()
+        dispatcher.stop()
+        self.assertIsNone(dispatcher._thread)
+        self.assertIsNone(dispatcher._wakeup_fds)
+
+
+def run_in_other_session(func, *args):
+    """
+    Run a function in another thread, and thus with another database
+    connection, which is closed afterwards.
+    """
+    result = []
+
+    def target():
+        try:
+            result.append(func(*args))
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return result[0] if result else None
+
+
+@skipUnless(connection.vendor == "postgresql", "Advisory locks require PostgreSQL")
+class PostgresAdvisoryLockBackendTests(TransactionTestCase):
+    def setUp(self):
+        self.backend = locks.PostgresAdvisoryLockBackend()
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock_all()")
+
+    def test_acquire_release_lock_cycle(self):
+        token = self.backend.acquire("dummylock", 30)
+        self.assertIsNotNone(token)
+        self.assertTrue(self.backend.is_locked("dummylock"))
+        self.assertFalse(self.backend.is_locked("otherlock"))
+        self.backend.release("dummylock", token)
+        self.assertFalse(self.backend.is_locked("dummylock"))
+
+    def test_lock_held_by_other_session(self):
+        def acquire_twice():
+            return (
+                self.backend.acquire("dummylock", 30),
+                self.backend.acquire("dummylock", 30),
+            )
+
+        self.assertIsNotNone(self.backend.acquire("dummylock", 30))
+        self.assertEqual((None, None), run_in_other_session(acquire_twice))
+        self.assertTrue(run_in_other_session(self.backend.is_locked, "dummylock"))
+
+    def test_reentrant_acquisition_is_rejected(self):
+        token = self.backend.acquire("dummylock", 30)
+        self.assertIsNotNone(token)
+        self.assertIsNone(self.backend.acquire("dummylock", 30))
+
+        # The lock is released at once
+        self.backend.release("dummylock", token)
+        self.assertFalse(self.backend.is_locked("dummylock"))
+
+    def test_lock_is_released_when_session_ends(self):
+        self.assertIsNotNone(
+            run_in_other_session(self.backend.acquire, "dummylock", 30)
+        )
+        # Locks are released once the server process of the session exits
+        deadline = time() + 5
+        while self.backend.is_locked("dummylock") and time() < deadline:
+            threading.Event().wait(0.05)
+        self.assertIsNotNone(self.backend.acquire("dummylock", 30))
+
+    def test_fencing_tokens_increase(self):
+        token1 = self.backend.acquire("dummylock", 30)
+        self.backend.release("dummylock", token1)
+        token2 = run_in_other_session(self.backend.acquire, "dummylock", 30)
+        self.assertLess(token1, token2)
+
+    def test_fencing_tokens_are_greater_than_cache_tokens(self):
+        cache_token = locks.CacheLeaseBackend().acquire("dummylock", 30)
+        cache.delete("dummylock")
+        self.assertLess(cache_token, self.backend.acquire("dummylock", 30))
+
+    @override_settings(LOCK_BACKEND="pipeline.locks.PostgresAdvisoryLockBackend")
+    def test_context_manager(self):
+        with locks.Lock("dummylock") as lock:
+            self.assertTrue(lock.is_acquired)
+            with locks.Lock("dummylock") as concurrent_lock:
+                self.assertFalse(concurrent_lock.is_acquired)
+            self.assertTrue(self.backend.is_locked("dummylock"))
+        self.assertFalse(self.backend.is_locked("dummylock"))
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY require PostgreSQL")
+class PostgresNotifierTests(TransactionTestCase):
+    def setUp(self):
+        self.notifier = locks.PostgresNotifier()
+
+    def tearDown(self):
+        # Close the connection of the dispatcher, such that the test database
+        # can be dropped
+        locks._dispatcher.stop()
+
+    def test_notify_listen(self):
+        with self.notifier.listen("dummylock") as listener:
+            with self.notifier.listen("otherlock") as other_listener:
+                run_in_other_session(self.notifier.notify, "dummylock")
+                self.assertTrue(listener.wait(5))
+                self.assertFalse(other_listener.wait(0.1))
+
+    def test_notifications_are_sent_on_commit(self):
+        def notify_in_transaction():
+            with transaction.atomic():
+                self.notifier.notify("dummylock")
+                return listener.wait(0.1)
+
+        with self.notifier.listen("dummylock") as listener:
+            self.assertFalse(run_in_other_session(notify_in_transaction))
+            self.assertTrue(listener.wait(5))
+
+    def test_stop_and_restart_dispatcher(self):
+        with self.notifier.listen("dummylock"):
+            thread = locks._dispatcher._thread
+        locks._dispatcher.stop()
+        self.assertFalse(thread.is_alive())
+
+        with self.notifier.listen("dummylock") as listener:
+            run_in_other_session(self.notifier.notify, "dummylock")
+            self.assertTrue(listener.wait(5))
+
+    @override_settings(
+        LOCK_BACKEND="pipeline.locks.PostgresAdvisoryLockBackend",
+        LOCK_NOTIFIER="pipeline.locks.PostgresNotifier",
+        LOCK_WAIT_POLL_INTERVAL=10,
+    )
+    def test_wait(self):
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with locks.Lock("dummylock"):
+                acquired.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=run_in_other_session, args=(hold_lock,))
+        thread.start()
+        acquired.wait(5)
+        threading.Timer(0.2, release.set).start()
+        started_at = time()
+        # Waiters are woken up by the notification, without polling
+        with locks.Lock("dummylock", wait=True) as lock:
+            self.assertFalse(lock.timed_out)
+        thread.join()
+        self.assertLess(time() - started_at, 5)
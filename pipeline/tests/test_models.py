@@ -1,9 +1,15 @@
+from io import StringIO
 from time import time
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
 
-from pipeline import models
+from mock import patch
+
+from pipeline import cache, models
 from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend
 
 
 class VideoUploadUrlTests(TestCase):
@@ -29,3 +35,113 @@ class VideoUploadUrlTests(TestCase):
         self.assertIn("almost_expired", available_video_ids)
         self.assertNotIn("used", available_video_ids)
         self.assertNotIn("expired", available_video_ids)
+
+
+class AssetUrlsTests(TestCase):
+    @override_plugin_backend(
+        thumbnail_url=lambda video_id, thumb_id: "http://example.com/{}/{}.jpg".format(
+            video_id, thumb_id
+        ),
+        subtitle_url=lambda video_id, sub_id, lang: "http://example.com/{}.vtt".format(
+            sub_id
+        ),
+        video_url=lambda video_id, format_name: "http://example.com/{}.mp4".format(
+            format_name
+        ),
+    )
+    def test_urls_are_stored_on_save(self):
+        video = factories.VideoFactory(public_id="videoid", public_thumbnail_id="th")
+        subtitle = video.subtitles.create(public_id="subid", language="fr")
+        video_format = video.formats.create(name="SD", bitrate=128)
+
+        self.assertEqual("http://example.com/videoid/th.jpg", video.thumbnail_url)
+        self.assertEqual("http://example.com/subid.vtt", subtitle.url)
+        self.assertEqual("http://example.com/SD.mp4", video_format.url)
+
+    def test_rebuild_asset_urls(self):
+        video = factories.VideoFactory(public_id="videoid")
+        video.subtitles.create(public_id="subid", language="fr")
+        video.formats.create(name="SD", bitrate=128)
+
+        with override_plugin_backend(
+            thumbnail_url=lambda *args: "http://cdn.example.com/thumb.jpg",
+            subtitle_url=lambda *args: "http://cdn.example.com/sub.vtt",
+            video_url=lambda *args: "http://cdn.example.com/video.mp4",
+        ):
+            call_command("rebuild-asset-urls", stdout=StringIO())
+
+        self.assertEqual(
+            "http://cdn.example.com/thumb.jpg", models.Video.objects.get().thumbnail_url
+        )
+        self.assertEqual(
+            "http://cdn.example.com/sub.vtt", models.Subtitle.objects.get().url
+        )
+        self.assertEqual(
+            "http://cdn.example.com/video.mp4", models.VideoFormat.objects.get().url
+        )
+
+
+class CacheInvalidationTests(TransactionTestCase):
+    """
+    Commit hooks are only run outside of TestCase transactions.
+    """
+
+    def test_invalidations_are_coalesced_on_commit(self):
+        video = factories.VideoFactory(public_id="videoid")
+        cache.set("videoid", {"id": "videoid"}, video.owner_id)
+
+        with patch("pipeline.cache.invalidate_many") as mock_invalidate_many:
+            with transaction.atomic():
+                for name in ("SD", "HD", "FullHD"):
+                    models.VideoFormat.objects.create(
+                        video_id=video.id, name=name, bitrate=128
+                    )
+                models.Subtitle.objects.create(video_id=video.id, language="fr")
+                mock_invalidate_many.assert_not_called()
+
+        mock_invalidate_many.assert_called_once_with({"videoid"})
+
+    def test_invalidations_are_discarded_on_rollback(self):
+        video = factories.VideoFactory(public_id="videoid")
+
+        with patch("pipeline.cache.invalidate_many") as mock_invalidate_many:
+            with transaction.atomic():
+                models.VideoFormat.objects.create(video=video, name="SD", bitrate=128)
+                transaction.set_rollback(True)
+
+        mock_invalidate_many.assert_not_called()
+
+    def test_invalidations_after_rollback_are_committed(self):
+        video = factories.VideoFactory(public_id="videoid")
+        cache.set("videoid", {"id": "videoid"}, video.owner_id)
+
+        with transaction.atomic():
+            models.VideoFormat.objects.create(video=video, name="SD", bitrate=128)
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            with transaction.atomic():
+                models.VideoFormat.objects.create(video=video, name="HD", bitrate=128)
+                transaction.set_rollback(True)
+            models.VideoFormat.objects.create(video=video, name="HD", bitrate=128)
+            self.assertIsNotNone(cache.get("videoid"))
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_invalidation_outside_transaction(self):
+        video = factories.VideoFactory(public_id="videoid")
+        cache.set("videoid", {"id": "videoid"}, video.owner_id)
+
+        models.VideoFormat.objects.create(video=video, name="SD", bitrate=128)
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_deleted_videos_are_invalidated(self):
+        video = factories.VideoFactory(public_id="videoid")
+        video.formats.create(name="SD", bitrate=128)
+        cache.set("videoid", {"id": "videoid"}, video.owner_id)
+
+        with transaction.atomic():
+            models.Video.objects.filter(public_id="videoid").delete()
+            self.assertIsNotNone(cache.get("videoid"))
+
+        self.assertIsNone(cache.get("videoid"))
@@ -2,67 +2,20 @@ import os
 from time import time
 
 from django.core.urlresolvers import reverse
-from django.db.utils import IntegrityError
-from django.test import TestCase, TransactionTestCase
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase
 from django.test.utils import override_settings
 
-from mock import Mock
+from mock import Mock, patch
 
+from pipeline import cache as video_cache
 from pipeline import exceptions, models, tasks
 from pipeline.tests import factories
+from pipeline.tests.utils import capture_on_commit_callbacks
 from videofront.celery_videofront import send_task
 
 
-class LockTests(TransactionTestCase):
-    """
-    Tests in this test case will not be wrapped inside an atomic transaction.
-    Do not create data in this test case.
-    """
-
-    def setUp(self):
-        tasks.release_lock("dummylock")
-
-    def tearDown(self):
-        tasks.release_lock("dummylock")
-
-    def test_acquire_release_lock_cycle(self):
-        self.assertTrue(tasks.acquire_lock("dummylock"))
-        self.assertRaises(exceptions.LockUnavailable, tasks.acquire_lock, "dummylock")
-        tasks.release_lock("dummylock")
-        self.assertTrue(tasks.acquire_lock("dummylock"))
-
-    def test_release_lock_with_integrity_error(self):
-        def failing_task():
-            tasks.acquire_lock("dummylock", 3600)
-
-            try:
-                models.Video.objects.create(public_id="id")
-                models.Video.objects.create(public_id="id")
-            finally:
-                tasks.release_lock("dummylock")
-
-        self.assertRaises(IntegrityError, failing_task)
-        self.assertTrue(tasks.acquire_lock("dummylock"))
-
-    def test_context_manager(self):
-
-        # 1) Lock is available
-        with tasks.Lock("dummylock") as lock:
-            self.assertTrue(lock.is_acquired)
-            self.assertRaises(
-                exceptions.LockUnavailable, tasks.acquire_lock, "dummylock"
-            )
-
-        self.assertFalse(lock.is_acquired)
-
-        # 2) Lock is unavailable
-        tasks.acquire_lock("dummylock")
-        with tasks.Lock("dummylock") as lock:
-            self.assertFalse(lock.is_acquired)
-
-        self.assertRaises(exceptions.LockUnavailable, tasks.acquire_lock, "dummylock")
-
-
 class TasksTests(TestCase):
     def test_upload_video(self):
         mock_backend = Mock(
@@ -70,6 +23,7 @@ class TasksTests(TestCase):
                 upload_video=Mock(),
                 start_transcoding=Mock(return_value=[]),
                 iter_formats=Mock(return_value=[]),
+                thumbnail_url=Mock(return_value="http://example.com/thumb.jpg"),
             )
         )
         factories.VideoUploadUrlFactory(
@@ -86,6 +40,7 @@ class TasksTests(TestCase):
         video_upload_url = models.VideoUploadUrl.objects.get()
         self.assertEqual("Some video.mp4", video.title)
         self.assertLess(10, len(video.public_thumbnail_id))
+        self.assertEqual("http://example.com/thumb.jpg", video.thumbnail_url)
         self.assertTrue(video_upload_url.was_used)
 
     def test_upload_url_invalidated_after_failed_upload(self):
@@ -111,6 +66,7 @@ class TasksTests(TestCase):
                 check_progress=Mock(return_value=(42, True)),
                 iter_formats=Mock(return_value=[("SD", 128)]),
                 create_thumbnail=Mock(),
+                video_url=Mock(return_value="http://example.com/SD.mp4"),
             )
         )
 
@@ -133,6 +89,55 @@ class TasksTests(TestCase):
         self.assertEqual("videoid", video_format.video.public_id)
         self.assertEqual("SD", video_format.name)
         self.assertEqual(128, video_format.bitrate)
+        self.assertEqual("http://example.com/SD.mp4", video_format.url)
+
+    def test_transcode_video_refreshes_cache(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(return_value=(100, True)),
+                iter_formats=Mock(return_value=[]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with capture_on_commit_callbacks(execute=True):
+                tasks.transcode_video("videoid")
+
+        entry = video_cache.get("videoid")
+        self.assertIsNotNone(entry)
+        self.assertEqual(
+            models.ProcessingState.STATUS_SUCCESS,
+            video_cache.load(entry)["processing"]["status"],
+        )
+
+    def test_transcode_video_publishes_progress(self):
+        factories.VideoFactory(public_id="videoid")
+        published = []
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(return_value=(42, True)),
+                iter_formats=Mock(return_value=[]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch(
+                "pipeline.cache.publish_progress",
+                side_effect=lambda *args: published.append(args),
+            ):
+                tasks.transcode_video("videoid")
+
+        self.assertEqual(
+            [
+                ("videoid", models.ProcessingState.STATUS_PENDING, 0),
+                ("videoid", models.ProcessingState.STATUS_PROCESSING, 42),
+                ("videoid", models.ProcessingState.STATUS_SUCCESS, 42),
+            ],
+            published,
+        )
 
     def test_transcode_video_failure(self):
         factories.VideoFactory(public_id="videoid")
@@ -239,6 +244,51 @@ class TasksTests(TestCase):
         self.assertEqual("", video_processing_state.message)
         self.assertEqual(100, video_processing_state.progress)
 
+    def test_transcode_video_after_lock_was_lost(self):
+        video = factories.VideoFactory(public_id="videoid")
+
+        def check_progress(job):
+            # Another worker acquires the lock while the job is running
+            models.ProcessingState.objects.filter(video=video).update(
+                fencing_token=F("fencing_token") + 1000000,
+                status=models.ProcessingState.STATUS_PROCESSING,
+                progress=10,
+            )
+            return 100, True
+
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(side_effect=check_progress),
+            )
+        )
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            self.assertRaises(exceptions.LockLost, tasks.transcode_video, "videoid")
+
+        # Progress of the other worker is not overwritten
+        video_processing_state = models.ProcessingState.objects.get()
+        self.assertEqual(
+            models.ProcessingState.STATUS_PROCESSING, video_processing_state.status
+        )
+        self.assertEqual(10, video_processing_state.progress)
+
+    def test_update_processing_state_with_stale_token(self):
+        video = factories.VideoFactory(public_id="videoid")
+
+        tasks.update_processing_state("videoid", 2, progress=20)
+        tasks.update_processing_state("videoid", 3, progress=30)
+        self.assertRaises(
+            exceptions.LockLost,
+            tasks.update_processing_state,
+            "videoid",
+            2,
+            progress=40,
+        )
+
+        processing_state = models.ProcessingState.objects.get(video=video)
+        self.assertEqual(3, processing_state.fencing_token)
+        self.assertEqual(30, processing_state.progress)
+
     def test_transcode_video_restart(self):
         video = factories.VideoFactory(public_id="videoid")
         models.ProcessingState.objects.filter(video=video).update(
@@ -396,7 +446,11 @@ class UploadThumbnailTests(TestCase):
         )
 
         mock_backend = Mock(
-            return_value=Mock(upload_thumbnail=Mock(), delete_thumbnail=Mock())
+            return_value=Mock(
+                upload_thumbnail=Mock(),
+                delete_thumbnail=Mock(),
+                thumbnail_url=Mock(return_value="http://example.com/thumb.jpg"),
+            )
         )
         with override_settings(PLUGIN_BACKEND=mock_backend):
             tasks.upload_thumbnail("videoid", img)
@@ -405,3 +459,81 @@ class UploadThumbnailTests(TestCase):
         mock_backend.return_value.delete_thumbnail.assert_called_once_with(
             "videoid", "old_thumbid"
         )
+
+
+class DeleteVideosTasksTests(TestCase):
+    def test_delete_videos(self):
+        factories.VideoFactory(public_id="videoid1")
+        factories.VideoFactory(public_id="videoid2")
+        factories.VideoFactory(public_id="videoid3")
+
+        mock_backend = Mock(return_value=Mock(delete_videos=Mock(return_value=[])))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with capture_on_commit_callbacks(execute=True):
+                tasks.delete_videos(["videoid1", "videoid2"])
+
+        self.assertEqual(
+            ["videoid3"], list(models.Video.objects.values_list("public_id", flat=True))
+        )
+        mock_backend.return_value.delete_videos.assert_called_once_with(
+            ["videoid1", "videoid2"]
+        )
+        self.assertEqual(0, models.DeletedVideo.objects.count())
+
+    @override_settings(VIDEO_PURGE_BATCH_SIZE=2)
+    def test_purge_deleted_videos_in_batches(self):
+        for public_id in ["videoid1", "videoid2", "videoid3"]:
+            models.DeletedVideo.objects.create(public_id=public_id)
+
+        mock_backend = Mock(return_value=Mock(delete_videos=Mock(return_value=[])))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.purge_deleted_videos()
+
+        self.assertEqual(2, mock_backend.return_value.delete_videos.call_count)
+        mock_backend.return_value.delete_videos.assert_any_call(
+            ["videoid1", "videoid2"]
+        )
+        mock_backend.return_value.delete_videos.assert_any_call(["videoid3"])
+        self.assertEqual(0, models.DeletedVideo.objects.count())
+
+    def test_purge_deleted_videos_failure(self):
+        models.DeletedVideo.objects.create(public_id="videoid")
+
+        mock_backend = Mock(
+            return_value=Mock(delete_videos=Mock(side_effect=ValueError))
+        )
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            self.assertRaises(ValueError, tasks.purge_deleted_videos)
+
+        # Assets will be deleted on the next run
+        self.assertEqual(1, models.DeletedVideo.objects.count())
+
+    def test_purge_deleted_videos_keeps_failed_videos(self):
+        for public_id in ["videoid1", "videoid2"]:
+            models.DeletedVideo.objects.create(public_id=public_id)
+
+        mock_backend = Mock(
+            return_value=Mock(delete_videos=Mock(return_value=["videoid2"]))
+        )
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.purge_deleted_videos()
+
+        mock_backend.return_value.delete_videos.assert_called_once_with(
+            ["videoid1", "videoid2"]
+        )
+        # Assets will be deleted on the next run
+        self.assertEqual(
+            ["videoid2"],
+            list(models.DeletedVideo.objects.values_list("public_id", flat=True)),
+        )
+
+    def test_delete_videos_purges_after_commit(self):
+        factories.VideoFactory(public_id="videoid")
+
+        with patch("pipeline.tasks.send_task") as mock_send_task:
+            with capture_on_commit_callbacks(execute=True):
+                with transaction.atomic():
+                    tasks.delete_videos(["videoid"])
+                mock_send_task.assert_not_called()
+
+        mock_send_task.assert_called_once_with("purge_deleted_videos")
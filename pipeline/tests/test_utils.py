@@ -3,6 +3,7 @@ from tempfile import NamedTemporaryFile
 
 from django.test import TestCase
 
+from mock import patch
 from PIL import Image
 
 from pipeline import utils
@@ -40,3 +41,38 @@ class UtilsTests(TestCase):
 
         resized_image = Image.open(out_img.name)
         self.assertEqual((576, 1024), resized_image.size)
+
+
+class LRUCacheTests(TestCase):
+    def test_get_set_delete(self):
+        lru = utils.LRUCache(10, 60)
+        lru.set("key", "value")
+
+        self.assertEqual("value", lru.get("key"))
+        lru.delete("key")
+        self.assertIsNone(lru.get("key"))
+        self.assertEqual("default", lru.get("key", "default"))
+        self.assertEqual(1, lru.hits)
+        self.assertEqual(2, lru.misses)
+
+    def test_least_recently_used_items_are_evicted(self):
+        lru = utils.LRUCache(2, 60)
+        lru.set("key1", 1)
+        lru.set("key2", 2)
+        lru.get("key1")
+        lru.set("key3", 3)
+
+        self.assertEqual(2, len(lru))
+        self.assertEqual(1, lru.get("key1"))
+        self.assertIsNone(lru.get("key2"))
+        self.assertEqual(3, lru.get("key3"))
+
+    def test_items_expire(self):
+        lru = utils.LRUCache(10, 60)
+        with patch("pipeline.utils.time", return_value=0):
+            lru.set("key", "value")
+        with patch("pipeline.utils.time", return_value=59):
+            self.assertEqual("value", lru.get("key"))
+        with patch("pipeline.utils.time", return_value=60):
+            self.assertIsNone(lru.get("key"))
+        self.assertEqual(0, len(lru))
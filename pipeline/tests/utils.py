@@ -1,3 +1,6 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test.utils import override_settings
 
 import pipeline.backend
@@ -30,3 +33,35 @@ def override_plugin_backend(**kwargs):
     Example: @override_plugin_backend(upload_video=lambda x: 42)
     """
     return override_settings(PLUGIN_BACKEND=TestPluginBackendFactory(**kwargs))
+
+
+@contextmanager
+def capture_on_commit_callbacks(using=DEFAULT_DB_ALIAS, execute=False):
+    """
+    Context manager to capture the transaction.on_commit() callbacks that are
+    registered inside TestCase, whose transactions are never committed. This is
+    a backport of TestCase.captureOnCommitCallbacks from Django 3.2.
+
+    Example:
+
+        with capture_on_commit_callbacks(execute=True) as callbacks:
+            video.delete()
+
+    Args:
+        execute (bool): if True, the callbacks are run when the context manager
+        exits, along with the callbacks that they register themselves.
+    """
+    callbacks = []
+    start_count = len(connections[using].run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        while True:
+            callback_count = len(connections[using].run_on_commit)
+            for _sids, callback in connections[using].run_on_commit[start_count:]:
+                callbacks.append(callback)
+                if execute:
+                    callback()
+            if callback_count == len(connections[using].run_on_commit):
+                break
+            start_count = callback_count
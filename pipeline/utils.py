@@ -1,7 +1,10 @@
 import os
 import random
 import string
+import threading
+from collections import OrderedDict
 from tempfile import NamedTemporaryFile
+from time import time
 
 from django.conf import settings
 
@@ -54,3 +57,58 @@ def resize_image(in_path, out_path, max_size):
         (round(in_img.size[0] * ratio), round(in_img.size[1] * ratio))
     )
     out_img.save(out_path)
+
+
+class LRUCache(object):
+    """
+    Thread-safe, size-bounded in-process cache. Items expire after `timeout`
+    seconds, and the least recently used items are evicted first when the
+    cache is full. Note that cached values are shared, and not copied, between
+    callers. The number of cache hits and misses is recorded in the `hits` and
+    `misses` attributes.
+
+    Args:
+        max_size (int): maximum number of items
+        timeout (float): lifetime of items, in seconds
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at <= time():
+                del self._items[key]
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time() + self.timeout, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
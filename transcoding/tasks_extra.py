@@ -11,7 +11,8 @@ but instead, we are adding an extra video format.
 from django.utils.timezone import now
 
 from pipeline import exceptions, models
-from pipeline.tasks import Lock
+from pipeline.locks import Lock
+from pipeline.tasks import publish_processing_state, update_processing_state
 from transcoding.backend_extra import AwsExtraBackend
 
 
@@ -20,33 +21,41 @@ def apply_new_transcoding(public_video_id):
     Args:
         public_video_id (str)
     """
-    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id, 3600) as lock:
+    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id) as lock:
         if lock.is_acquired:
             try:
                 models.invalidate_cache(public_video_id)
-                _apply_new_transcoding(public_video_id)
+                _apply_new_transcoding(public_video_id, lock.token)
+            except exceptions.LockLost:
+                raise
             except Exception as e:
                 # Store error message
                 message = "\n".join([str(arg) for arg in e.args])
-                models.ProcessingState.objects.filter(
-                    video__public_id=public_video_id
-                ).update(status=models.ProcessingState.STATUS_FAILED, message=message)
+                update_processing_state(
+                    public_video_id,
+                    lock.token,
+                    status=models.ProcessingState.STATUS_FAILED,
+                    message=message,
+                )
                 raise
             finally:
                 models.invalidate_cache(public_video_id)
+                publish_processing_state(public_video_id)
 
 
-def _apply_new_transcoding(public_video_id):
+def _apply_new_transcoding(public_video_id, fencing_token):
     """
     This function is not thread-safe. It should only be called by the transcode_video task.
     """
     video = models.Video.objects.get(public_id=public_video_id)
-    processing_state = models.ProcessingState.objects.filter(
-        video__public_id=public_video_id
-    )
-    processing_state.update(
-        progress=0, status=models.ProcessingState.STATUS_PENDING, started_at=now()
+    update_processing_state(
+        public_video_id,
+        fencing_token,
+        progress=0,
+        status=models.ProcessingState.STATUS_PENDING,
+        started_at=now(),
     )
+    publish_processing_state(public_video_id)
 
     jobs = AwsExtraBackend().apply_new_transcoding(public_video_id)
     success_job_indexes = []
@@ -73,15 +82,20 @@ def _apply_new_transcoding(public_video_id):
         # Note that we do not delete original assets once transcoding has
         # ended. This is because we want to keep the possibility of restarting
         # the transcoding process.
-        processing_state.update(
+        update_processing_state(
+            public_video_id,
+            fencing_token,
             progress=sum(jobs_progress) * 1. / len(jobs),
             status=models.ProcessingState.STATUS_PROCESSING,
         )
+        publish_processing_state(public_video_id)
 
     # Check status
-    processing_state.update(message="\n".join(errors))
+    update_processing_state(public_video_id, fencing_token, message="\n".join(errors))
     if errors:
-        processing_state.update(status=models.ProcessingState.STATUS_FAILED)
+        update_processing_state(
+            public_video_id, fencing_token, status=models.ProcessingState.STATUS_FAILED
+        )
     else:
         # Create video formats first so that they are available as soon as the
         # video object becomes available from the API
@@ -90,4 +104,6 @@ def _apply_new_transcoding(public_video_id):
                 video=video, name=format_name, bitrate=bitrate
             )
 
-        processing_state.update(status=models.ProcessingState.STATUS_SUCCESS)
+        update_processing_state(
+            public_video_id, fencing_token, status=models.ProcessingState.STATUS_SUCCESS
+        )
@@ -155,9 +155,9 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         # It is important to have BasicAuthentication as the first auth class
         # in order to prompt the user for a login/password from the GUI.
-        "rest_framework.authentication.BasicAuthentication",
+        "api.v1.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "api.v1.authentication.CachedTokenAuthentication",
     )
 }
 
@@ -212,6 +212,10 @@ CELERYBEAT_SCHEDULE = {
         "task": "transcode_video_restart",
         "schedule": timedelta(seconds=5),
     },
+    "purge_deleted_videos": {
+        "task": "purge_deleted_videos",
+        "schedule": timedelta(minutes=10),
+    },
 }
 
 # Swagger documentation
@@ -235,3 +239,62 @@ PLUGIN_BACKEND = "contrib.plugins.aws.backend.Backend"
 
 # Maximum of width and height size for video thumbnails
 THUMBNAILS_SIZE = 1024
+
+# Default number of results per page returned by the list endpoints of the
+# API, and maximum number of results that may be requested with the
+# `page_size` query parameter.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# Legacy API clients which expect list endpoints to return all results at once
+# may be listed here by username. Pagination is disabled for these users.
+API_UNPAGINATED_USERNAMES = []
+
+# Number of videos that are fetched from the database at once when streaming
+# catalog exports.
+API_EXPORT_CHUNK_SIZE = 500
+
+# Number of deleted videos whose assets are purged from storage at once
+VIDEO_PURGE_BATCH_SIZE = 100
+
+# Maximum duration, in seconds, of long-polling requests to the video progress
+# endpoint. Waiting requests are woken up by progress notifications (see
+# LOCK_NOTIFIER), and they also check the progress every
+# API_PROGRESS_POLL_INTERVAL seconds, in case notifications are lost.
+# Long-polling requests should be served by asynchronous workers (see the
+# gunicorn configuration).
+API_PROGRESS_TIMEOUT = 25
+API_PROGRESS_POLL_INTERVAL = 5
+
+# Function which serializes videos when they are stored in the cache by the
+# pipeline tasks, e.g: once transcoding has finished
+VIDEO_CACHE_LOADER = "api.v1.serializers.load_video"
+
+# Format of the video entries that are stored in the shared cache. Use
+# "pipeline.codecs.PickleCodec" to store entries as pickled dicts.
+VIDEO_CACHE_CODEC = "pipeline.codecs.BinaryCodec"
+
+# Implementation of the locks that prevent concurrent transcoding of the same
+# video. Use "pipeline.locks.PostgresAdvisoryLockBackend" with a PostgreSQL
+# database to hold locks for as long as the database connection of the holder
+# is alive. The fencing tokens of the PostgreSQL backend are greater than those
+# of the cache backend, such that switching back to the cache backend requires
+# resetting the tokens while no video is being transcoded, e.g:
+# ProcessingState.objects.update(fencing_token=0)
+LOCK_BACKEND = "pipeline.locks.CacheLeaseBackend"
+
+# Duration, in seconds, of lock leases. Leases are renewed in the background by
+# lock holders, such that locks of crashed workers become available once their
+# lease has expired.
+LOCK_LEASE_DURATION = 30
+
+# Channel on which lock releases and video progress updates are notified to the
+# workers that wait for them. Use "pipeline.locks.LocalNotifier" to notify the
+# waiters of the current process only.
+LOCK_NOTIFIER = "pipeline.locks.PostgresNotifier"
+
+# Workers that wait for a lock to be released also check the lock every
+# LOCK_WAIT_POLL_INTERVAL seconds, since releases are not notified when leases
+# expire, and they give up after LOCK_WAIT_TIMEOUT seconds.
+LOCK_WAIT_POLL_INTERVAL = 5
+LOCK_WAIT_TIMEOUT = 3600